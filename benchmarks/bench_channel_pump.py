@@ -0,0 +1,173 @@
+"""
+Compares the old sleep-polling SSH read loop with ssh_io.ChannelPump
+running on the shared IOReactor.
+
+A socket pair stands in for the paramiko channel, so this runs without a
+server or any third-party packages:
+
+    python benchmarks/bench_channel_pump.py
+"""
+import os
+import queue
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ssh_io import ChannelPump  # noqa: E402
+
+PAYLOAD_MB = 4
+ECHO_ROUNDS = 50
+
+
+class FakeChannel:
+    """The subset of paramiko.Channel that the read loops use."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_ready(self):
+        if self.eof_received:
+            return False
+        return bool(select.select([self.sock], [], [], 0)[0])
+
+    def recv(self, n):
+        data = self.sock.recv(n)
+        if not data:
+            self.eof_received = True
+        return data
+
+    def sendall(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.sock.sendall(data)
+
+    def send_ready(self):
+        return True
+
+    def send(self, data):
+        return self.sock.send(data)
+
+    def exit_status_ready(self):
+        return self.eof_received
+
+
+def polling_loop(channel, commands, stop_event, on_data):
+    """The loop ssh_worker used before ChannelPump."""
+    while not stop_event.is_set():
+        if channel.exit_status_ready():
+            break
+        if channel.recv_ready():
+            data = channel.recv(4096)
+            if data:
+                on_data(data)
+        try:
+            channel.sendall(commands.get_nowait())
+        except queue.Empty:
+            pass
+        time.sleep(0.05)
+
+
+def make_pair():
+    client, server = socket.socketpair()
+    return FakeChannel(client), server
+
+
+def run_polling(channel):
+    commands = queue.Queue()
+    stop_event = threading.Event()
+    received = []
+    t = threading.Thread(
+        target=polling_loop,
+        args=(channel, commands, stop_event, received.append),
+        daemon=True,
+    )
+    t.start()
+    return commands.put, stop_event.set, received
+
+
+def run_pump(channel):
+    received = []
+    pump = ChannelPump(channel, received.append)
+    pump.start()
+    return pump.send, pump.stop, received
+
+
+def measure_throughput(starter):
+    channel, server = make_pair()
+    _send, stop, received = starter(channel)
+    total = PAYLOAD_MB * 1024 * 1024
+    block = b"x" * 65536
+
+    def feed():
+        sent = 0
+        while sent < total:
+            server.sendall(block)
+            sent += len(block)
+
+    start = time.perf_counter()
+    threading.Thread(target=feed, daemon=True).start()
+    while sum(map(len, received)) < total:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    stop()
+    server.close()
+    return total / elapsed / (1024 * 1024)
+
+
+def measure_echo(starter):
+    channel, server = make_pair()
+    send, stop, received = starter(channel)
+
+    def echo():
+        while True:
+            data = server.recv(4096)
+            if not data:
+                return
+            server.sendall(data)
+
+    threading.Thread(target=echo, daemon=True).start()
+    samples = []
+    for _ in range(ECHO_ROUNDS):
+        before = len(received)
+        start = time.perf_counter()
+        send("a")
+        while len(received) == before:
+            time.sleep(0.0005)
+        samples.append(time.perf_counter() - start)
+    stop()
+    server.close()
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[-1] * 1000
+
+
+def measure_idle_cpu(starter, seconds=2.0):
+    channel, server = make_pair()
+    _send, stop, _received = starter(channel)
+    start = time.process_time()
+    time.sleep(seconds)
+    used = time.process_time() - start
+    stop()
+    server.close()
+    return used / seconds * 100
+
+
+def main():
+    print(f"{'loop':<10}{'MB/s':>10}{'echo p50 ms':>14}{'echo max ms':>14}{'idle CPU %':>12}")
+    for name, starter in (("polling", run_polling), ("pump", run_pump)):
+        mbps = measure_throughput(starter)
+        p50, worst = measure_echo(starter)
+        cpu = measure_idle_cpu(starter)
+        print(f"{name:<10}{mbps:>10.1f}{p50:>14.2f}{worst:>14.2f}{cpu:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
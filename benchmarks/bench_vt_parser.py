@@ -0,0 +1,104 @@
+"""
+Compares the old per-chunk decode + regex + isprintable() filter with
+vt_parser.TerminalStreamParser.
+
+By default a few megabytes of synthetic shell output are generated (coloured
+ls listings, journalctl-style UTF-8 log lines and a redrawn progress bar).
+Pass paths to raw captures to measure those instead, e.g. one recorded with
+`script -q -c 'journalctl -n 50000' capture.raw`:
+
+    python benchmarks/bench_vt_parser.py [capture.raw ...]
+
+"old delta" is how many characters the old pipeline's output differs by:
+positive where it dropped split multibyte characters, negative where it
+leaked fragments of escape sequences split across reads.
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vt_parser import TerminalStreamParser  # noqa: E402
+
+ANSI_ESCAPE_RE = re.compile(r'(\x1B\[[0-?]*[ -/]*[@-~]|\x1B\].*?(\x07|\x1B\\))')
+TARGET_BYTES = 8 * 1024 * 1024
+CHUNK_SIZES = (4096, 32768)
+
+
+def old_pipeline(data, chunk_size):
+    out = []
+    for i in range(0, len(data), chunk_size):
+        text = data[i:i + chunk_size].decode("utf-8", "ignore")
+        text = ANSI_ESCAPE_RE.sub("", text)
+        out.append("".join(c for c in text if c.isprintable() or c in ("\n", "\t")))
+    return "".join(out)
+
+
+def new_pipeline(data, chunk_size):
+    parser = TerminalStreamParser()
+    out = [parser.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    out.append(parser.flush())
+    return "".join(out)
+
+
+def synthetic_streams():
+    ls_line = (
+        "\x1b[0m\x1b[01;34mnode_modules\x1b[0m  \x1b[01;32mbuild.sh\x1b[0m  "
+        "README.md  \x1b[01;31marchive.tar.gz\x1b[0m\r\n"
+    )
+    log_line = (
+        "Oct 18 09:14:02 héliotrope systemd[1]: Started Session 42 of user "
+        "zoë — 日本語のログ ✓ état=prêt\r\n"
+    )
+    progress = "".join(
+        f"\r\x1b[K{pct:3d}% [{'#' * (pct // 5):<20}] \x1b]0;copying {pct}%\x07"
+        for pct in range(101)
+    ) + "\r\n"
+    ascii_line = "2026-10-18T09:14:02Z INFO request served path=/api/v1/items status=200\n"
+    yield "plain ascii", ascii_line.encode()
+    yield "coloured ls", ls_line.encode()
+    yield "utf-8 log", log_line.encode()
+    yield "progress bar", progress.encode()
+
+
+def capture_streams(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield os.path.basename(path), f.read()
+
+
+def repeat_to_target(unit):
+    if len(unit) >= TARGET_BYTES:
+        return unit
+    return unit * (TARGET_BYTES // len(unit))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    streams = capture_streams(sys.argv[1:]) if sys.argv[1:] else synthetic_streams()
+    reference = None
+    print(f"{'stream':<16}{'MB':>6}{'chunk':>8}{'old MB/s':>11}{'new MB/s':>11}{'old delta':>12}")
+    for name, unit in streams:
+        data = repeat_to_target(unit)
+        mb = len(data) / (1024 * 1024)
+        reference = new_pipeline(data, len(data))
+        for chunk_size in CHUNK_SIZES:
+            old_text, old_time = timed(old_pipeline, data, chunk_size)
+            new_text, new_time = timed(new_pipeline, data, chunk_size)
+            assert new_text == reference, f"{name}: output depends on chunking"
+            delta = len(old_text) - len(reference)
+            print(
+                f"{name:<16}{mb:>6.1f}{chunk_size:>8}"
+                f"{mb / old_time:>11.1f}{mb / new_time:>11.1f}{delta:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,42 @@ import threading
 import tempfile
 import shutil
 import math
+import posixpath
 
 import theme
 import speech
 from sftp_helpers import (
-    upload_item,
-    download_item,
-    delete_item,
-    count_remote_items,
-    count_local_items,
+    TransferManifest,
+    run_transfers,
+    transfer_manifest,
+    delete_items,
+    copy_items,
+    move_items,
+    search_items,
     TransferCancelledError,
+    TransferProgress,
 )
+from dir_cache import DirectoryCache, listing_entries
+from file_list import FileListCtrl
+from resumable_transfer import TransferJournal, resume_job, discard_unfinished
+from vt_parser import DEFAULT_ENCODING, normalize_encoding
+from security import get_password, get_passphrase
+import transport_profile
+
+ENCODING_CHOICES = ["utf-8", "latin-1", "cp1252", "iso8859-15", "koi8-r", "euc-jp", "shift_jis", "gbk", "big5"]
+
+# Entries shown at a time while a directory with no cached listing loads.
+LISTING_BATCH = 1000
+
+# How often transfer progress is redrawn, and whether every 10% is spoken.
+PROGRESS_INTERVAL_MS = 250
+SPEAK_MILESTONES = True
+
+
+def set_speak_milestones(enabled: bool):
+    """Enables or disables spoken 10% transfer milestones."""
+    global SPEAK_MILESTONES
+    SPEAK_MILESTONES = enabled
 
 
 def human_readable_size(size_bytes: int) -> str:
@@ -39,20 +64,56 @@ def human_readable_size(size_bytes: int) -> str:
         return str(size_bytes)
 
 
+def _short_size(size_bytes) -> str:
+    return human_readable_size(size_bytes).replace(".0 ", " ")
+
+
+def describe_transfer_progress(done, total, rate, eta) -> str:
+    """Phrases progress as e.g. "1.2 of 4 GB, 38 MB/s, about 2 minutes left"."""
+    done_text, total_text = _short_size(done), _short_size(total)
+    done_value, done_unit = done_text.split(" ")
+    if total_text.endswith(" " + done_unit):
+        parts = [f"{done_value} of {total_text}"]
+    else:
+        parts = [f"{done_text} of {total_text}"]
+    if rate > 0:
+        parts.append(f"{_short_size(rate)}/s")
+        if eta is not None:
+            parts.append(_describe_time_left(eta))
+    return ", ".join(parts)
+
+
+def _describe_time_left(seconds) -> str:
+    if seconds < 1:
+        return "almost done"
+    if seconds < 60:
+        n = max(1, round(seconds))
+        return f"about {n} second{'s' if n != 1 else ''} left"
+    if seconds < 3600:
+        n = round(seconds / 60)
+        return f"about {n} minute{'s' if n != 1 else ''} left"
+    hours = round(seconds / 3600, 1)
+    return f"about {hours:g} hour{'s' if hours != 1 else ''} left"
+
+
 class AddServerDialog(wx.Dialog):
     """
     Dialog for adding or editing an SSH server definition.
 
     get_data() returns a dict with keys:
       - name, host, port, user
+      - encoding: codec used to decode terminal output
       - auth_method: "password" or "key"
       - password_stored: bool
       - password (optional, for password auth)
       - key_path, passphrase (optional, for key auth)
+      - transport: the transport profile, see transport_profile
     """
 
     def __init__(self, parent, title="Add SSH Server", server_to_edit=None):
-        super(AddServerDialog, self).__init__(parent, title=title, size=(400, 420))
+        super(AddServerDialog, self).__init__(parent, title=title, size=(400, 500))
+        self.server_to_edit = server_to_edit
+        self.transport_settings = transport_profile.profile_of(server_to_edit or {})
 
         self.panel = wx.Panel(self)
         self.vbox = wx.BoxSizer(wx.VERTICAL)
@@ -85,6 +146,15 @@ class AddServerDialog(wx.Dialog):
         hbox4.Add(self.username, 1)
         self.vbox.Add(hbox4, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
 
+        # Terminal encoding
+        hbox_enc = wx.BoxSizer(wx.HORIZONTAL)
+        hbox_enc.Add(wx.StaticText(self.panel, label="&Encoding:"), 0, wx.RIGHT, 8)
+        self.encoding = wx.ComboBox(
+            self.panel, value=DEFAULT_ENCODING, choices=ENCODING_CHOICES
+        )
+        hbox_enc.Add(self.encoding, 1)
+        self.vbox.Add(hbox_enc, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
+
         # Auth method
         auth_methods = ["Password", "SSH Key"]
         hbox_auth = wx.BoxSizer(wx.HORIZONTAL)
@@ -141,6 +211,9 @@ class AddServerDialog(wx.Dialog):
         self.key_sizer.Add(self.store_passphrase_cb, 0, wx.LEFT | wx.BOTTOM, 10)
         self.vbox.Add(self.key_sizer, 0, wx.EXPAND)
 
+        advanced_button = wx.Button(self.panel, label="Ad&vanced...")
+        self.vbox.Add(advanced_button, 0, wx.LEFT | wx.BOTTOM, 10)
+
         # Buttons
         hbox_buttons = wx.BoxSizer(wx.HORIZONTAL)
         self.ok_button = wx.Button(self.panel, id=wx.ID_OK, label="&OK")
@@ -154,6 +227,7 @@ class AddServerDialog(wx.Dialog):
         # Events
         self.auth_choice.Bind(wx.EVT_CHOICE, self.on_auth_method_change)
         browse_btn.Bind(wx.EVT_BUTTON, self.on_browse_key)
+        advanced_button.Bind(wx.EVT_BUTTON, self.on_advanced)
         self.password.Bind(wx.EVT_TEXT, self.on_credential_change)
         self.passphrase.Bind(wx.EVT_TEXT, self.on_credential_change)
 
@@ -173,6 +247,7 @@ class AddServerDialog(wx.Dialog):
         self.host.SetValue(server.get("host", ""))
         self.port.SetValue(str(server.get("port", 22)))
         self.username.SetValue(server.get("user", ""))
+        self.encoding.SetValue(server.get("encoding", DEFAULT_ENCODING))
 
         auth_method = server.get("auth_method", "password")
         if auth_method == "key":
@@ -216,6 +291,43 @@ class AddServerDialog(wx.Dialog):
                 return
             self.key_path.SetValue(dlg.GetPath())
 
+    def on_advanced(self, event):
+        with TransportProfileDialog(self, self.transport_settings, self._measure_connect_kwargs) as dlg:
+            if dlg.ShowModal() == wx.ID_OK:
+                self.transport_settings = dlg.get_profile()
+
+    def _measure_connect_kwargs(self):
+        """Returns connect kwargs from the fields for measuring the link, or None."""
+        host = self.host.GetValue().strip()
+        user = self.username.GetValue().strip()
+        if not host or not user:
+            wx.MessageBox("Enter the hostname and username first.", "Measure Link", wx.ICON_INFORMATION, self)
+            return None
+        try:
+            port = int(self.port.GetValue() or 22)
+        except ValueError:
+            wx.MessageBox("Please enter a valid port number.", "Measure Link", wx.ICON_ERROR, self)
+            return None
+        kwargs = {'hostname': host, 'port': port, 'username': user}
+        stored = self.server_to_edit if self.server_to_edit and self.server_to_edit.get("password_stored") else None
+        if self.auth_choice.GetStringSelection() == "Password":
+            password = self.password.GetValue()
+            if not password and stored:
+                password = get_password(server_name=stored["name"], host=stored["host"], user=stored["user"])
+            if not password:
+                with wx.PasswordEntryDialog(self, f"Enter password for {user}@{host}", "Password Required") as dlg:
+                    if dlg.ShowModal() != wx.ID_OK:
+                        return None
+                    password = dlg.GetValue()
+            kwargs['password'] = password
+        else:
+            kwargs['key_filename'] = self.key_path.GetValue()
+            passphrase = self.passphrase.GetValue()
+            if not passphrase and stored:
+                passphrase = get_passphrase(server_name=stored["name"], host=stored["host"], user=stored["user"])
+            kwargs['passphrase'] = passphrase
+        return kwargs
+
     def get_data(self) -> dict:
         is_password = self.auth_choice.GetStringSelection() == "Password"
         data = {
@@ -223,6 +335,8 @@ class AddServerDialog(wx.Dialog):
             "host": self.host.GetValue(),
             "port": int(self.port.GetValue() or 22),
             "user": self.username.GetValue(),
+            "encoding": normalize_encoding(self.encoding.GetValue().strip()),
+            "transport": dict(self.transport_settings),
             "auth_method": "password" if is_password else "key",
             "password_stored": (
                 self.store_password_cb.GetValue()
@@ -238,24 +352,243 @@ class AddServerDialog(wx.Dialog):
         return data
 
 
+class TransportProfileDialog(wx.Dialog):
+    """
+    Advanced connection settings for one server: compression, cipher
+    preference, channel window and TCP receive buffer. Measure Link connects
+    with several profiles, times a transfer with each and selects the
+    fastest.
+    """
+
+    COMPRESSION_LABELS = ["Automatic (on for slow links)", "On", "Off"]
+    CIPHER_LABELS = {"default": "Default", "aes-gcm": "AES-GCM", "aes-ctr": "AES-128-CTR"}
+
+    def __init__(self, parent, profile, get_connect_kwargs):
+        super(TransportProfileDialog, self).__init__(parent, title="Advanced Connection Settings", size=(460, 480))
+        self.get_connect_kwargs = get_connect_kwargs
+        self.cancel_flag = threading.Event()
+        self.cipher_keys = list(transport_profile.CIPHER_PREFERENCES)
+        self.window_sizes = list(transport_profile.WINDOW_SIZES)
+        self.recv_buffers = list(transport_profile.RECV_BUFFER_SIZES)
+
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        grid = wx.FlexGridSizer(cols=2, vgap=8, hgap=8)
+        grid.AddGrowableCol(1)
+
+        self.compression = wx.Choice(panel, choices=self.COMPRESSION_LABELS)
+        self.ciphers = wx.Choice(panel, choices=[self.CIPHER_LABELS.get(k, k) for k in self.cipher_keys])
+        self.window_size = wx.Choice(panel)
+        self.recv_buffer = wx.Choice(panel)
+        for label, control in (
+            ("&Compression:", self.compression),
+            ("C&ipher preference:", self.ciphers),
+            ("&Window size:", self.window_size),
+            ("&Receive buffer:", self.recv_buffer),
+        ):
+            grid.Add(wx.StaticText(panel, label=label), 0, wx.ALIGN_CENTER_VERTICAL)
+            grid.Add(control, 1, wx.EXPAND)
+        vbox.Add(grid, 0, wx.EXPAND | wx.ALL, 10)
+
+        self.measure_button = wx.Button(panel, label="&Measure Link")
+        vbox.Add(self.measure_button, 0, wx.LEFT | wx.BOTTOM, 10)
+        vbox.Add(wx.StaticText(panel, label="Measurement re&sults:"), 0, wx.LEFT | wx.RIGHT, 10)
+        self.results = wx.TextCtrl(panel, style=wx.TE_MULTILINE | wx.TE_READONLY)
+        vbox.Add(self.results, 1, wx.EXPAND | wx.ALL, 10)
+
+        hbox_buttons = wx.BoxSizer(wx.HORIZONTAL)
+        ok_button = wx.Button(panel, id=wx.ID_OK, label="&OK")
+        cancel_button = wx.Button(panel, id=wx.ID_CANCEL, label="Ca&ncel")
+        hbox_buttons.Add(ok_button)
+        hbox_buttons.Add(cancel_button, 0, wx.LEFT, 5)
+        vbox.Add(hbox_buttons, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+        panel.SetSizer(vbox)
+
+        self.measure_button.Bind(wx.EVT_BUTTON, self.on_measure)
+        ok_button.Bind(wx.EVT_BUTTON, self.on_finish)
+        cancel_button.Bind(wx.EVT_BUTTON, self.on_finish)
+
+        self.set_profile(profile)
+        theme.apply_dark_theme(self)
+        self.compression.SetFocus()
+
+    @staticmethod
+    def _size_label(size, default):
+        return default if size is None else f"{size // transport_profile.MB} MB"
+
+    def set_profile(self, profile):
+        self.compression.SetSelection(transport_profile.COMPRESSION_CHOICES.index(profile["compression"]))
+        if profile["ciphers"] not in self.cipher_keys:
+            self.cipher_keys.append(profile["ciphers"])
+            self.ciphers.Append(profile["ciphers"])
+        self.ciphers.SetSelection(self.cipher_keys.index(profile["ciphers"]))
+        for control, sizes, value, default in (
+            (self.window_size, self.window_sizes, profile["window_size"], "Default (2 MB)"),
+            (self.recv_buffer, self.recv_buffers, profile["recv_buffer"], "System default"),
+        ):
+            if value not in sizes:
+                sizes.append(value)
+            control.Set([self._size_label(size, default) for size in sizes])
+            control.SetSelection(sizes.index(value))
+
+    def get_profile(self) -> dict:
+        return {
+            "compression": transport_profile.COMPRESSION_CHOICES[self.compression.GetSelection()],
+            "ciphers": self.cipher_keys[self.ciphers.GetSelection()],
+            "window_size": self.window_sizes[self.window_size.GetSelection()],
+            "recv_buffer": self.recv_buffers[self.recv_buffer.GetSelection()],
+        }
+
+    def on_finish(self, event):
+        self.cancel_flag.set()
+        event.Skip()
+
+    def on_measure(self, event):
+        kwargs = self.get_connect_kwargs()
+        if kwargs is None:
+            return
+        self.measure_button.Enable(False)
+        self.cancel_flag.clear()
+        self.results.SetValue("")
+        self._add_result("Measuring, this takes a few seconds for each setting...")
+        t = threading.Thread(target=self._measure_worker, args=(kwargs,))
+        t.daemon = True
+        t.start()
+
+    def _measure_worker(self, kwargs):
+        def on_result(profile, seconds):
+            outcome = "timed out" if seconds is None else f"{seconds:.1f} seconds"
+            wx.CallAfter(self._add_result, f"{transport_profile.describe(profile)}: {outcome}")
+
+        def check_cancel():
+            if self.cancel_flag.is_set():
+                raise TransferCancelledError("Measurement cancelled.")
+
+        try:
+            best = transport_profile.measure_link(kwargs, on_result, check_cancel)
+            wx.CallAfter(self._on_measured, best, None)
+        except TransferCancelledError:
+            pass
+        except Exception as e:
+            wx.CallAfter(self._on_measured, None, e)
+
+    def _add_result(self, line):
+        if self:
+            self.results.AppendText(line + "\n")
+
+    def _on_measured(self, best, error):
+        if not self:
+            return
+        self.measure_button.Enable(True)
+        if error is not None:
+            message = f"Measurement failed: {error}"
+        else:
+            self.set_profile(best)
+            message = f"Recommended: {transport_profile.describe(best)}. Press OK to use it."
+        self._add_result(message)
+        speech.speak(message, interrupt=True)
+
+
+class SearchDialog(wx.Dialog):
+    """Asks what to search the server for, by file name or by content."""
+
+    def __init__(self, parent, text="", contents=False, match_case=False):
+        super(SearchDialog, self).__init__(parent, title="Search on Server")
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        vbox.Add(wx.StaticText(panel, label="&Find:"), 0, wx.ALL, 5)
+        self.text = wx.TextCtrl(panel, value=text)
+        vbox.Add(self.text, 0, wx.EXPAND | wx.ALL, 5)
+
+        self.where = wx.RadioBox(
+            panel,
+            label="Search in",
+            choices=["File &names", "File c&ontents"],
+            majorDimension=1,
+            style=wx.RA_SPECIFY_ROWS,
+        )
+        self.where.SetSelection(1 if contents else 0)
+        vbox.Add(self.where, 0, wx.EXPAND | wx.ALL, 5)
+
+        self.case_checkbox = wx.CheckBox(panel, label="Match &case")
+        self.case_checkbox.SetValue(match_case)
+        vbox.Add(self.case_checkbox, 0, wx.ALL, 5)
+
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        search_btn = wx.Button(panel, wx.ID_OK, "&Search")
+        cancel_btn = wx.Button(panel, wx.ID_CANCEL, "C&ancel")
+        search_btn.SetDefault()
+        btn_sizer.Add(search_btn, 0, wx.RIGHT, 5)
+        btn_sizer.Add(cancel_btn, 0)
+        vbox.Add(btn_sizer, 0, wx.ALL | wx.ALIGN_RIGHT, 5)
+
+        panel.SetSizer(vbox)
+        self.Fit()
+        theme.apply_dark_theme(self)
+        self.text.SetFocus()
+        self.text.SelectAll()
+
+    def get_values(self):
+        """Returns (text, search contents, match case)."""
+        return self.text.GetValue(), self.where.GetSelection() == 1, self.case_checkbox.IsChecked()
+
+
+class ConnectionDetailsDialog(wx.Dialog):
+    """Read-only view of a session's connection details and bring-up timings."""
+
+    def __init__(self, parent, name, lines):
+        super().__init__(parent, title=f"Connection Details - {name}", size=(460, 360))
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        label = wx.StaticText(panel, label="&Details:")
+        self.details = wx.TextCtrl(panel, value="\n".join(lines), style=wx.TE_MULTILINE | wx.TE_READONLY)
+        close_button = wx.Button(panel, id=wx.ID_CANCEL, label="&Close")
+        vbox.Add(label, 0, wx.LEFT | wx.TOP, 5)
+        vbox.Add(self.details, 1, wx.EXPAND | wx.ALL, 5)
+        vbox.Add(close_button, 0, wx.ALIGN_CENTER | wx.BOTTOM, 5)
+        panel.SetSizer(vbox)
+        self.SetEscapeId(wx.ID_CANCEL)
+        theme.apply_dark_theme(self)
+        self.details.SetFocus()
+
+
 class FileBrowserDialog(wx.Dialog):
     """
     SFTP file browser dialog with inline progress bar for long operations
     and an Alt+Shift+P hotkey to speak the current progress/status.
+
+    Every SFTP request goes through the session's SFTPService, so a slow
+    server never blocks the dialog; transfers run as service jobs over the
+    channels of its transfer_pool. Listings come from dir_cache, which the
+    session keeps between visits.
     """
 
-    def __init__(self, parent, sftp_client, edit_callback, initial_path=None):
+    def __init__(self, parent, sftp_service, edit_callback, initial_path=None, dir_cache=None):
         super(FileBrowserDialog, self).__init__(
             parent, title="Teaview", size=(640, 540)
         )
 
-        self.sftp = sftp_client
+        self.service = sftp_service
+        self.dir_cache = dir_cache or DirectoryCache()
+        self.refreshing = set()
+        self.shown_entries = None
+        self.listing_token = 0
+        self.batched_count = 0
         self.edit_callback = edit_callback
         self.current_path = initial_path or "/"
 
         self.cancel_flag = threading.Event()
         self.copy_temp_dir = None
-        self.worker_thread = None
+        self.worker_future = None
+        self.search_root = None
+        self.search_hits = []
+        self.last_search = ("", False, False)
+        self.select_after_load = None
+        self.transfer_progress = None
+        self.transfer_verb = ""
+        self.last_milestone = 0
+        self.progress_timer = wx.Timer(self)
 
         panel = wx.Panel(self)
         vbox = wx.BoxSizer(wx.VERTICAL)
@@ -263,20 +596,35 @@ class FileBrowserDialog(wx.Dialog):
         self.path_text = wx.StaticText(panel, label=f"Path: {self.current_path}")
         vbox.Add(self.path_text, 0, wx.ALL | wx.EXPAND, 5)
 
-        self.file_list = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
-        self.file_list.InsertColumn(0, "Name", width=260)
-        self.file_list.InsertColumn(1, "Size", width=120)
-        self.file_list.InsertColumn(2, "Type", width=120)
+        filter_box = wx.BoxSizer(wx.HORIZONTAL)
+        filter_label = wx.StaticText(panel, label="&Filter:")
+        self.filter_text = wx.TextCtrl(panel)
+        filter_box.Add(filter_label, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, 5)
+        filter_box.Add(self.filter_text, 1)
+        vbox.Add(filter_box, 0, wx.LEFT | wx.RIGHT | wx.EXPAND, 5)
+
+        self.file_list = FileListCtrl(panel, human_readable_size)
         vbox.Add(self.file_list, 1, wx.ALL | wx.EXPAND, 5)
 
+        # Search results, shown once a search has been run
+        self.results_label = wx.StaticText(panel, label="Search &results:")
+        self.results_list = wx.ListBox(panel)
+        vbox.Add(self.results_label, 0, wx.LEFT | wx.RIGHT, 5)
+        vbox.Add(self.results_list, 1, wx.ALL | wx.EXPAND, 5)
+        self.results_label.Hide()
+        self.results_list.Hide()
+
         # Buttons row
         hbox_buttons = wx.BoxSizer(wx.HORIZONTAL)
         self.upload_button = wx.Button(panel, label="&Upload")
         self.new_button = wx.Button(panel, label="&New...")
         self.download_button = wx.Button(panel, label="Down&load")
         self.copy_button = wx.Button(panel, label="C&opy")
+        self.copy_to_button = wx.Button(panel, label="Copy &To...")
+        self.move_button = wx.Button(panel, label="Mo&ve...")
         self.edit_button = wx.Button(panel, label="&Edit")
         self.delete_button = wx.Button(panel, label="&Delete")
+        self.search_button = wx.Button(panel, label="&Search...")
         close_button = wx.Button(panel, id=wx.ID_CANCEL, label="&Close")
 
         for btn in (
@@ -284,8 +632,11 @@ class FileBrowserDialog(wx.Dialog):
             self.new_button,
             self.download_button,
             self.copy_button,
+            self.copy_to_button,
+            self.move_button,
             self.edit_button,
             self.delete_button,
+            self.search_button,
         ):
             hbox_buttons.Add(btn, 0, wx.RIGHT, 5)
         hbox_buttons.AddStretchSpacer()
@@ -320,22 +671,31 @@ class FileBrowserDialog(wx.Dialog):
         self.Bind(wx.EVT_CLOSE, self.on_close)
         # Global-ish key handler inside this dialog
         self.Bind(wx.EVT_CHAR_HOOK, self.on_char_hook)
+        self.Bind(wx.EVT_TIMER, self._on_progress_timer, self.progress_timer)
 
         self.file_list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_item_activated)
         self.file_list.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_selection_changed)
         self.file_list.Bind(wx.EVT_LIST_ITEM_DESELECTED, self.on_selection_changed)
         self.file_list.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
+        self.file_list.Bind(wx.EVT_LIST_COL_CLICK, self.on_column_click)
+        self.filter_text.Bind(wx.EVT_TEXT, self.on_filter_changed)
 
         self.upload_button.Bind(wx.EVT_BUTTON, self.on_upload)
         self.new_button.Bind(wx.EVT_BUTTON, self.on_new)
         self.download_button.Bind(wx.EVT_BUTTON, self.on_download)
         self.copy_button.Bind(wx.EVT_BUTTON, self.on_copy)
+        self.copy_to_button.Bind(wx.EVT_BUTTON, self.on_copy_to)
+        self.move_button.Bind(wx.EVT_BUTTON, self.on_move)
+        self.search_button.Bind(wx.EVT_BUTTON, self.on_search)
+        self.results_list.Bind(wx.EVT_LISTBOX_DCLICK, self.on_result_activated)
+        self.results_list.Bind(wx.EVT_KEY_DOWN, self.on_results_key_down)
         self.edit_button.Bind(wx.EVT_BUTTON, self.on_edit_button)
         self.delete_button.Bind(wx.EVT_BUTTON, self.on_delete)
         self.progress_cancel_btn.Bind(wx.EVT_BUTTON, self.on_progress_cancel)
 
         theme.apply_dark_theme(self)
         self.populate_files()
+        wx.CallAfter(self._offer_resume)
 
     # ------------- progress helpers -------------
 
@@ -362,14 +722,60 @@ class FileBrowserDialog(wx.Dialog):
         self.progress_label.SetLabel(message)
         self.status_text.SetLabel(message)
 
+    def _pulse_progress(self, message: str):
+        """Shows activity when the amount of work isn't known in advance."""
+        if not self.progress_panel.IsShown():
+            return
+        self.progress_gauge.Pulse()
+        self.progress_label.SetLabel(message)
+        self.status_text.SetLabel(message)
+
+    def _begin_transfer_progress(self, progress, verb: str):
+        """Shows byte-level progress for a transfer, redrawn on a timer."""
+        self.transfer_progress = progress
+        self.transfer_verb = verb
+        self.last_milestone = 0
+        self.progress_gauge.SetRange(1000)
+        self.progress_gauge.SetValue(0)
+        self.progress_label.SetLabel(f"Starting {verb.lower()}...")
+        self.progress_cancel_btn.Enable(True)
+        self.progress_panel.Show()
+        self.Layout()
+        self.progress_timer.Start(PROGRESS_INTERVAL_MS)
+
+    def _describe_transfer(self):
+        progress = self.transfer_progress
+        text = describe_transfer_progress(*progress.snapshot())
+        if progress.total_files > 1:
+            text += f", file {progress.files_started} of {progress.total_files}"
+        return text
+
+    def _on_progress_timer(self, event):
+        progress = self.transfer_progress
+        if progress is None or not self.progress_panel.IsShown():
+            return
+        done, total = progress.done_bytes, max(1, progress.total_bytes)
+        self.progress_gauge.SetValue(min(1000, done * 1000 // total))
+        message = f"{self.transfer_verb}: {progress.current_file} - {self._describe_transfer()}"
+        if message != self.progress_label.GetLabel():
+            self.progress_label.SetLabel(message)
+            self.status_text.SetLabel(message)
+        milestone = min(90, done * 10 // total * 10)
+        if milestone > self.last_milestone:
+            self.last_milestone = milestone
+            if SPEAK_MILESTONES:
+                speech.speak(f"{milestone} percent", interrupt=False)
+
     def _end_progress(self, refresh: bool = False, final_message=None):
+        self.progress_timer.Stop()
+        self.transfer_progress = None
         self.progress_panel.Hide()
         self.progress_gauge.SetValue(0)
         self.progress_label.SetLabel("")
         self.progress_cancel_btn.Enable(False)
         self.Layout()
         if refresh:
-            self.populate_files()
+            self.populate_files(force=True)
         if final_message:
             self.status_text.SetLabel(final_message)
 
@@ -379,18 +785,30 @@ class FileBrowserDialog(wx.Dialog):
             self.status_text.SetLabel("Cancelling operation...")
             speech.speak("Cancelling operation", interrupt=True)
 
+    def _check_cancel(self):
+        if self.cancel_flag.is_set():
+            raise TransferCancelledError("Operation cancelled by user.")
+
+    def _transfer_report(self, action, manifest):
+        files = len(manifest.files)
+        folders = len(manifest.dirs)
+        report = f"{action} complete: {files} file{'s' if files != 1 else ''}, {human_readable_size(manifest.total_bytes)}"
+        if folders:
+            report += f", {folders} folder{'s' if folders != 1 else ''}"
+        return report + "."
+
     def _run_worker(self, target, *args):
+        """Runs target(sftp, *args) as a job of the SFTP service."""
         self.cancel_flag.clear()
-        t = threading.Thread(target=target, args=args)
-        t.daemon = True
-        self.worker_thread = t
-        t.start()
+        self.worker_future = self.service.run(target, *args)
 
     # ------------- accessibility / hotkey -------------
 
     def announce_progress(self):
         """Speak the current progress or status (Alt+Shift+P)."""
-        if self.progress_panel.IsShown():
+        if self.progress_panel.IsShown() and self.transfer_progress is not None:
+            msg = self._describe_transfer()
+        elif self.progress_panel.IsShown():
             msg = self.progress_label.GetLabel()
             if not msg:
                 msg = "Transfer in progress."
@@ -415,35 +833,130 @@ class FileBrowserDialog(wx.Dialog):
             self.populate_files()
         event.Skip()
 
-    def populate_files(self):
-        self.path_text.SetLabel(f"Path: {self.current_path}")
-        self.file_list.DeleteAllItems()
+    def populate_files(self, force=False):
+        """
+        Shows the current directory. A cached listing is shown at once; a
+        stale or missing one is (re)fetched in the background, and a missing
+        one is shown in batches as it arrives.
+        """
+        path = self.current_path
+        self.path_text.SetLabel(f"Path: {path}")
+        self.listing_token += 1
+        self.batched_count = 0
+        cached = self.dir_cache.get(path)
+        if cached is None:
+            self._show_listing([])
+            self.status_text.SetLabel("Loading...")
+            self._refresh_listing(path, progressive=True)
+        else:
+            entries, fresh = cached
+            self._show_listing(entries)
+            if force or not fresh:
+                self._refresh_listing(path)
 
-        if self.current_path != "/":
-            idx = self.file_list.InsertItem(self.file_list.GetItemCount(), "..")
-            self.file_list.SetItem(idx, 2, "Parent Directory")
+    def _refresh_listing(self, path, progressive=False):
+        if path in self.refreshing:
+            return
+        self.refreshing.add(path)
+        token = self.listing_token
+
+        def worker(sftp):
+            if not progressive:
+                return self.dir_cache.put(path, sftp.listdir_attr(path))
+            # Jobs have a channel to themselves, so the listing can be shown
+            # in batches as listdir_iter() reads it.
+            attrs = []
+            for attr in sftp.listdir_iter(path):
+                attrs.append(attr)
+                if len(attrs) % LISTING_BATCH == 0:
+                    batch = listing_entries(attrs[-LISTING_BATCH:])
+                    wx.CallAfter(self._on_listing_batch, path, token, batch)
+            return self.dir_cache.put(path, attrs)
+
+        # A first listing may be huge, so it runs as a job; revalidating a
+        # cached one is a single request.
+        submit = self.service.run if progressive else self.service.call
+        submit(
+            worker,
+            on_done=lambda entries: self._on_listing_loaded(path, token, entries, None),
+            on_error=lambda error: self._on_listing_loaded(path, token, None, error),
+        )
 
-        try:
-            for attr in self.sftp.listdir_attr(self.current_path):
-                idx = self.file_list.InsertItem(
-                    self.file_list.GetItemCount(), attr.filename
-                )
-                self.file_list.SetItem(idx, 1, human_readable_size(attr.st_size))
-                mode = attr.st_mode
-                if stat.S_ISDIR(mode):
-                    self.file_list.SetItem(idx, 2, "Directory")
-                else:
-                    self.file_list.SetItem(idx, 2, "File")
-        except Exception as e:
+    def _on_listing_batch(self, path, token, batch):
+        if not self or token != self.listing_token or path != self.current_path:
+            return
+        model = self.file_list.model
+        model.extend(batch)
+        self.batched_count += len(batch)
+        self.file_list.refresh()
+        self.status_text.SetLabel(f"Loading... {model.total} items so far")
+
+    def _on_listing_loaded(self, path, token, entries, error):
+        if not self:
+            return
+        self.refreshing.discard(path)
+        if path != self.current_path:
+            return
+        if self.status_text.GetLabel().startswith("Loading..."):
+            self.status_text.SetLabel(" ")
+        if error is not None:
             wx.MessageBox(
-                f"Could not list directory: {e}", "SFTP Error", wx.ICON_ERROR
+                f"Could not list directory: {error}", "SFTP Error", wx.ICON_ERROR
             )
-            self.current_path = "/"
+            if path != "/":
+                self.current_path = "/"
+                self.populate_files()
+            return
+        if self.batched_count and token == self.listing_token:
+            # The first batches are already on screen; add the rest.
+            self.file_list.model.extend(entries[self.batched_count:])
+            self.batched_count = 0
+            self.shown_entries = entries
+            self.file_list.refresh(self.select_after_load)
+            self.select_after_load = None
+            self.on_selection_changed(None)
+        elif entries != self.shown_entries:
+            self._show_listing(entries)
+
+    def _show_listing(self, entries):
+        """Loads entries into the list, keeping the sort order, filter and selection."""
+        selected = self.select_after_load
+        self.select_after_load = None
+        idx = self.file_list.GetFirstSelected()
+        if selected is None and idx != -1:
+            selected = self.file_list.GetItemText(idx)
+        self.shown_entries = entries
+        model = self.file_list.model
+        sort_key, descending = model.sort_key, model.descending
+        model.clear()
+        model.filter_text = self.filter_text.GetValue().lower()
+        model.sort_key, model.descending = sort_key, descending
+        model.extend(entries)
+        self.file_list.has_parent = self.current_path != "/"
+        self.file_list.refresh(selected)
+        self.on_selection_changed(None)
 
+    def on_filter_changed(self, event):
+        self.file_list.model.set_filter(self.filter_text.GetValue())
+        self.file_list.refresh()
+        model = self.file_list.model
+        if model.filter_text:
+            self.status_text.SetLabel(f"{len(model)} of {model.total} items shown")
+        else:
+            self.status_text.SetLabel(" ")
         self.on_selection_changed(None)
 
+    def on_column_click(self, event):
+        self._sort_by_column(event.GetColumn())
+
+    def _sort_by_column(self, column):
+        message = self.file_list.sort_by_column(column)
+        self.status_text.SetLabel(message)
+        speech.speak(message, interrupt=True)
+
     def on_close(self, event):
-        if self.worker_thread and self.worker_thread.is_alive():
+        self.progress_timer.Stop()
+        if self.worker_future and not self.worker_future.done():
             self.cancel_flag.set()
         if self.copy_temp_dir and os.path.exists(self.copy_temp_dir):
             try:
@@ -458,10 +971,14 @@ class FileBrowserDialog(wx.Dialog):
             self.go_to_parent_directory()
         elif keycode == wx.WXK_DELETE:
             wx.CallAfter(self.on_delete, None)
+        elif keycode == wx.WXK_F2:
+            wx.CallAfter(self.on_move, None)
         elif event.ControlDown() and keycode == ord("V"):
             wx.CallAfter(self.on_paste_upload)
         elif event.ControlDown() and keycode == ord("C"):
             wx.CallAfter(self.on_copy, None)
+        elif event.ControlDown() and keycode in (ord("1"), ord("2"), ord("3")):
+            self._sort_by_column(keycode - ord("1"))
         else:
             event.Skip()
 
@@ -469,6 +986,8 @@ class FileBrowserDialog(wx.Dialog):
         count = self.file_list.GetSelectedItemCount()
         self.download_button.Enable(count > 0)
         self.copy_button.Enable(count > 0)
+        self.copy_to_button.Enable(count > 0)
+        self.move_button.Enable(count > 0)
         self.delete_button.Enable(count > 0)
 
         if count == 1:
@@ -565,44 +1084,28 @@ class FileBrowserDialog(wx.Dialog):
         self.status_text.SetLabel("Preparing to copy files...")
         self._run_worker(self._copy_worker, remote_paths)
 
-    def _copy_worker(self, remote_paths):
+    def _copy_worker(self, sftp, remote_paths):
         try:
+            # The copies are made afresh each time; files that haven't
+            # changed come from the file cache rather than the server.
             if self.copy_temp_dir and os.path.exists(self.copy_temp_dir):
                 shutil.rmtree(self.copy_temp_dir, ignore_errors=True)
             self.copy_temp_dir = tempfile.mkdtemp(prefix="teatype_copy_")
 
-            total = 0
-            for p in remote_paths:
-                total += count_remote_items(self.sftp, p, self.cancel_flag)
-            wx.CallAfter(self._begin_progress, total, "Starting copy...")
-            done = [0]
-
-            def file_cb(path):
-                done[0] += 1
-                wx.CallAfter(
-                    self._update_progress,
-                    done[0],
-                    f"Copying: {os.path.basename(path)}",
-                )
-
+            manifest = TransferManifest("get")
             local_paths = []
             for remote_path in remote_paths:
-                if self.cancel_flag.is_set():
-                    raise TransferCancelledError("Copy cancelled")
                 name = os.path.basename(remote_path)
                 local_path = os.path.join(self.copy_temp_dir, name)
                 local_paths.append(local_path)
-                download_item(
-                    self.sftp,
-                    remote_path,
-                    local_path,
-                    file_cb,
-                    self.cancel_flag,
-                )
+                manifest.add_remote(sftp, remote_path, local_path, self.cancel_flag)
+            progress = TransferProgress(manifest.total_bytes, len(manifest.files))
+            wx.CallAfter(self._begin_transfer_progress, progress, "Copying")
+            transfer_manifest(sftp, manifest, progress.file_started, self.cancel_flag, self.service.transfer_pool, progress, self.service.server_id)
 
             if not self.cancel_flag.is_set():
                 wx.CallAfter(self._put_paths_on_clipboard, local_paths)
-                wx.CallAfter(self._end_progress, False, "Copy complete.")
+                wx.CallAfter(self._end_progress, False, self._transfer_report("Copy", manifest))
             else:
                 wx.CallAfter(self._end_progress, False, "Copy cancelled.")
         except TransferCancelledError:
@@ -627,40 +1130,25 @@ class FileBrowserDialog(wx.Dialog):
         self.status_text.SetLabel("Preparing to upload...")
         self._run_worker(self._upload_worker, local_paths)
 
-    def _upload_worker(self, local_paths):
+    def _upload_worker(self, sftp, local_paths):
         try:
-            total = 0
-            for p in local_paths:
-                total += count_local_items(p, self.cancel_flag)
-            wx.CallAfter(self._begin_progress, total, "Starting upload...")
-            done = [0]
-
-            def file_cb(path):
-                done[0] += 1
-                wx.CallAfter(
-                    self._update_progress,
-                    done[0],
-                    f"Uploading: {os.path.basename(path)}",
-                )
-
+            manifest = TransferManifest("put")
             for local_path in local_paths:
-                if self.cancel_flag.is_set():
-                    raise TransferCancelledError("Upload cancelled")
                 name = os.path.basename(local_path)
                 if self.current_path == "/":
                     remote_path = f"/{name}"
                 else:
                     remote_path = f"{self.current_path}/{name}"
-                upload_item(
-                    self.sftp,
-                    local_path,
-                    remote_path,
-                    file_cb,
-                    self.cancel_flag,
-                )
+                manifest.add_local(local_path, remote_path, self.cancel_flag)
+            self.dir_cache.invalidate(self.current_path)
+            for entry in manifest.dirs:
+                self.dir_cache.invalidate(entry.dest)
+            progress = TransferProgress(manifest.total_bytes, len(manifest.files))
+            wx.CallAfter(self._begin_transfer_progress, progress, "Uploading")
+            transfer_manifest(sftp, manifest, progress.file_started, self.cancel_flag, self.service.transfer_pool, progress)
 
             if not self.cancel_flag.is_set():
-                wx.CallAfter(self._end_progress, True, "Upload complete.")
+                wx.CallAfter(self._end_progress, True, self._transfer_report("Upload", manifest))
             else:
                 wx.CallAfter(self._end_progress, False, "Upload cancelled.")
         except TransferCancelledError:
@@ -671,6 +1159,68 @@ class FileBrowserDialog(wx.Dialog):
             )
             wx.CallAfter(self._end_progress, False, "Upload failed.")
 
+    # -------------- Resuming interrupted transfers --------------
+
+    def _offer_resume(self):
+        try:
+            journals = TransferJournal.unfinished(self.service.server_id)
+        except Exception as e:
+            print(f"Warning: Could not read transfer journals: {e}")
+            return
+        if not journals:
+            return
+        names = "\n".join(
+            f"{'Upload' if j['direction'] == 'put' else 'Download'}: {os.path.basename(j['source'])}"
+            for j in journals[:10]
+        )
+        if len(journals) > 10:
+            names += f"\n...and {len(journals) - 10} more"
+        answer = wx.MessageBox(
+            f"{len(journals)} interrupted transfer(s) can carry on where they left off:\n\n"
+            f"{names}\n\nResume them now? Choose No to discard them.",
+            "Resume Transfers",
+            wx.YES_NO | wx.CANCEL | wx.ICON_QUESTION,
+            self,
+        )
+        if answer == wx.YES:
+            self.status_text.SetLabel("Preparing to resume transfers...")
+            self._run_worker(self._resume_worker, journals)
+        elif answer == wx.NO:
+            for data in journals:
+                self.service.call(
+                    discard_unfinished, data,
+                    on_error=lambda e: print(f"Warning: Could not discard interrupted transfer: {e}"),
+                )
+
+    def _resume_worker(self, sftp, journals):
+        try:
+            jobs = []
+            for data in journals:
+                try:
+                    jobs.append(resume_job(sftp, data))
+                    if data["direction"] == "put":
+                        self.dir_cache.invalidate_parent(data["dest"])
+                except FileNotFoundError as e:
+                    # The source is gone, so it could never be resumed.
+                    print(f"Warning: Cannot resume {data['source']}, discarding it: {e}")
+                    try:
+                        discard_unfinished(sftp, data)
+                    except (IOError, OSError) as e:
+                        print(f"Warning: Could not discard interrupted transfer: {e}")
+                except (IOError, OSError) as e:
+                    print(f"Warning: Cannot resume {data['source']}: {e}")
+            progress = TransferProgress(sum(job.size for job in jobs), len(jobs))
+            wx.CallAfter(self._begin_transfer_progress, progress, "Resuming")
+            run_transfers(sftp, jobs, progress.file_started, self.cancel_flag, self.service.transfer_pool, progress)
+            wx.CallAfter(self._end_progress, True, "Transfers resumed and complete.")
+        except TransferCancelledError:
+            wx.CallAfter(self._end_progress, False, "Resume cancelled.")
+        except Exception as e:
+            wx.CallAfter(
+                wx.MessageBox, f"Resume failed: {e}", "Error", wx.ICON_ERROR
+            )
+            wx.CallAfter(self._end_progress, False, "Resume failed.")
+
     # -------------- Download --------------
 
     def on_download(self, event):
@@ -684,37 +1234,19 @@ class FileBrowserDialog(wx.Dialog):
         self.status_text.SetLabel("Preparing to download...")
         self._run_worker(self._download_worker, remote_paths, dest)
 
-    def _download_worker(self, remote_paths, dest):
+    def _download_worker(self, sftp, remote_paths, dest):
         try:
-            total = 0
-            for p in remote_paths:
-                total += count_remote_items(self.sftp, p, self.cancel_flag)
-            wx.CallAfter(self._begin_progress, total, "Starting download...")
-            done = [0]
-
-            def file_cb(path):
-                done[0] += 1
-                wx.CallAfter(
-                    self._update_progress,
-                    done[0],
-                    f"Downloading: {os.path.basename(path)}",
-                )
-
+            manifest = TransferManifest("get")
             for remote_path in remote_paths:
-                if self.cancel_flag.is_set():
-                    raise TransferCancelledError("Download cancelled")
                 name = os.path.basename(remote_path)
                 local_path = os.path.join(dest, name)
-                download_item(
-                    self.sftp,
-                    remote_path,
-                    local_path,
-                    file_cb,
-                    self.cancel_flag,
-                )
+                manifest.add_remote(sftp, remote_path, local_path, self.cancel_flag)
+            progress = TransferProgress(manifest.total_bytes, len(manifest.files))
+            wx.CallAfter(self._begin_transfer_progress, progress, "Downloading")
+            transfer_manifest(sftp, manifest, progress.file_started, self.cancel_flag, self.service.transfer_pool, progress, self.service.server_id)
 
             if not self.cancel_flag.is_set():
-                wx.CallAfter(self._end_progress, False, "Download complete.")
+                wx.CallAfter(self._end_progress, False, self._transfer_report("Download", manifest))
             else:
                 wx.CallAfter(self._end_progress, False, "Download cancelled.")
         except TransferCancelledError:
@@ -747,24 +1279,20 @@ class FileBrowserDialog(wx.Dialog):
         self.status_text.SetLabel("Deleting selected items...")
         self._run_worker(self._delete_worker, remote_paths)
 
-    def _delete_worker(self, remote_paths):
+    def _delete_worker(self, sftp, remote_paths):
         try:
-            total = len(remote_paths)
-            wx.CallAfter(self._begin_progress, total, "Starting deletion...")
-            for i, remote_path in enumerate(remote_paths):
-                if self.cancel_flag.is_set():
-                    raise TransferCancelledError("Delete cancelled")
-                name = os.path.basename(remote_path)
-                wx.CallAfter(
-                    self._update_progress,
-                    i + 1,
-                    f"Deleting: {name}",
-                )
-                delete_item(self.sftp, remote_path)
-            if not self.cancel_flag.is_set():
-                wx.CallAfter(self._end_progress, True, "Delete complete.")
-            else:
-                wx.CallAfter(self._end_progress, True, "Delete cancelled.")
+            wx.CallAfter(self._begin_progress, 0, "Starting deletion...")
+
+            def status(count):
+                wx.CallAfter(self._pulse_progress, f"Deleting: {count} item{'s' if count != 1 else ''} removed")
+
+            try:
+                delete_items(sftp, remote_paths, status, self._check_cancel)
+            finally:
+                for remote_path in remote_paths:
+                    self.dir_cache.forget_tree(remote_path)
+                    self.dir_cache.invalidate_parent(remote_path)
+            wx.CallAfter(self._end_progress, True, "Delete complete.")
         except TransferCancelledError:
             wx.CallAfter(self._end_progress, True, "Delete cancelled.")
         except Exception as e:
@@ -773,6 +1301,145 @@ class FileBrowserDialog(wx.Dialog):
             )
             wx.CallAfter(self._end_progress, True, "Deletion failed.")
 
+    # -------------- Copy / move on the server --------------
+
+    def on_copy_to(self, event):
+        self._ask_server_side("Copy", copy_items)
+
+    def on_move(self, event):
+        self._ask_server_side("Move", move_items)
+
+    def _ask_server_side(self, action, operation):
+        remote_paths = self.get_selected_remote_paths()
+        if not remote_paths:
+            return
+        if len(remote_paths) == 1:
+            message = f"{action} '{os.path.basename(remote_paths[0])}' to a new name, or a folder path:"
+            default = os.path.basename(remote_paths[0])
+        else:
+            message = f"{action} {len(remote_paths)} items to folder:"
+            default = self.current_path
+        with wx.TextEntryDialog(self, message, f"{action} on Server", default) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            dest = dlg.GetValue().strip()
+        if not dest:
+            return
+        # Relative names are taken from the folder being shown.
+        dest = posixpath.normpath(posixpath.join(self.current_path, dest))
+        if dest in remote_paths:
+            return
+        self.status_text.SetLabel(f"Preparing to {action.lower()}...")
+        self._run_worker(self._server_side_worker, action, operation, remote_paths, dest)
+
+    def _server_side_worker(self, sftp, action, operation, remote_paths, dest):
+        verb = "Copying" if action == "Copy" else "Moving"
+        try:
+            wx.CallAfter(self._begin_progress, 0, f"{verb}...")
+
+            def status(count):
+                wx.CallAfter(self._pulse_progress, f"{verb}: {count} item{'s' if count != 1 else ''} done")
+
+            try:
+                operation(sftp, remote_paths, dest, status, self._check_cancel)
+            finally:
+                if action == "Move":
+                    for remote_path in remote_paths:
+                        self.dir_cache.forget_tree(remote_path)
+                        self.dir_cache.invalidate_parent(remote_path)
+                self.dir_cache.forget_tree(dest)
+                self.dir_cache.invalidate_parent(dest)
+            wx.CallAfter(self._end_progress, True, f"{action} complete.")
+        except TransferCancelledError:
+            wx.CallAfter(self._end_progress, True, f"{action} cancelled.")
+        except Exception as e:
+            wx.CallAfter(
+                wx.MessageBox, f"{action} failed: {e}", "Error", wx.ICON_ERROR
+            )
+            wx.CallAfter(self._end_progress, True, f"{action} failed.")
+
+    # -------------- Search on the server --------------
+
+    def on_search(self, event):
+        with SearchDialog(self, *self.last_search) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            text, contents, match_case = dlg.get_values()
+        if not text:
+            return
+        self.last_search = (text, contents, match_case)
+        self.search_root = self.current_path
+        self.search_hits = []
+        self.results_list.Clear()
+        self.results_label.Show()
+        self.results_list.Show()
+        self.Layout()
+        self.status_text.SetLabel("Searching...")
+        self._run_worker(self._search_worker, self.search_root, text, contents, match_case)
+
+    def _search_worker(self, sftp, root, text, contents, match_case):
+        try:
+            wx.CallAfter(self._begin_progress, 0, f"Searching for {text}...")
+            count, truncated = search_items(
+                sftp, root, text, contents, match_case,
+                lambda paths: wx.CallAfter(self._add_search_hits, paths),
+                self._check_cancel,
+            )
+            if truncated:
+                message = f"Search stopped after the first {count} results."
+            else:
+                message = f"Search complete: {count} result{'s' if count != 1 else ''}."
+            wx.CallAfter(self._end_progress, False, message)
+            wx.CallAfter(speech.speak, message, False)
+        except TransferCancelledError:
+            wx.CallAfter(self._end_progress, False, "Search cancelled.")
+        except Exception as e:
+            wx.CallAfter(
+                wx.MessageBox, f"Search failed: {e}", "Error", wx.ICON_ERROR
+            )
+            wx.CallAfter(self._end_progress, False, "Search failed.")
+
+    def _add_search_hits(self, paths):
+        if not self:
+            return
+        first = not self.search_hits
+        self.search_hits.extend(paths)
+        prefix = self.search_root.rstrip("/") + "/"
+        self.results_list.Append([p[len(prefix):] if p.startswith(prefix) else p for p in paths])
+        count = len(self.search_hits)
+        self._pulse_progress(f"Searching: {count} result{'s' if count != 1 else ''} so far")
+        if first:
+            self.results_list.SetSelection(0)
+
+    def on_results_key_down(self, event):
+        if event.GetKeyCode() in (wx.WXK_RETURN, wx.WXK_NUMPAD_ENTER):
+            self._open_search_hit(reveal=event.ShiftDown())
+        else:
+            event.Skip()
+
+    def on_result_activated(self, event):
+        self._open_search_hit(reveal=False)
+
+    def _open_search_hit(self, reveal):
+        """
+        Opens the selected hit: a folder is shown in the browser and a file is
+        opened for editing, or with reveal, shown selected in its folder.
+        """
+        index = self.results_list.GetSelection()
+        if index == wx.NOT_FOUND:
+            return
+        path = self.search_hits[index]
+        if path.endswith("/"):
+            self.current_path = path.rstrip("/") or "/"
+        elif reveal:
+            self.current_path = posixpath.dirname(path) or "/"
+            self.select_after_load = posixpath.basename(path)
+        else:
+            self.edit_callback(path)
+            return
+        self.populate_files()
+        self.file_list.SetFocus()
+
     # -------------- New file / directory --------------
 
     def on_new(self, event):
@@ -797,13 +1464,13 @@ class FileBrowserDialog(wx.Dialog):
             remote_path = f"/{name}"
         else:
             remote_path = f"{self.current_path}/{name}"
-        try:
-            self.sftp.mkdir(remote_path)
-            self.populate_files()
-        except Exception as e:
-            wx.MessageBox(
+        self.service.mkdir(
+            remote_path,
+            on_done=self._on_created,
+            on_error=lambda e: wx.MessageBox(
                 f"Failed to create directory: {e}", "Error", wx.ICON_ERROR
-            )
+            ),
+        )
 
     def on_new_file(self, event):
         with wx.TextEntryDialog(
@@ -818,9 +1485,14 @@ class FileBrowserDialog(wx.Dialog):
             remote_path = f"/{name}"
         else:
             remote_path = f"{self.current_path}/{name}"
-        try:
-            with self.sftp.open(remote_path, "w"):
-                pass
-            self.populate_files()
-        except Exception as e:
-            wx.MessageBox(f"Failed to create file: {e}", "Error", wx.ICON_ERROR)
+        self.service.create_file(
+            remote_path,
+            on_done=self._on_created,
+            on_error=lambda e: wx.MessageBox(
+                f"Failed to create file: {e}", "Error", wx.ICON_ERROR
+            ),
+        )
+
+    def _on_created(self, result):
+        self.dir_cache.invalidate(self.current_path)
+        self.populate_files()
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import server_store
+
+# Seconds a listing is shown without being fetched again.
+CACHE_TTL = 30
+# Directories remembered per session, least recently used dropped first.
+MAX_CACHED_DIRS = 500
+# Whether listings are saved on disconnect and shown on the next visit.
+# Adjustable from the Settings menu.
+PERSIST_LISTINGS = False
+CACHE_DIR = os.path.join(server_store.CONFIG_DIR, "listings")
+
+# The parts of an SFTPAttributes the file browser uses.
+ListingEntry = namedtuple("ListingEntry", "filename st_size st_mode st_mtime")
+
+
+def listing_entries(attrs):
+    """Converts SFTPAttributes from a directory listing to ListingEntry tuples."""
+    return [
+        ListingEntry(a.filename, a.st_size or 0, a.st_mode or 0, a.st_mtime or 0)
+        for a in attrs
+    ]
+
+
+def set_persist_listings(enabled: bool):
+    """Enables or disables saving directory listings between sessions."""
+    global PERSIST_LISTINGS
+    PERSIST_LISTINGS = enabled
+
+
+class DirectoryCache:
+    """
+    Directory listings of one server, keyed by remote path.
+
+    A listing younger than CACHE_TTL is fresh and can be shown without
+    touching the network. Older listings, listings loaded from disk and
+    listings of directories we have just changed ourselves are stale: they
+    are still returned so the browser can show them at once, but the caller
+    should fetch the directory again and put() the result. Safe to use from
+    any thread.
+    """
+
+    def __init__(self, server=None):
+        self.server = server
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def get(self, path):
+        """Returns (entries, fresh) for path, or None if it was never listed."""
+        self._load()
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is None:
+                return None
+            self._listings.move_to_end(path)
+            fetched, entries = cached
+        return entries, time.monotonic() - fetched < CACHE_TTL
+
+    def put(self, path, attrs):
+        """Stores a fresh listing from listdir_attr() and returns its entries."""
+        entries = listing_entries(attrs)
+        with self._lock:
+            self._listings[path] = (time.monotonic(), entries)
+            self._listings.move_to_end(path)
+            while len(self._listings) > MAX_CACHED_DIRS:
+                self._listings.popitem(last=False)
+        return entries
+
+    def invalidate(self, path):
+        """Marks a listing stale after its directory was changed."""
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached is not None:
+                self._listings[path] = (float("-inf"), cached[1])
+
+    def invalidate_parent(self, path):
+        self.invalidate(posixpath.dirname(path.rstrip("/")) or "/")
+
+    def forget_tree(self, path):
+        """Drops listings of a removed directory and everything below it."""
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            for key in [k for k in self._listings if k == path or k.startswith(prefix)]:
+                del self._listings[key]
+
+    def _file_path(self):
+        name = hashlib.sha1(self.server.encode("utf-8")).hexdigest()
+        return os.path.join(CACHE_DIR, name + ".json.gz")
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not (PERSIST_LISTINGS and self.server):
+            return
+        try:
+            with gzip.open(self._file_path(), "rt", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for path, rows in saved.items():
+                if path not in self._listings:
+                    # Shown straight away, but always checked again.
+                    entries = [ListingEntry(*row) for row in rows]
+                    self._listings[path] = (float("-inf"), entries)
+                    self._listings.move_to_end(path, last=False)
+
+    def save(self):
+        """Writes the listings to disk if persistence is enabled."""
+        if not (PERSIST_LISTINGS and self.server):
+            return
+        with self._lock:
+            saved = {path: [list(e) for e in entries] for path, (_, entries) in self._listings.items()}
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = self._file_path() + ".tmp"
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(saved, f)
+            os.replace(tmp, self._file_path())
+        except OSError as e:
+            print(f"Warning: Could not save directory listings: {e}")
@@ -1,7 +1,15 @@
+import io
+import re
 import wx
 import os
+import speech
 import theme
+import file_cache
+from large_file import LargeFileDocument, PAGE_LINES
+from line_index import LineIndex
 from menu_mixin import SettingsMenuMixin
+from remote_file import SaveConflictError, diff_with_remote, digest, download_file, read_file, save_file
+from text_search import SearchMirror, SearchQuery, compile_query
 
 
 class FindDialog(wx.Dialog):
@@ -17,9 +25,13 @@ class FindDialog(wx.Dialog):
         self.find_text = wx.TextCtrl(panel, style=wx.TE_PROCESS_ENTER)
         vbox.Add(self.find_text, 0, wx.EXPAND | wx.ALL, 5)
 
-        # Match case
+        # Match case, whole word, regular expression
         self.case_checkbox = wx.CheckBox(panel, label="Match &case")
         vbox.Add(self.case_checkbox, 0, wx.ALL, 5)
+        self.word_checkbox = wx.CheckBox(panel, label="&Whole word")
+        vbox.Add(self.word_checkbox, 0, wx.ALL, 5)
+        self.regex_checkbox = wx.CheckBox(panel, label="Regular e&xpression")
+        vbox.Add(self.regex_checkbox, 0, wx.ALL, 5)
 
         # Direction
         dir_box = wx.StaticBox(panel, label="Direction")
@@ -37,8 +49,10 @@ class FindDialog(wx.Dialog):
         # Buttons
         btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
         find_next_btn = wx.Button(panel, wx.ID_OK, "&Find Next")
+        find_all_btn = wx.Button(panel, wx.ID_ANY, "Find &All")
         close_btn = wx.Button(panel, wx.ID_CANCEL, "&Close")
         btn_sizer.Add(find_next_btn, 0, wx.RIGHT, 5)
+        btn_sizer.Add(find_all_btn, 0, wx.RIGHT, 5)
         btn_sizer.Add(close_btn, 0)
         vbox.Add(btn_sizer, 0, wx.ALL | wx.ALIGN_RIGHT, 5)
 
@@ -47,6 +61,7 @@ class FindDialog(wx.Dialog):
         self.find_text.SetFocus()
 
         find_next_btn.Bind(wx.EVT_BUTTON, self.on_find_next)
+        find_all_btn.Bind(wx.EVT_BUTTON, self.on_find_all)
         self.find_text.Bind(wx.EVT_TEXT_ENTER, self.on_find_next)
 
         theme.apply_dark_theme(self)
@@ -57,8 +72,20 @@ class FindDialog(wx.Dialog):
             self.find_text.GetValue(),
             self.case_checkbox.IsChecked(),
             direction,
+            regex=self.regex_checkbox.IsChecked(),
+            whole_word=self.word_checkbox.IsChecked(),
         )
 
+    def on_find_all(self, event):
+        chosen = self.parent.do_find_all(
+            self.find_text.GetValue(),
+            self.case_checkbox.IsChecked(),
+            regex=self.regex_checkbox.IsChecked(),
+            whole_word=self.word_checkbox.IsChecked(),
+        )
+        if chosen:
+            self.EndModal(wx.ID_OK)
+
 
 class ReplaceDialog(wx.Dialog):
     def __init__(self, parent, title="Find and Replace"):
@@ -78,9 +105,13 @@ class ReplaceDialog(wx.Dialog):
         self.replace_text = wx.TextCtrl(panel, style=wx.TE_PROCESS_ENTER)
         vbox.Add(self.replace_text, 0, wx.EXPAND | wx.ALL, 5)
 
-        # Match case
+        # Match case, whole word, regular expression
         self.case_checkbox = wx.CheckBox(panel, label="Match &case")
         vbox.Add(self.case_checkbox, 0, wx.ALL, 5)
+        self.word_checkbox = wx.CheckBox(panel, label="&Whole word")
+        vbox.Add(self.word_checkbox, 0, wx.ALL, 5)
+        self.regex_checkbox = wx.CheckBox(panel, label="Regular e&xpression")
+        vbox.Add(self.regex_checkbox, 0, wx.ALL, 5)
 
         # Direction
         dir_box = wx.StaticBox(panel, label="Direction")
@@ -123,6 +154,8 @@ class ReplaceDialog(wx.Dialog):
             self.find_text.GetValue(),
             self.case_checkbox.IsChecked(),
             direction,
+            regex=self.regex_checkbox.IsChecked(),
+            whole_word=self.word_checkbox.IsChecked(),
         )
 
     def on_replace(self, event):
@@ -132,6 +165,8 @@ class ReplaceDialog(wx.Dialog):
             self.replace_text.GetValue(),
             self.case_checkbox.IsChecked(),
             direction,
+            regex=self.regex_checkbox.IsChecked(),
+            whole_word=self.word_checkbox.IsChecked(),
         )
 
     def on_replace_all(self, event):
@@ -139,23 +174,119 @@ class ReplaceDialog(wx.Dialog):
             self.find_text.GetValue(),
             self.replace_text.GetValue(),
             self.case_checkbox.IsChecked(),
+            regex=self.regex_checkbox.IsChecked(),
+            whole_word=self.word_checkbox.IsChecked(),
+        )
+
+
+class FindResultsDialog(wx.Dialog):
+    """Lists Find All matches by line; the chosen one is get_selection()."""
+
+    def __init__(self, parent, results, truncated):
+        super(FindResultsDialog, self).__init__(parent, title="Find All", size=(600, 400))
+
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        label = f"{len(results)} matches"
+        if truncated:
+            label += f", only the first {len(results)} are listed"
+        vbox.Add(wx.StaticText(panel, label=f"&Results ({label}):"), 0, wx.ALL, 5)
+        self.results_list = wx.ListBox(
+            panel, choices=[f"Line {r.line}: {r.text.strip()}" for r in results]
+        )
+        self.results_list.SetSelection(0)
+        vbox.Add(self.results_list, 1, wx.EXPAND | wx.ALL, 5)
+
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        go_btn = wx.Button(panel, wx.ID_OK, "&Go To")
+        go_btn.SetDefault()
+        close_btn = wx.Button(panel, wx.ID_CANCEL, "&Close")
+        btn_sizer.Add(go_btn, 0, wx.RIGHT, 5)
+        btn_sizer.Add(close_btn, 0)
+        vbox.Add(btn_sizer, 0, wx.ALL | wx.ALIGN_RIGHT, 5)
+
+        panel.SetSizer(vbox)
+        self.results_list.SetFocus()
+        self.results_list.Bind(wx.EVT_LISTBOX_DCLICK, lambda e: self.EndModal(wx.ID_OK))
+
+        theme.apply_dark_theme(self)
+
+    def get_selection(self):
+        return self.results_list.GetSelection()
+
+
+class CompareDialog(wx.Dialog):
+    """Shows how the editor's text differs from the file on the server."""
+
+    def __init__(self, parent, name, diff):
+        super(CompareDialog, self).__init__(parent, title=f"Compare - {name}", size=(640, 480))
+
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        vbox.Add(wx.StaticText(panel, label="&Differences:"), 0, wx.ALL, 5)
+        self.diff_text = wx.TextCtrl(
+            panel, value="\n".join(diff), style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_DONTWRAP
         )
+        vbox.Add(self.diff_text, 1, wx.EXPAND | wx.ALL, 5)
+
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        reload_btn = wx.Button(panel, wx.ID_OK, "&Reload from Server")
+        close_btn = wx.Button(panel, wx.ID_CANCEL, "&Close")
+        btn_sizer.Add(reload_btn, 0, wx.RIGHT, 5)
+        btn_sizer.Add(close_btn, 0)
+        vbox.Add(btn_sizer, 0, wx.ALL | wx.ALIGN_RIGHT, 5)
+
+        panel.SetSizer(vbox)
+        self.SetEscapeId(wx.ID_CANCEL)
+        theme.apply_dark_theme(self)
+        self.diff_text.SetFocus()
 
 
 class EditorFrame(wx.Frame, SettingsMenuMixin):
-    def __init__(self, parent, title, local_path, remote_path, sftp_client):
+    """
+    Edits a remote file. Small files are passed in as data, read straight
+    from the server; big ones as local_path, a downloaded copy, which is
+    opened in large-file mode: a LargeFileDocument maps it and the text
+    control shows one page of PAGE_LINES lines of it at a time.
+
+    Saving goes through the session's SFTPService, so the editor stays
+    responsive while it runs. Nothing is sent if the text is unchanged, and
+    the save is refused if the file changed on the server since version,
+    its mtime and size when opened.
+    """
+
+    def __init__(self, parent, title, local_path, remote_path, sftp_service, data=None, version=None):
         wx.Frame.__init__(self, parent, title=title, size=(800, 600))
         SettingsMenuMixin.__init__(self)
 
         self.parent = parent  # main frame, used for notify_editor_closed
         self.local_path = local_path
         self.remote_path = remote_path
-        self.sftp = sftp_client
+        self.sftp = sftp_service
+        self.saving = False
+        self.version = version
+        # Hash of the text as last loaded or saved, and its line breaks.
+        self.digest = None
+        self.newline = "\n"
+        # The last change on the server the user was told about.
+        self.remote_change = None
+        # Large-file mode: the document, the page shown and whether it was edited.
+        self.document = None
+        self.page = 0
+        self.page_dirty = False
 
         self.is_modified = False
         self.last_search_string = ""
         self.last_search_flags = 0
         self.last_search_direction = "down"
+        self.last_search_regex = False
+        self.mirror = SearchMirror()
+        # Line starts of the text in the control, and the selection just
+        # before an edit we know is coming, so the index can follow it.
+        self.lines = LineIndex()
+        self._edit_selection = None
+        self._position_text = ""
 
         # Text control
         self.text_ctrl = wx.TextCtrl(
@@ -176,6 +307,8 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
         # File menu
         file_menu = wx.Menu()
         save_item = file_menu.Append(wx.ID_SAVE, "&Save\tCtrl+S")
+        reload_item = file_menu.Append(wx.ID_ANY, "&Reload from Server\tCtrl+R")
+        compare_item = file_menu.Append(wx.ID_ANY, "Compare with Ser&ver\tCtrl+D")
         close_item = file_menu.Append(wx.ID_CLOSE, "&Close\tCtrl+W")
         menu_bar.Append(file_menu, "&File")
 
@@ -197,6 +330,14 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
         find_next_item = search_menu.Append(wx.ID_ANY, "Find &Next\tF3")
         replace_item = search_menu.Append(wx.ID_REPLACE, "Find and &Replace\tCtrl+H")
         goto_item = search_menu.Append(wx.ID_ANY, "&Go To Line\tCtrl+G")
+        search_menu.AppendSeparator()
+        toggle_bookmark_item = search_menu.Append(wx.ID_ANY, "Toggle &Bookmark\tCtrl+F2")
+        next_bookmark_item = search_menu.Append(wx.ID_ANY, "Next Boo&kmark\tF2")
+        prev_bookmark_item = search_menu.Append(wx.ID_ANY, "Previous Bookm&ark\tShift+F2")
+        speak_position_item = search_menu.Append(wx.ID_ANY, "Speak P&osition\tCtrl+Shift+P")
+        search_menu.AppendSeparator()
+        next_page_item = search_menu.Append(wx.ID_ANY, "Next &Page\tCtrl+PgDn")
+        prev_page_item = search_menu.Append(wx.ID_ANY, "Pre&vious Page\tCtrl+PgUp")
         menu_bar.Append(search_menu, "&Search")
 
         self.SetMenuBar(menu_bar)
@@ -204,18 +345,22 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
         # SettingsMenuMixin already added Settings menu in its __init__
 
         # Status bar
-        self.CreateStatusBar()
+        # The second field shows where the caret is.
+        self.CreateStatusBar(2)
+        self.GetStatusBar().SetStatusWidths([-3, -1])
         self.SetStatusText(f"Editing: {self.remote_path}")
 
         # Bind menu events
         self.Bind(wx.EVT_MENU, self.on_save, save_item)
+        self.Bind(wx.EVT_MENU, self.on_reload, reload_item)
+        self.Bind(wx.EVT_MENU, self.on_compare, compare_item)
         self.Bind(wx.EVT_MENU, self.on_close, close_item)
 
         self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.Undo(), undo_item)
         self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.Redo(), redo_item)
-        self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.Cut(), cut_item)
+        self.Bind(wx.EVT_MENU, lambda e: self._edit(self.text_ctrl.Cut), cut_item)
         self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.Copy(), copy_item)
-        self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.Paste(), paste_item)
+        self.Bind(wx.EVT_MENU, lambda e: self._edit(self.text_ctrl.Paste), paste_item)
         self.Bind(wx.EVT_MENU, lambda e: self.text_ctrl.SelectAll(), select_all_item)
 
         self.Bind(wx.EVT_MENU, self.on_find, find_item)
@@ -225,18 +370,29 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
                 self.last_search_string,
                 bool(self.last_search_flags & wx.FR_MATCHCASE),
                 self.last_search_direction,
+                regex=self.last_search_regex,
+                whole_word=bool(self.last_search_flags & wx.FR_WHOLEWORD),
             ),
             find_next_item,
         )
         self.Bind(wx.EVT_MENU, self.on_replace, replace_item)
         self.Bind(wx.EVT_MENU, self.on_go_to_line, goto_item)
+        self.Bind(wx.EVT_MENU, self.on_toggle_bookmark, toggle_bookmark_item)
+        self.Bind(wx.EVT_MENU, lambda e: self.go_to_bookmark(True), next_bookmark_item)
+        self.Bind(wx.EVT_MENU, lambda e: self.go_to_bookmark(False), prev_bookmark_item)
+        self.Bind(wx.EVT_MENU, lambda e: speech.speak(self._position_text), speak_position_item)
+        self.Bind(wx.EVT_MENU, lambda e: self.turn_page(1), next_page_item)
+        self.Bind(wx.EVT_MENU, lambda e: self.turn_page(-1), prev_page_item)
 
         # Other bindings
         self.Bind(wx.EVT_CLOSE, self.on_close)
         self.text_ctrl.Bind(wx.EVT_TEXT, self.on_text_modified)
+        self.text_ctrl.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
+        self.text_ctrl.Bind(wx.EVT_KEY_UP, self.on_caret_moved)
+        self.text_ctrl.Bind(wx.EVT_LEFT_UP, self.on_caret_moved)
 
         theme.apply_dark_theme(self)
-        self.load_file_content()
+        self.load_file_content(data)
         self.Show()
 
     # ------------- searching / replacing -------------
@@ -249,87 +405,154 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
         with ReplaceDialog(self, "Find and Replace") as dlg:
             dlg.ShowModal()
 
-    def do_find(self, find_string, match_case, direction="down"):
+    def do_find(self, find_string, match_case, direction="down", regex=False, whole_word=False):
         if not find_string:
             return
 
         self.last_search_string = find_string
         self.last_search_direction = direction
-        self.last_search_flags = wx.FR_MATCHCASE if match_case else 0
+        self.last_search_flags = (wx.FR_MATCHCASE if match_case else 0) | (wx.FR_WHOLEWORD if whole_word else 0)
+        self.last_search_regex = regex
+        query = SearchQuery(find_string, match_case, regex, whole_word)
 
-        content = self.text_ctrl.GetValue()
-        if not match_case:
-            content_to_search = content.lower()
-            needle = find_string.lower()
-        else:
-            content_to_search = content
-            needle = find_string
-
-        current_pos = self.text_ctrl.GetInsertionPoint()
-
-        if direction == "down":
-            start = current_pos
-            idx = content_to_search.find(needle, start)
-            if idx == -1:
-                idx = content_to_search.find(needle, 0)
-        else:
-            start = 0
-            before = content_to_search[:current_pos]
-            idx = before.rfind(needle)
-            if idx == -1:
-                idx = content_to_search.rfind(needle)
+        if self.document:
+            self._find_in_document(query, direction)
+            return
 
-        if idx == -1:
+        self.mirror.sync(self.text_ctrl.GetValue)
+        # Search on from the end of the selection, or back from its start,
+        # so a match that's already selected isn't found again.
+        sel_start, sel_end = self.text_ctrl.GetSelection()
+        try:
+            found = self.mirror.find(query, sel_end if direction == "down" else sel_start, direction == "down")
+        except re.error as e:
+            self._bad_pattern(e)
+            return
+        if found is None:
             wx.Bell()
             self.SetStatusText("Text not found.")
             return
 
-        end = idx + len(find_string)
-        self.text_ctrl.SetSelection(idx, end)
-        self.text_ctrl.SetInsertionPoint(end)
-        self.text_ctrl.ShowPosition(idx)
-        self.SetStatusText(f"Found at position {idx}.")
+        start, end = found
+        self.text_ctrl.SetSelection(start, end)
+        self.text_ctrl.ShowPosition(start)
+        self.update_position()
+        self.SetStatusText(f"Found at line {self.lines.line_of(start) + 1}.")
 
-    def do_replace(self, find_string, replace_string, match_case, direction="down"):
+    def _bad_pattern(self, error):
+        wx.Bell()
+        self.SetStatusText(f"Invalid regular expression: {error}")
+
+    def _find_in_document(self, query, direction):
+        self._store_page()
+        sel_start, sel_end = self.text_ctrl.GetSelection()
+        try:
+            pattern = compile_query(query)
+        except re.error as e:
+            self._bad_pattern(e)
+            return
+        with wx.BusyCursor():
+            hit = self.document.find(
+                query.text, query.match_case, self.page,
+                sel_end if direction == "down" else sel_start, direction == "down",
+                pattern=pattern,
+            )
+        if hit is None:
+            wx.Bell()
+            self.SetStatusText("Text not found.")
+            return
+        page, start, end = hit
+        if page != self.page:
+            self.show_page(page)
+        self.text_ctrl.SetSelection(start, end)
+        self.text_ctrl.ShowPosition(start)
+        self.update_position()
+        self.SetStatusText(f"Found at line {self.document.page_lines(page)[0] + self.lines.line_of(start) + 1}.")
+
+    def do_find_all(self, find_string, match_case, regex=False, whole_word=False):
+        """Lists every match; returns True if the user went to one."""
+        if not find_string:
+            return False
+        query = SearchQuery(find_string, match_case, regex, whole_word)
+        # In large-file mode this covers the page shown.
+        self.mirror.sync(self.text_ctrl.GetValue)
+        try:
+            results, truncated = self.mirror.find_all(query)
+        except re.error as e:
+            self._bad_pattern(e)
+            return False
+        if not results:
+            wx.Bell()
+            self.SetStatusText("Text not found.")
+            return False
+        if self.document:
+            first = self.document.page_lines(self.page)[0]
+            results = [r._replace(line=r.line + first) for r in results]
+        with FindResultsDialog(self, results, truncated) as dlg:
+            if dlg.ShowModal() != wx.ID_OK or dlg.get_selection() == wx.NOT_FOUND:
+                return False
+            chosen = results[dlg.get_selection()]
+        self.text_ctrl.SetSelection(chosen.start, chosen.end)
+        self.text_ctrl.ShowPosition(chosen.start)
+        self.update_position()
+        self.SetStatusText(f"Line {chosen.line}.")
+        return True
+
+    def do_replace(self, find_string, replace_string, match_case, direction="down", regex=False, whole_word=False):
         if not find_string:
             return
 
         # If current selection matches, replace it; else find next
+        query = SearchQuery(find_string, match_case, regex, whole_word)
         selection = self.text_ctrl.GetStringSelection()
         if selection:
-            if match_case:
-                matches = (selection == find_string)
-            else:
-                matches = (selection.lower() == find_string.lower())
-            if matches:
+            try:
+                replacement = self.mirror.expand(query, replace_string, selection)
+            except (re.error, IndexError) as e:
+                self._bad_pattern(e)
+                return
+            if replacement is not None:
                 start, end = self.text_ctrl.GetSelection()
-                self.text_ctrl.Replace(start, end, replace_string)
+                self._edit_selection = (start, end)
+                self.text_ctrl.Replace(start, end, replacement)
                 self.is_modified = True
                 self.mark_modified_title()
         # Find next occurrence
-        self.do_find(find_string, match_case, direction)
+        self.do_find(find_string, match_case, direction, regex=regex, whole_word=whole_word)
 
-    def do_replace_all(self, find_string, replace_string, match_case):
+    def do_replace_all(self, find_string, replace_string, match_case, regex=False, whole_word=False):
         if not find_string:
             return
 
-        content = self.text_ctrl.GetValue()
-        if match_case:
-            new_content = content.replace(find_string, replace_string)
-        else:
-            # Case-insensitive replace
-            import re
-
-            pattern = re.compile(re.escape(find_string), re.IGNORECASE)
-            new_content = pattern.sub(replace_string, content)
+        # In large-file mode this covers the page shown.
+        query = SearchQuery(find_string, match_case, regex, whole_word)
+        self.mirror.sync(self.text_ctrl.GetValue)
+        try:
+            result = self.mirror.replace_all(query, replace_string)
+        except (re.error, IndexError) as e:
+            self._bad_pattern(e)
+            return
 
-        if new_content != content:
-            self.text_ctrl.SetValue(new_content)
-            self.is_modified = True
-            self.mark_modified_title()
-            self.SetStatusText("Replace All completed.")
-        else:
+        if result is None:
             self.SetStatusText("No occurrences replaced.")
+            return
+        start, end, replacement, count = result
+        text = self.mirror.text
+        # One change to the control covering every match, rather than a
+        # whole new buffer or one change per match.
+        bookmarks, line_count = set(self.lines.bookmarks), self.lines.line_count
+        self._edit_selection = (start, end)
+        self.text_ctrl.Replace(start, end, replacement)
+        self.mirror.set_text(text[:start] + replacement + text[end:])
+        if self.lines.line_count == line_count:
+            # Bookmarks inside the replaced span stay on their lines.
+            self.lines.bookmarks = bookmarks
+        self.is_modified = True
+        self.mark_modified_title()
+        if self.document:
+            self.SetStatusText(f"Replaced {count} on the lines shown. Large files are replaced a page at a time.")
+        else:
+            self.SetStatusText(f"Replaced {count} occurrences.")
 
     def on_go_to_line(self, event):
         with wx.TextEntryDialog(
@@ -346,28 +569,94 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
         if line_no < 1:
             line_no = 1
 
-        # wx.TextCtrl doesn't expose line offsets directly; approximate by splitting
-        content = self.text_ctrl.GetValue().splitlines(True)
-        if not content:
+        if self.document:
+            # Uses the index, so numbering is as of the last save.
+            line = min(line_no, max(self.document.line_count, 1)) - 1
+            page = self.document.page_of_line(line)
+            self.show_page(page, line - self.document.page_lines(page)[0])
+            self.SetStatusText(f"Moved to line {line + 1}.")
             return
 
-        index = 0
-        for i in range(min(line_no - 1, len(content) - 1)):
-            index += len(content[i])
+        # The control's own line numbers count wrapped lines on some
+        # platforms, so the index is used instead.
+        line = min(line_no, self.lines.line_count) - 1
+        self._move_to(self.lines.start(line))
+        self.SetStatusText(f"Moved to line {line + 1}.")
+
+    def _move_to(self, pos):
+        self.text_ctrl.SetInsertionPoint(pos)
+        self.text_ctrl.ShowPosition(pos)
+        self.update_position()
+
+    # ------------- line index, position and bookmarks -------------
+
+    def _edit(self, action):
+        self._edit_selection = self.text_ctrl.GetSelection()
+        action()
+
+    def _update_lines(self):
+        selection, self._edit_selection = self._edit_selection, None
+        ctrl = self.text_ctrl
+        if selection is None or not self.lines.apply_edit(
+            selection, ctrl.GetLastPosition(), ctrl.GetInsertionPoint(), ctrl.GetRange
+        ):
+            # An edit we didn't see coming, such as Undo.
+            self.lines.rebuild(ctrl.GetValue())
+
+    def update_position(self):
+        """Shows the caret's line and column in the status bar."""
+        line, column = self.lines.position(self.text_ctrl.GetInsertionPoint())
+        if self.document:
+            line += self.document.page_lines(self.page)[0]
+            total = self.document.line_count
+        else:
+            total = self.lines.line_count
+        text = f"Line {line + 1} of {total}, column {column + 1}"
+        if text != self._position_text:
+            self._position_text = text
+            self.SetStatusText(text, 1)
+
+    def on_caret_moved(self, event):
+        self.update_position()
+        event.Skip()
 
-        self.text_ctrl.SetInsertionPoint(index)
-        self.text_ctrl.ShowPosition(index)
-        self.SetStatusText(f"Moved to line {line_no}.")
+    def on_toggle_bookmark(self, event):
+        line = self.lines.line_of(self.text_ctrl.GetInsertionPoint())
+        added = self.lines.toggle_bookmark(line)
+        if self.document:
+            line += self.document.page_lines(self.page)[0]
+        message = f"Bookmark {'set on' if added else 'removed from'} line {line + 1}."
+        self.SetStatusText(message)
+        speech.speak(message)
+
+    def go_to_bookmark(self, forward):
+        line = self.lines.line_of(self.text_ctrl.GetInsertionPoint())
+        mark = self.lines.next_bookmark(line, forward)
+        if mark is None:
+            wx.Bell()
+            self.SetStatusText("No bookmarks.")
+            return
+        self._move_to(self.lines.start(mark))
 
     # ------------- file operations -------------
 
-    def load_file_content(self):
+    def load_file_content(self, data=None):
         try:
-            if os.path.exists(self.local_path):
-                with open(self.local_path, "r", encoding="utf-8", errors="replace") as f:
-                    self.text_ctrl.SetValue(f.read())
+            if self.local_path:
+                with wx.BusyCursor():
+                    self.document = LargeFileDocument(self.local_path)
+                self.show_page(0)
             else:
-                self.text_ctrl.SetValue("")
+                data = data or b""
+                self.newline = "\n"
+                first_line = data.split(b"\n", 1)[0]
+                if first_line.endswith(b"\r") and len(first_line) < len(data):
+                    self.newline = "\r\n"
+                text = data.decode("utf-8", errors="replace")
+                if self.newline != "\n":
+                    text = text.replace(self.newline, "\n")
+                self.text_ctrl.SetValue(text)
+                self.digest = digest(self._encode(text))
             self.is_modified = False
             self.mark_modified_title()
         except Exception as e:
@@ -378,7 +667,158 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
             self.is_modified = False
             self.mark_modified_title()
 
+    # ------------- changes on the server -------------
+
+    def on_remote_change(self, version, error):
+        """Called by the session's watcher when the file changes on the server."""
+        change = version or "deleted"
+        if change == self.remote_change:
+            return
+        self.remote_change = change
+        if error:
+            message = f"{self.remote_path} has been deleted on the server."
+        else:
+            message = (
+                f"{self.remote_path} has been changed on the server. "
+                "Press Control+R to reload it or Control+D to compare."
+            )
+        self.SetStatusText(message)
+        speech.speak(message, interrupt=False)
+
+    def on_reload(self, event):
+        if self.saving:
+            self.SetStatusText("Still saving, please wait.")
+            return
+        if self.is_modified and wx.MessageBox(
+            "Discard your changes and reload the file from the server?",
+            "Reload", wx.YES_NO | wx.ICON_QUESTION,
+        ) != wx.YES:
+            return
+        self.SetStatusText(f"Reloading: {self.remote_path}...")
+        if self.document:
+            # Downloaded beside the open copy, which stays mapped until then.
+            self.sftp.call(
+                download_file, self.remote_path, self.local_path + ".reload", self.sftp.server_id,
+                on_done=self._reloaded_document, on_error=self._reload_failed,
+            )
+        else:
+            self.sftp.call(
+                read_file, self.remote_path, self.sftp.server_id,
+                on_done=self._reloaded, on_error=self._reload_failed,
+            )
+
+    def _reloaded(self, result):
+        data, version = result
+        self.load_file_content(data)
+        self._after_reload(version)
+
+    def _reloaded_document(self, version):
+        self.document.close()
+        try:
+            os.replace(self.local_path + ".reload", self.local_path)
+        except OSError as e:
+            # Carry on with the old copy, still marked as the old version.
+            self.document.reopen()
+            try:
+                os.remove(self.local_path + ".reload")
+            except OSError:
+                pass
+            self._reload_failed(e)
+            return
+        self.page_dirty = False
+        self.load_file_content()
+        self._after_reload(version)
+
+    def _after_reload(self, version):
+        self.version = version
+        self.remote_change = None
+        self.SetStatusText(f"Reloaded: {self.remote_path}")
+
+    def _reload_failed(self, error):
+        wx.MessageBox(f"Failed to reload file: {error}", "SFTP Error", wx.ICON_ERROR)
+        self.SetStatusText(f"Error reloading file: {error}")
+
+    def on_compare(self, event):
+        if self.document:
+            wx.Bell()
+            self.SetStatusText("Large files can't be compared. Reload to see the server's version.")
+            return
+        self.SetStatusText("Comparing with the server...")
+        self.sftp.run(
+            diff_with_remote, self.remote_path, self.text_ctrl.GetValue(),
+            on_done=self._show_comparison, on_error=self._compare_failed,
+        )
+
+    def _show_comparison(self, result):
+        diff, version = result
+        if not diff:
+            self.SetStatusText("No differences from the file on the server.")
+            return
+        self.SetStatusText("")
+        with CompareDialog(self, os.path.basename(self.remote_path), diff) as dlg:
+            reload = dlg.ShowModal() == wx.ID_OK
+        if reload:
+            self.on_reload(None)
+
+    def _compare_failed(self, error):
+        wx.MessageBox(f"Failed to compare with the server: {error}", "SFTP Error", wx.ICON_ERROR)
+        self.SetStatusText(f"Error comparing file: {error}")
+
+    # ------------- large-file mode -------------
+
+    def show_page(self, page, line=0):
+        """Shows a page of the document with the caret on one of its lines."""
+        self._store_page()
+        self.page = page
+        text = self.document.page_text(page)
+        self.text_ctrl.ChangeValue(text)
+        self.mirror.invalidate()
+        # Bookmarks belong to the page shown.
+        self.lines = LineIndex(text)
+        self._move_to(self.lines.start(min(line, self.lines.line_count - 1)))
+        first, end = self.document.page_lines(page)
+        self.SetStatusText(f"Lines {first + 1} to {end} of {self.document.line_count}")
+
+    def _store_page(self):
+        if self.document and self.page_dirty:
+            self.document.set_page_text(self.page, self.text_ctrl.GetValue())
+            self.page_dirty = False
+
+    def turn_page(self, step):
+        if not self.document:
+            return
+        page = self.page + step
+        if 0 <= page < self.document.page_count:
+            self.show_page(page, 0 if step > 0 else PAGE_LINES - 1)
+        else:
+            wx.Bell()
+
+    def on_key_down(self, event):
+        # Arrowing off either end of a page moves on to the next one.
+        key = event.GetKeyCode()
+        if self.document and not event.HasAnyModifiers() and key in (wx.WXK_UP, wx.WXK_DOWN):
+            row = self.lines.line_of(self.text_ctrl.GetInsertionPoint())
+            if key == wx.WXK_DOWN and row >= self.lines.line_count - 1 \
+                    and self.page + 1 < self.document.page_count:
+                self.turn_page(1)
+                return
+            if key == wx.WXK_UP and row == 0 and self.page > 0:
+                self.turn_page(-1)
+                return
+        self._edit_selection = self.text_ctrl.GetSelection()
+        event.Skip()
+
+    def _encode(self, text):
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)
+        return text.encode("utf-8", errors="replace")
+
     def on_text_modified(self, event):
+        self.mirror.invalidate()
+        self._update_lines()
+        self.update_position()
+        if self.document:
+            self.page_dirty = True
         if not self.is_modified:
             self.is_modified = True
             self.mark_modified_title()
@@ -393,29 +833,124 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
             if title.endswith(" *"):
                 self.SetTitle(title[:-2])
 
-    def on_save(self, event):
-        # Save to local temp file first
-        try:
-            with open(self.local_path, "w", encoding="utf-8", errors="replace") as f:
-                f.write(self.text_ctrl.GetValue())
-        except Exception as e:
-            wx.MessageBox(
-                f"Failed to save file locally: {e}", "Error", wx.ICON_ERROR
-            )
-            self.SetStatusText(f"Error saving file locally: {e}")
+    def on_save(self, event, then=None):
+        """Saves the file to the server; then() is called once it is there."""
+        if self.saving:
+            self.SetStatusText("Still saving, please wait.")
             return
+        if self.document:
+            if not self.is_modified:
+                self._nothing_to_save(then)
+                return
+            content = new_digest = None
+            try:
+                self._store_page()
+                if self.document.modified:
+                    caret = self.lines.line_of(self.text_ctrl.GetInsertionPoint())
+                    with wx.BusyCursor():
+                        self.document.save()
+                    # Page boundaries move if edits added or removed lines.
+                    self.show_page(min(self.page, self.document.page_count - 1), caret)
+                size = os.path.getsize(self.local_path)
+            except Exception as e:
+                wx.MessageBox(
+                    f"Failed to save file locally: {e}", "Error", wx.ICON_ERROR
+                )
+                self.SetStatusText(f"Error saving file locally: {e}")
+                return
+            open_source = lambda: open(self.local_path, "rb")
+        else:
+            content = self.text_ctrl.GetValue()
+            data = self._encode(content)
+            new_digest = digest(data)
+            if new_digest == self.digest:
+                self._nothing_to_save(then)
+                return
+            size = len(data)
+            open_source = lambda: io.BytesIO(data)
+        self._upload(open_source, size, content, new_digest, then)
 
-        # Then upload to server
-        try:
-            self.sftp.put(self.local_path, self.remote_path)
-            self.is_modified = False
-            self.mark_modified_title()
+    def _nothing_to_save(self, then):
+        self.is_modified = False
+        self.mark_modified_title()
+        self.SetStatusText("No changes to save.")
+        if then:
+            then()
+
+    def _upload(self, open_source, size, content, new_digest, then, force=False):
+        self.saving = True
+        self.SetStatusText(f"Saving: {self.remote_path}...")
+        report = self._progress_reporter()
+        large = self.document is not None
+
+        def save(client):
+            with open_source() as source:
+                version = save_file(client, self.remote_path, source, size, self.version, report, force)
+            # What was sent is now what's on the server, so reopening is instant.
+            if large:
+                file_cache.store(self.sftp.server_id, self.remote_path, version.size, version.mtime, self.local_path)
+            else:
+                with open_source() as source:
+                    file_cache.store_data(self.sftp.server_id, self.remote_path, version.size, version.mtime, source.read())
+            return version
+
+        def saved(version):
+            # The editor may have been closed while the save was under way.
+            if not self:
+                return
+            self.saving = False
+            self.version = version
+            if new_digest:
+                self.digest = new_digest
+            # Typing while the upload ran leaves the file modified.
+            if self.document:
+                unchanged = not self.document.modified and not self.page_dirty
+            else:
+                unchanged = self.text_ctrl.GetValue() == content
+            if unchanged:
+                self.is_modified = False
+                self.mark_modified_title()
             self.SetStatusText(f"Successfully saved: {self.remote_path}")
-        except Exception as e:
+            if then:
+                then()
+
+        def failed(error):
+            if not self:
+                print(f"Warning: Could not save {self.remote_path}: {error}")
+                return
+            self.saving = False
+            if isinstance(error, SaveConflictError):
+                answer = wx.MessageBox(
+                    f"{self.remote_path} has been changed on the server since you opened it. "
+                    "Do you want to overwrite it with your version?",
+                    "File Changed on Server", wx.YES_NO | wx.ICON_WARNING,
+                )
+                if answer == wx.YES:
+                    self._upload(open_source, size, content, new_digest, then, force=True)
+                else:
+                    self.SetStatusText("Not saved: the file was changed on the server.")
+                return
             wx.MessageBox(
-                f"Failed to save file to server: {e}", "SFTP Error", wx.ICON_ERROR
+                f"Failed to save file to server: {error}", "SFTP Error", wx.ICON_ERROR
             )
-            self.SetStatusText(f"Error saving file: {e}")
+            self.SetStatusText(f"Error saving file: {error}")
+
+        self.sftp.call(save, on_done=saved, on_error=failed)
+
+    def _progress_reporter(self):
+        shown = [-1]
+
+        def report(done, total):
+            # Runs on the SFTP worker; only whole percentages reach the UI.
+            percent = done * 100 // total if total else 100
+            if percent != shown[0]:
+                shown[0] = percent
+                wx.CallAfter(self._show_save_progress, percent)
+        return report
+
+    def _show_save_progress(self, percent):
+        if self and self.saving:
+            self.SetStatusText(f"Saving: {self.remote_path}, {percent}%")
 
     def on_close(self, event):
         if self.is_modified:
@@ -425,16 +960,18 @@ class EditorFrame(wx.Frame, SettingsMenuMixin):
                 wx.YES_NO | wx.CANCEL | wx.ICON_QUESTION,
             )
             if result == wx.YES:
-                self.on_save(None)
-                # If save failed, keep window open
-                if self.is_modified:
-                    return
+                # Close once the save is on the server; if it fails the
+                # window stays open.
+                self.on_save(None, then=self.Close)
+                return
             elif result == wx.CANCEL:
                 return
 
         # Clean up temp file
+        if self.document:
+            self.document.close()
         try:
-            if os.path.exists(self.local_path):
+            if self.local_path and os.path.exists(self.local_path):
                 os.remove(self.local_path)
         except Exception as e:
             print(
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import server_store
+
+# Most disk space, in megabytes, that local copies of remote files may take;
+# 0 turns the cache off. Adjustable from the Settings menu.
+DEFAULT_CACHE_SIZE = 512
+MIN_CACHE_SIZE = 0
+MAX_CACHE_SIZE = 100000
+CACHE_SIZE = DEFAULT_CACHE_SIZE
+# Where the copies are kept. Also adjustable from the Settings menu.
+DEFAULT_CACHE_DIR = os.path.join(server_store.CONFIG_DIR, "files")
+CACHE_DIR = DEFAULT_CACHE_DIR
+# No single file may take more than this share of the cache, so that one
+# big download doesn't push everything else out.
+MAX_FILE_SHARE = 4
+# Partial copies left by a crash are removed once they are this old.
+STALE_PART_AGE = 24 * 60 * 60
+
+_lock = threading.Lock()
+# Cache file name to size, least recently used first. Read from the cache
+# folder the first time it is needed.
+_index = None
+
+
+def set_cache_size(megabytes: int):
+    """Sets the size limit of the file cache, evicting files beyond it."""
+    global CACHE_SIZE
+    CACHE_SIZE = max(MIN_CACHE_SIZE, min(int(megabytes), MAX_CACHE_SIZE))
+    with _lock:
+        if _index is not None:
+            _evict()
+
+
+def set_cache_dir(path: str):
+    """Moves the file cache to another folder; an empty path means the default."""
+    global CACHE_DIR, _index
+    with _lock:
+        CACHE_DIR = path or DEFAULT_CACHE_DIR
+        _index = None
+
+
+def cache_key(server, remote_path, size, mtime):
+    """The name a remote file is cached under. A change of size or mtime makes a new one."""
+    key = f"{server}\n{remote_path}\n{size}\n{mtime}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _limit():
+    return CACHE_SIZE * 1024 * 1024
+
+
+def _load():
+    global _index
+    if _index is None:
+        found = []
+        try:
+            with os.scandir(CACHE_DIR) as it:
+                for entry in it:
+                    st = entry.stat()
+                    if len(entry.name) == 64 and entry.is_file():
+                        found.append((st.st_mtime, entry.name, st.st_size))
+                    elif entry.name.endswith(".part") and time.time() - st.st_mtime > STALE_PART_AGE:
+                        _remove(entry.path)
+        except OSError:
+            pass
+        # A file's mtime is touched whenever it is used, so the order
+        # carries over from one session to the next.
+        found.sort()
+        _index = OrderedDict((name, size) for _, name, size in found)
+    return _index
+
+
+def _evict():
+    index = _load()
+    total = sum(index.values())
+    while index and total > _limit():
+        name, size = index.popitem(last=False)
+        total -= size
+        _remove(os.path.join(CACHE_DIR, name))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def fetch(server, remote_path, size, mtime, local_path):
+    """
+    Copies the cached copy of a remote file with this size and mtime to
+    local_path. Returns False, leaving local_path alone, if there isn't one.
+    """
+    cached = _lookup(server, remote_path, size, mtime)
+    if cached is None:
+        return False
+    try:
+        shutil.copyfile(cached, local_path)
+        if os.path.getsize(local_path) == size:
+            os.utime(cached)
+            return True
+    except OSError:
+        pass
+    _forget(cached)
+    _remove(local_path)
+    return False
+
+
+def fetch_data(server, remote_path, size, mtime):
+    """Returns the contents of the cached copy of a remote file, or None if there isn't one."""
+    cached = _lookup(server, remote_path, size, mtime)
+    if cached is None:
+        return None
+    try:
+        with open(cached, "rb") as f:
+            data = f.read()
+        if len(data) == size:
+            os.utime(cached)
+            return data
+    except OSError:
+        pass
+    _forget(cached)
+    return None
+
+
+def _lookup(server, remote_path, size, mtime):
+    """The path of the cached copy of a remote file, or None if there isn't one."""
+    if not CACHE_SIZE or mtime is None:
+        return None
+    name = cache_key(server, remote_path, size, mtime)
+    with _lock:
+        index = _load()
+        if name not in index:
+            return None
+        index.move_to_end(name)
+        return os.path.join(CACHE_DIR, name)
+
+
+def _forget(cached):
+    # Removed behind our back, or damaged; forget it and download instead.
+    with _lock:
+        if _index is not None:
+            _index.pop(os.path.basename(cached), None)
+
+
+def store(server, remote_path, size, mtime, local_path):
+    """Keeps a copy of local_path, just downloaded from remote_path, for next time."""
+    _store(server, remote_path, size, mtime, lambda part: shutil.copyfile(local_path, part))
+
+
+def store_data(server, remote_path, size, mtime, data):
+    """Keeps data, just read from remote_path, for next time."""
+    def write(part):
+        with open(part, "wb") as f:
+            f.write(data)
+    _store(server, remote_path, size, mtime, write)
+
+
+def _store(server, remote_path, size, mtime, write):
+    if not CACHE_SIZE or mtime is None or size > _limit() // MAX_FILE_SHARE:
+        return
+    name = cache_key(server, remote_path, size, mtime)
+    with _lock:
+        index = _load()
+        if name in index:
+            index.move_to_end(name)
+            return
+        folder = CACHE_DIR
+    part = os.path.join(folder, f"{name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        os.makedirs(folder, exist_ok=True)
+        write(part)
+        if os.path.getsize(part) != size:
+            # It changed since it was read.
+            _remove(part)
+            return
+        os.replace(part, os.path.join(folder, name))
+    except OSError as e:
+        _remove(part)
+        print(f"Warning: Could not add {remote_path} to the file cache: {e}")
+        return
+    with _lock:
+        if folder == CACHE_DIR and _index is not None:
+            _index[name] = size
+            _index.move_to_end(name)
+            _evict()
@@ -0,0 +1,209 @@
+import stat
+import time
+from array import array
+
+import wx
+
+from dir_cache import ListingEntry
+
+# Seconds between keystrokes before type-ahead starts a new search.
+TYPE_AHEAD_TIMEOUT = 1.0
+
+COLUMN_SORT_KEYS = ("name", "size", "type")
+
+
+class ListingModel:
+    """
+    One directory listing stored column-wise in compact arrays.
+
+    Names are kept in a list and sizes, modes and mtimes in typed arrays, so
+    a 100,000 entry listing costs little more than its names. `view` holds
+    the indices of the rows currently shown, in display order; sorting and
+    filtering only ever rebuild that array.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.names = []
+        self.sizes = array("q")
+        self.modes = array("L")
+        self.mtimes = array("q")
+        self.view = array("l")
+        self.sort_key = None
+        self.descending = False
+        self.filter_text = ""
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def total(self):
+        return len(self.names)
+
+    def extend(self, entries):
+        """Adds entries, showing those that pass the filter in the current order."""
+        first = len(self.names)
+        for e in entries:
+            self.names.append(e.filename)
+            self.sizes.append(max(0, e.st_size))
+            self.modes.append(e.st_mode)
+            self.mtimes.append(int(e.st_mtime))
+        self.view.extend(self._matching(range(first, len(self.names))))
+        if self.sort_key:
+            self._sort_view()
+
+    def entry(self, row):
+        i = self.view[row]
+        return ListingEntry(self.names[i], self.sizes[i], self.modes[i], self.mtimes[i])
+
+    def name(self, row):
+        return self.names[self.view[row]]
+
+    def is_dir(self, row):
+        return stat.S_ISDIR(self.modes[self.view[row]])
+
+    def size(self, row):
+        return self.sizes[self.view[row]]
+
+    def sort(self, key, descending=False):
+        self.sort_key = key
+        self.descending = descending
+        self._sort_view()
+
+    def _sort_view(self):
+        names, sizes, modes = self.names, self.sizes, self.modes
+        if self.sort_key == "size":
+            key = sizes.__getitem__
+        elif self.sort_key == "type":
+            key = lambda i: (not stat.S_ISDIR(modes[i]), names[i].lower())
+        else:
+            key = lambda i: names[i].lower()
+        self.view = array("l", sorted(self.view, key=key, reverse=self.descending))
+
+    def set_filter(self, text):
+        """
+        Shows only names containing text, case-insensitively. When the new
+        text narrows the old one only the rows already shown are searched.
+        """
+        text = text.lower()
+        if text == self.filter_text:
+            return
+        narrowing = self.filter_text in text
+        self.filter_text = text
+        if narrowing:
+            self.view = array("l", self._matching(self.view))
+        else:
+            self.view = array("l", self._matching(range(len(self.names))))
+            if self.sort_key:
+                self._sort_view()
+
+    def _matching(self, indices):
+        text = self.filter_text
+        if not text:
+            return indices
+        names = self.names
+        return [i for i in indices if text in names[i].lower()]
+
+    def find_prefix(self, prefix, start):
+        """Returns the first row from start (wrapping) whose name starts with prefix."""
+        prefix = prefix.lower()
+        count = len(self.view)
+        names, view = self.names, self.view
+        for offset in range(count):
+            row = (start + offset) % count
+            if names[view[row]].lower().startswith(prefix):
+                return row
+        return -1
+
+    def row_of(self, name):
+        names = self.names
+        for row, i in enumerate(self.view):
+            if names[i] == name:
+                return row
+        return -1
+
+
+class FileListCtrl(wx.ListCtrl):
+    """
+    Virtual report list over a ListingModel.
+
+    Only the rows on screen are ever formatted, through OnGetItemText, so
+    showing a huge directory costs the same as a small one. A ".." row is
+    shown first when there is a parent directory. Typing jumps to the next
+    name starting with what was typed.
+    """
+
+    def __init__(self, parent, size_formatter):
+        super().__init__(parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_SINGLE_SEL)
+        self.model = ListingModel()
+        self.format_size = size_formatter
+        self.has_parent = False
+        self._typed = ""
+        self._typed_time = 0.0
+        self.InsertColumn(0, "Name", width=260)
+        self.InsertColumn(1, "Size", width=120)
+        self.InsertColumn(2, "Type", width=120)
+        self.Bind(wx.EVT_CHAR, self._on_char)
+
+    def refresh(self, keep_name=None):
+        """Updates the row count after the model changed and reselects keep_name."""
+        self.SetItemCount(len(self.model) + self.has_parent)
+        if keep_name is not None:
+            row = self.model.row_of(keep_name)
+            if row != -1:
+                self.select_row(row + self.has_parent)
+        self.Refresh()
+
+    def select_row(self, item):
+        selected = self.GetFirstSelected()
+        while selected != -1:
+            self.Select(selected, False)
+            selected = self.GetNextSelected(selected)
+        self.Select(item)
+        self.Focus(item)
+        self.EnsureVisible(item)
+
+    def OnGetItemText(self, item, column):
+        if self.has_parent:
+            if item == 0:
+                return ("..", "", "Parent Directory")[column]
+            item -= 1
+        if column == 0:
+            return self.model.name(item)
+        if column == 1:
+            return self.format_size(self.model.size(item))
+        return "Directory" if self.model.is_dir(item) else "File"
+
+    def sort_by_column(self, column):
+        """Sorts by a column, reversing the order if it is already sorted by it."""
+        key = COLUMN_SORT_KEYS[column]
+        model = self.model
+        descending = not model.descending if model.sort_key == key else False
+        item = self.GetFocusedItem()
+        keep = self.GetItemText(item) if item != -1 else None
+        model.sort(key, descending)
+        self.refresh(keep)
+        return f"Sorted by {key}, {'descending' if descending else 'ascending'}"
+
+    def _on_char(self, event):
+        code = event.GetUnicodeKey()
+        if code == wx.WXK_NONE or code < 32 or event.ControlDown() or event.AltDown():
+            event.Skip()
+            return
+        now = time.monotonic()
+        if now - self._typed_time > TYPE_AHEAD_TIMEOUT:
+            self._typed = ""
+        self._typed_time = now
+        if code == ord(" ") and not self._typed:
+            event.Skip()
+            return
+        self._typed += chr(code)
+        current = self.GetFocusedItem() - self.has_parent
+        # A repeated single letter steps through the names starting with it.
+        repeat = len(set(self._typed)) == 1
+        start = current + 1 if repeat else max(0, current)
+        row = self.model.find_prefix(self._typed[0] if repeat else self._typed, start)
+        if row != -1:
+            self.select_row(row + self.has_parent)
@@ -0,0 +1,209 @@
+import bisect
+import mmap
+import os
+import re
+from array import array
+
+# Files at least this big are opened in large-file mode.
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+# Lines shown at a time in large-file mode.
+PAGE_LINES = 2000
+
+
+class LargeFileDocument:
+    """
+    A local file too big for a text control, shown PAGE_LINES lines at a time.
+
+    The file is memory-mapped and indexed once: `offsets` holds the byte
+    offset at which each line starts, followed by the file size, in an
+    array, so any line is found with a lookup and any byte offset with a
+    binary search. Pages that have been edited are kept as text in `edits`;
+    everything else is read from the map when it is needed. Line numbers
+    refer to the file as it was opened or last saved.
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.edits = {}
+        self._file = None
+        self.mm = b""
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        offsets = array("q", [0])
+        offsets.extend(m.end() for m in re.finditer(b"\n", self.mm))
+        if offsets[-1] != size:
+            offsets.append(size)
+        self.offsets = offsets
+        first_line = self.mm[:offsets[1]] if len(offsets) > 1 else b""
+        self.newline = "\r\n" if first_line.endswith(b"\r\n") else "\n"
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.mm = b""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def reopen(self):
+        """Maps the file again after close(), as it now is on disk."""
+        self.close()
+        self._open()
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def page_count(self):
+        return max(1, -(-self.line_count // PAGE_LINES))
+
+    @property
+    def modified(self):
+        return bool(self.edits)
+
+    def page_of_line(self, line):
+        return max(0, min(line // PAGE_LINES, self.page_count - 1))
+
+    def page_lines(self, page):
+        """Returns (first line, end line) of a page, end exclusive."""
+        first = page * PAGE_LINES
+        return first, min(first + PAGE_LINES, self.line_count)
+
+    def line_of_offset(self, offset):
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def _span(self, page):
+        first, end = self.page_lines(page)
+        return self.offsets[first], self.offsets[end]
+
+    def _ends_with_newline(self, page):
+        start, end = self._span(page)
+        return end > start and self.mm[end - 1:end] == b"\n"
+
+    def _decode(self, data):
+        text = data.decode(self.encoding, "replace")
+        return text.replace("\r\n", "\n") if self.newline == "\r\n" else text
+
+    def page_text(self, page):
+        """The text of a page, without the line break that ends it."""
+        if page in self.edits:
+            return self.edits[page]
+        start, end = self._span(page)
+        if self._ends_with_newline(page):
+            end -= len(self.newline)
+        return self._decode(self.mm[start:end])
+
+    def set_page_text(self, page, text):
+        self.edits[page] = text
+
+    def find(self, needle, match_case, page, pos, forward=True, pattern=None):
+        """
+        Finds needle after (or before) character pos of a page, going on
+        through the rest of the file and wrapping round. Returns (page, start,
+        end) in characters of that page's text, or None.
+
+        Pages that haven't been edited are searched in the map itself, and
+        only decoded when the match is on them. A compiled text pattern, for
+        regular expression and whole-word searches, is used instead of
+        needle; every page is then decoded and searched as text.
+        """
+        count = self.page_count
+        if forward:
+            order = [(page + i) % count for i in range(1, count)]
+        else:
+            order = [(page - i) % count for i in range(1, count)]
+        # The starting page first from pos, then, after wrapping, the rest of it.
+        hit = self._find_in_text(needle, match_case, page, pos, forward, pattern=pattern)
+        if hit:
+            return hit
+        raw_pattern = None
+        if pattern is None and (match_case or needle.isascii()):
+            raw = needle.replace("\n", self.newline).encode(self.encoding, "replace")
+            raw_pattern = re.compile(re.escape(raw), 0 if match_case else re.IGNORECASE)
+        for other in order:
+            if other in self.edits or raw_pattern is None:
+                hit = self._find_in_text(needle, match_case, other, None, forward, pattern=pattern)
+            else:
+                hit = self._find_in_map(raw_pattern, other, forward)
+            if hit:
+                return hit
+        return self._find_in_text(needle, match_case, page, pos, forward, wrapped=True, pattern=pattern)
+
+    def _find_in_text(self, needle, match_case, page, pos, forward, wrapped=False, pattern=None):
+        text = self.page_text(page)
+        if pattern is not None:
+            return self._match_in_text(pattern, text, page, pos, forward, wrapped)
+        if not match_case:
+            text, needle = text.lower(), needle.lower()
+        if pos is None:
+            index = text.find(needle) if forward else text.rfind(needle)
+        elif forward:
+            index = text.find(needle, 0) if wrapped else text.find(needle, pos)
+            if wrapped and index >= pos:
+                index = -1
+        else:
+            index = text.rfind(needle) if wrapped else text.rfind(needle, 0, pos)
+            if wrapped and index < pos:
+                index = -1
+        if index == -1:
+            return None
+        return page, index, index + len(needle)
+
+    def _match_in_text(self, pattern, text, page, pos, forward, wrapped):
+        if forward:
+            start = 0 if pos is None or wrapped else pos
+            match = pattern.search(text, start)
+            if match and wrapped and match.start() >= pos:
+                match = None
+        else:
+            end = len(text) if pos is None or wrapped else pos
+            match = None
+            for match in pattern.finditer(text, 0, end):
+                pass
+            if match and wrapped and match.start() < pos:
+                match = None
+        if match is None or match.end() == match.start():
+            return None
+        return page, match.start(), match.end()
+
+    def _find_in_map(self, pattern, page, forward):
+        start, end = self._span(page)
+        if forward:
+            match = pattern.search(self.mm, start, end)
+        else:
+            match = None
+            for match in pattern.finditer(self.mm, start, end):
+                pass
+        if match is None:
+            return None
+        first = len(self._decode(self.mm[start:match.start()]))
+        return page, first, first + len(self._decode(match.group()))
+
+    def save(self):
+        """Writes the file with its edited pages in place, then maps and indexes it again."""
+        tmp = self.path + ".saving"
+        with open(tmp, "wb") as out:
+            for page in range(self.page_count):
+                if page in self.edits:
+                    text = self.edits[page]
+                    if self._ends_with_newline(page):
+                        text += "\n"
+                    if self.newline != "\n":
+                        text = text.replace("\n", self.newline)
+                    out.write(text.encode(self.encoding, "replace"))
+                else:
+                    start, end = self._span(page)
+                    out.write(self.mm[start:end])
+        # The map has to be closed before the file can be replaced on Windows.
+        self.close()
+        try:
+            os.replace(tmp, self.path)
+            self.edits = {}
+        finally:
+            self._open()
@@ -0,0 +1,149 @@
+import bisect
+import re
+from array import array
+
+
+class LineIndex:
+    """
+    The offsets at which each line of an editor's text starts, kept in an
+    array so that the line of a position is a binary search and the start of
+    a line a lookup. Line numbers here are 0-based.
+
+    Edits are applied as they happen instead of rebuilding the index.
+    Offsets after an edit aren't shifted straight away: the index carries
+    one pending shift, `_shift` characters for every line from
+    `_shift_line` on, and only the lines between the old and new edit
+    points are brought up to date when the next edit is somewhere else. So
+    typing costs a binary search, and moving to another spot costs the
+    lines in between, not the whole file.
+
+    Bookmarks are line numbers, moved along as lines are added and removed
+    above them.
+    """
+
+    def __init__(self, text=""):
+        self.bookmarks = set()
+        self.rebuild(text)
+
+    def rebuild(self, text):
+        self._starts = array("q", [0])
+        self._starts.extend(m.end() for m in re.finditer("\n", text))
+        self._shift_line = len(self._starts)
+        self._shift = 0
+        self.length = len(text)
+        count = len(self._starts)
+        self.bookmarks = {b for b in self.bookmarks if b < count}
+
+    @property
+    def line_count(self):
+        return len(self._starts)
+
+    def start(self, line):
+        """The offset at which a line starts."""
+        value = self._starts[line]
+        return value + self._shift if line >= self._shift_line else value
+
+    def end(self, line):
+        """The offset of the line break ending a line, or of the end of the text."""
+        return self.start(line + 1) - 1 if line + 1 < self.line_count else self.length
+
+    def line_of(self, pos):
+        """The line a character offset is on."""
+        split = self._shift_line
+        if split < len(self._starts) and pos >= self._starts[split] + self._shift:
+            return bisect.bisect_right(self._starts, pos - self._shift, split) - 1
+        return bisect.bisect_right(self._starts, pos, 0, split) - 1
+
+    def position(self, pos):
+        """Returns (line, column) of a character offset."""
+        line = self.line_of(pos)
+        return line, pos - self.start(line)
+
+    def _move_shift(self, line):
+        """Brings the lines between the pending shift and line up to date."""
+        old = self._shift_line
+        if self._shift and line > old:
+            self._starts[old:line] = array("q", (v + self._shift for v in self._starts[old:line]))
+        elif self._shift and line < old:
+            self._starts[line:old] = array("q", (v - self._shift for v in self._starts[line:old]))
+        self._shift_line = line
+
+    def insert(self, pos, text):
+        line = self.line_of(pos)
+        self._move_shift(line + 1)
+        self._shift += len(text)
+        self.length += len(text)
+        added = [pos + m.end() - self._shift for m in re.finditer("\n", text)]
+        if added:
+            self._starts[line + 1:line + 1] = array("q", added)
+            self.bookmarks = {b + len(added) if b > line else b for b in self.bookmarks}
+
+    def delete(self, pos, length):
+        line = self.line_of(pos)
+        last = self.line_of(pos + length)
+        self._move_shift(line + 1)
+        self._shift -= length
+        self.length -= length
+        removed = last - line
+        if removed:
+            del self._starts[line + 1:last + 1]
+            self.bookmarks = {
+                b - removed if b > last else min(b, line) for b in self.bookmarks
+            }
+
+    def apply_edit(self, selection, new_length, caret, get_range):
+        """
+        Works out what an edit did from the selection just before it, the
+        new length of the text and where the caret ended up, and applies
+        it. get_range(start, end) reads text from the control. Returns False
+        if the edit can't be worked out or the index doesn't match the text
+        afterwards; the caller should then rebuild.
+        """
+        sel_start, sel_end = selection
+        delta = new_length - self.length
+        if not 0 <= sel_start <= sel_end <= self.length:
+            return False
+        if sel_start == sel_end and delta < 0:
+            # Backspace leaves the caret where the text was removed from,
+            # as Delete does.
+            if caret not in (sel_start, sel_start + delta) or caret < 0:
+                return False
+            self.delete(caret, -delta)
+        else:
+            inserted = delta + (sel_end - sel_start)
+            if inserted < 0 or caret != sel_start + inserted:
+                return False
+            if sel_end > sel_start:
+                self.delete(sel_start, sel_end - sel_start)
+            if inserted:
+                self.insert(sel_start, get_range(sel_start, caret))
+        return self._looks_right(caret, get_range)
+
+    def _looks_right(self, pos, get_range):
+        # The line breaks either side of the edited line should be where
+        # the index says they are.
+        line = self.line_of(pos)
+        start = self.start(line)
+        if start and get_range(start - 1, start) != "\n":
+            return False
+        end = self.end(line)
+        return end == self.length or get_range(end, end + 1) == "\n"
+
+    def toggle_bookmark(self, line):
+        """Returns True if a bookmark was added, False if one was removed."""
+        if line in self.bookmarks:
+            self.bookmarks.discard(line)
+            return False
+        self.bookmarks.add(line)
+        return True
+
+    def next_bookmark(self, line, forward=True):
+        """The next bookmark after line, or before it, wrapping round; None if there are none."""
+        if not self.bookmarks:
+            return None
+        marks = sorted(self.bookmarks)
+        if forward:
+            index = bisect.bisect_right(marks, line)
+            return marks[index % len(marks)]
+        index = bisect.bisect_left(marks, line) - 1
+        return marks[index]
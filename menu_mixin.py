@@ -2,6 +2,13 @@
 
 import wx
 import speech
+import output_coalescer
+import sftp_helpers
+import dialogs
+import dir_cache
+import file_cache
+import remote_watch
+import tar_transfer
 
 class SettingsMenuMixin:
     def __init__(self):
@@ -20,16 +27,216 @@ class SettingsMenuMixin:
             "&Speak Terminal Output",
             "Read terminal output aloud using a screen reader"
         )
+        self.refresh_rate_item = settings_menu.Append(
+            wx.ID_ANY,
+            "Output &Refresh Rate...",
+            "Set how many times per second terminal output is redrawn"
+        )
+        self.transfer_concurrency_item = settings_menu.Append(
+            wx.ID_ANY,
+            "&Transfer Concurrency...",
+            "Set how many files are uploaded or downloaded at the same time"
+        )
+        self.speak_milestones_item = settings_menu.AppendCheckItem(
+            wx.ID_ANY,
+            "Speak Transfer &Milestones",
+            "Announce every 10 percent of an upload or download"
+        )
+        self.compress_streams_item = settings_menu.AppendCheckItem(
+            wx.ID_ANY,
+            "Compress &Bulk Transfers",
+            "Compress folders of small files sent in one stream; best on slow connections"
+        )
+        self.persist_listings_item = settings_menu.AppendCheckItem(
+            wx.ID_ANY,
+            "Remember &Folder Listings",
+            "Keep file browser listings between sessions so folders open instantly"
+        )
+        self.watch_interval_item = settings_menu.Append(
+            wx.ID_ANY,
+            "Check Open Files for &Changes...",
+            "Set how often files open in the editor are checked for changes on the server"
+        )
+        self.file_cache_size_item = settings_menu.Append(
+            wx.ID_ANY,
+            "File Cache &Size...",
+            "Set how much disk space copies of downloaded files may take"
+        )
+        self.file_cache_dir_item = settings_menu.Append(
+            wx.ID_ANY,
+            "File Cache &Location...",
+            "Choose the folder copies of downloaded files are kept in"
+        )
+        speech_menu = wx.Menu()
+        self.speech_rate_item = speech_menu.Append(
+            wx.ID_ANY,
+            "Speech &Rate Limit...",
+            "Set how many times per second new output may be spoken"
+        )
+        self.speech_backlog_item = speech_menu.Append(
+            wx.ID_ANY,
+            "Speech &Backlog Limit...",
+            "Set how many unspoken lines may pile up before they are summarised"
+        )
+        self.speech_age_item = speech_menu.Append(
+            wx.ID_ANY,
+            "Speech Backlog &Age...",
+            "Set how many seconds output may wait to be spoken before it is skipped"
+        )
+        settings_menu.AppendSubMenu(speech_menu, "Output S&peech")
         menu_bar.Append(settings_menu, "&Settings")
         self.SetMenuBar(menu_bar)
         self.Bind(wx.EVT_MENU, self.on_toggle_speak_output, self.speak_output_item)
+        self.Bind(wx.EVT_MENU, self.on_set_refresh_rate, self.refresh_rate_item)
+        self.Bind(wx.EVT_MENU, self.on_set_transfer_concurrency, self.transfer_concurrency_item)
+        self.Bind(wx.EVT_MENU, self.on_toggle_speak_milestones, self.speak_milestones_item)
+        self.Bind(wx.EVT_MENU, self.on_toggle_compress_streams, self.compress_streams_item)
+        self.Bind(wx.EVT_MENU, self.on_toggle_persist_listings, self.persist_listings_item)
+        self.Bind(wx.EVT_MENU, self.on_set_watch_interval, self.watch_interval_item)
+        self.Bind(wx.EVT_MENU, self.on_set_file_cache_size, self.file_cache_size_item)
+        self.Bind(wx.EVT_MENU, self.on_set_file_cache_dir, self.file_cache_dir_item)
+        self.Bind(wx.EVT_MENU, self.on_set_speech_rate, self.speech_rate_item)
+        self.Bind(wx.EVT_MENU, self.on_set_speech_backlog, self.speech_backlog_item)
+        self.Bind(wx.EVT_MENU, self.on_set_speech_age, self.speech_age_item)
         self.load_settings()
     def on_toggle_speak_output(self, event):
         is_enabled = self.speak_output_item.IsChecked()
         speech.set_speak_enabled(is_enabled)
         self.config.WriteBool("/Settings/SpeakOutput", is_enabled)
         self.config.Flush()
+    def on_toggle_speak_milestones(self, event):
+        is_enabled = self.speak_milestones_item.IsChecked()
+        dialogs.set_speak_milestones(is_enabled)
+        self.config.WriteBool("/Settings/SpeakTransferMilestones", is_enabled)
+        self.config.Flush()
+    def on_toggle_compress_streams(self, event):
+        is_enabled = self.compress_streams_item.IsChecked()
+        tar_transfer.set_compress_streams(is_enabled)
+        self.config.WriteBool("/Settings/CompressBulkTransfers", is_enabled)
+        self.config.Flush()
+    def on_toggle_persist_listings(self, event):
+        is_enabled = self.persist_listings_item.IsChecked()
+        dir_cache.set_persist_listings(is_enabled)
+        self.config.WriteBool("/Settings/PersistListings", is_enabled)
+        self.config.Flush()
+    def on_set_refresh_rate(self, event):
+        rate = self._ask_number(
+            "Redraws per second while output is arriving:",
+            "Rate:", "Output Refresh Rate", output_coalescer.REFRESH_RATE,
+            output_coalescer.MIN_REFRESH_RATE, output_coalescer.MAX_REFRESH_RATE,
+        )
+        if rate is None:
+            return
+        output_coalescer.set_refresh_rate(rate)
+        self.config.WriteInt("/Settings/OutputRefreshRate", rate)
+        self.config.Flush()
+    def on_set_transfer_concurrency(self, event):
+        count = self._ask_number(
+            "Files to upload or download at the same time:",
+            "Files:", "Transfer Concurrency", sftp_helpers.TRANSFER_CONCURRENCY,
+            sftp_helpers.MIN_TRANSFER_CONCURRENCY, sftp_helpers.MAX_TRANSFER_CONCURRENCY,
+        )
+        if count is None:
+            return
+        sftp_helpers.set_transfer_concurrency(count)
+        self.config.WriteInt("/Settings/TransferConcurrency", count)
+        self.config.Flush()
+    def on_set_watch_interval(self, event):
+        seconds = self._ask_number(
+            "Seconds between checks of open files for changes on the server (0 to stop checking):",
+            "Seconds:", "Check Open Files for Changes", remote_watch.WATCH_INTERVAL,
+            remote_watch.MIN_WATCH_INTERVAL, remote_watch.MAX_WATCH_INTERVAL,
+        )
+        if seconds is None:
+            return
+        remote_watch.set_watch_interval(seconds)
+        self.config.WriteInt("/Settings/WatchInterval", seconds)
+        self.config.Flush()
+    def on_set_file_cache_size(self, event):
+        megabytes = self._ask_number(
+            "Megabytes of disk space for copies of downloaded files (0 to turn the cache off):",
+            "Megabytes:", "File Cache Size", file_cache.CACHE_SIZE,
+            file_cache.MIN_CACHE_SIZE, file_cache.MAX_CACHE_SIZE,
+        )
+        if megabytes is None:
+            return
+        file_cache.set_cache_size(megabytes)
+        self.config.WriteInt("/Settings/FileCacheSize", megabytes)
+        self.config.Flush()
+    def on_set_file_cache_dir(self, event):
+        with wx.DirDialog(self, "Choose the file cache folder", file_cache.CACHE_DIR) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            path = dlg.GetPath()
+        file_cache.set_cache_dir(path)
+        self.config.Write("/Settings/FileCacheDir", path)
+        self.config.Flush()
+    def _ask_number(self, message, prompt, title, value, minimum, maximum):
+        with wx.NumberEntryDialog(self, message, prompt, title, value, minimum, maximum) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return None
+            return dlg.GetValue()
+    def on_set_speech_rate(self, event):
+        rate = self._ask_number(
+            "Most times per second new terminal output is spoken:",
+            "Rate:", "Speech Rate Limit", speech.OUTPUT_RATE,
+            speech.MIN_OUTPUT_RATE, speech.MAX_OUTPUT_RATE,
+        )
+        if rate is None:
+            return
+        speech.set_output_limits(rate=rate)
+        self.config.WriteInt("/Settings/SpeechRate", rate)
+        self.config.Flush()
+    def on_set_speech_backlog(self, event):
+        lines = self._ask_number(
+            "Unspoken lines allowed to pile up before they are replaced by a summary:",
+            "Lines:", "Speech Backlog Limit", speech.BACKLOG_LINES,
+            speech.MIN_BACKLOG_LINES, speech.MAX_BACKLOG_LINES,
+        )
+        if lines is None:
+            return
+        speech.set_output_limits(backlog_lines=lines)
+        self.config.WriteInt("/Settings/SpeechBacklogLines", lines)
+        self.config.Flush()
+    def on_set_speech_age(self, event):
+        age = self._ask_number(
+            "Seconds output may wait to be spoken before it is skipped:",
+            "Seconds:", "Speech Backlog Age", speech.BACKLOG_AGE,
+            speech.MIN_BACKLOG_AGE, speech.MAX_BACKLOG_AGE,
+        )
+        if age is None:
+            return
+        speech.set_output_limits(backlog_age=age)
+        self.config.WriteInt("/Settings/SpeechBacklogAge", age)
+        self.config.Flush()
     def load_settings(self):
         speak_enabled = self.config.ReadBool("/Settings/SpeakOutput", True)
         self.speak_output_item.Check(speak_enabled)
-        speech.set_speak_enabled(speak_enabled)
\ No newline at end of file
+        speech.set_speak_enabled(speak_enabled)
+        speak_milestones = self.config.ReadBool("/Settings/SpeakTransferMilestones", True)
+        self.speak_milestones_item.Check(speak_milestones)
+        dialogs.set_speak_milestones(speak_milestones)
+        compress_streams = self.config.ReadBool("/Settings/CompressBulkTransfers", True)
+        self.compress_streams_item.Check(compress_streams)
+        tar_transfer.set_compress_streams(compress_streams)
+        persist_listings = self.config.ReadBool("/Settings/PersistListings", False)
+        self.persist_listings_item.Check(persist_listings)
+        dir_cache.set_persist_listings(persist_listings)
+        output_coalescer.set_refresh_rate(self.config.ReadInt(
+            "/Settings/OutputRefreshRate", output_coalescer.DEFAULT_REFRESH_RATE
+        ))
+        sftp_helpers.set_transfer_concurrency(self.config.ReadInt(
+            "/Settings/TransferConcurrency", sftp_helpers.DEFAULT_TRANSFER_CONCURRENCY
+        ))
+        remote_watch.set_watch_interval(self.config.ReadInt(
+            "/Settings/WatchInterval", remote_watch.DEFAULT_WATCH_INTERVAL
+        ))
+        file_cache.set_cache_size(self.config.ReadInt(
+            "/Settings/FileCacheSize", file_cache.DEFAULT_CACHE_SIZE
+        ))
+        file_cache.set_cache_dir(self.config.Read("/Settings/FileCacheDir", ""))
+        speech.set_output_limits(
+            rate=self.config.ReadInt("/Settings/SpeechRate", speech.DEFAULT_OUTPUT_RATE),
+            backlog_lines=self.config.ReadInt("/Settings/SpeechBacklogLines", speech.DEFAULT_BACKLOG_LINES),
+            backlog_age=self.config.ReadInt("/Settings/SpeechBacklogAge", speech.DEFAULT_BACKLOG_AGE),
+        )
\ No newline at end of file
@@ -0,0 +1,137 @@
+import threading
+import time
+import wx
+
+DEFAULT_REFRESH_RATE = 30
+MIN_REFRESH_RATE = 1
+MAX_REFRESH_RATE = 120
+
+# Appends larger than this are wrapped in Freeze/Thaw.
+FREEZE_THRESHOLD = 2048
+
+REFRESH_RATE = DEFAULT_REFRESH_RATE
+
+
+def set_refresh_rate(rate_hz: int):
+    """Globally sets how many times per second terminal output is flushed."""
+    global REFRESH_RATE
+    REFRESH_RATE = max(MIN_REFRESH_RATE, min(int(rate_hz), MAX_REFRESH_RATE))
+
+
+class OutputCoalescer:
+    """
+    Batches terminal output between the SSH thread and a text control.
+
+    write() may be called from any thread. Text is collected until the next
+    frame and handed to the sink in one piece, at most REFRESH_RATE times per
+    second, so a flood of output costs one wx.CallAfter per frame instead of
+    one per chunk. Nothing is rendered while the window is hidden or its frame
+    is minimised. Instead, each frame's text goes to hidden_sink, which is
+    expected to store it without drawing, and once the window is shown again
+    the sink is called (with "" if nothing new arrived) so it can redraw what
+    it stored. Without a hidden_sink the text is held until then.
+    """
+
+    def __init__(self, window, sink, hidden_sink=None):
+        self.window = window
+        self.sink = sink
+        self.hidden_sink = hidden_sink
+        self._lock = threading.Lock()
+        self._pending = []
+        self._scheduled = False
+        # Text went to hidden_sink since the last flush.
+        self._stored = False
+        self._last_flush = 0.0
+        self._timer = wx.Timer(window)
+        window.Bind(wx.EVT_TIMER, self._on_timer, self._timer)
+        window.Bind(wx.EVT_SHOW, self._on_visibility_changed)
+        window.GetTopLevelParent().Bind(wx.EVT_ICONIZE, self._on_visibility_changed)
+        window.Bind(wx.EVT_WINDOW_DESTROY, self._on_destroy)
+
+    def write(self, text):
+        """Queues text for the next frame. Safe to call from any thread."""
+        if not text:
+            return
+        with self._lock:
+            self._pending.append(text)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        wx.CallAfter(self._arm)
+
+    def clear(self):
+        """Drops any text that has not been rendered yet."""
+        with self._lock:
+            self._pending = []
+            # Otherwise a clear while hidden would leave later writes waiting
+            # on a flush that never comes.
+            self._scheduled = False
+        self._stored = False
+
+    def flush(self):
+        """Hands all pending text to the sink now, if the window is visible."""
+        if not self._can_render():
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._scheduled = False
+        self._last_flush = time.monotonic()
+        if not pending and not self._stored:
+            return
+        self._stored = False
+        text = "".join(pending)
+        freeze = len(text) > FREEZE_THRESHOLD
+        if freeze:
+            self.window.Freeze()
+        try:
+            self.sink(text)
+        finally:
+            if freeze:
+                self.window.Thaw()
+
+    def _can_render(self):
+        if not self.window or self.window.IsBeingDeleted():
+            return False
+        if self.window.GetTopLevelParent().IsIconized():
+            return False
+        return self.window.IsShownOnScreen()
+
+    def _arm(self):
+        if not self.window or self._timer.IsRunning():
+            return
+        interval = 1.0 / REFRESH_RATE
+        wait = self._last_flush + interval - time.monotonic()
+        if wait <= 0:
+            self._on_timer(None)
+        else:
+            self._timer.StartOnce(max(1, int(wait * 1000)))
+
+    def _on_timer(self, event):
+        if self._can_render():
+            self.flush()
+        elif self.hidden_sink is not None:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._scheduled = False
+            self._last_flush = time.monotonic()
+            if pending:
+                self._stored = True
+                self.hidden_sink("".join(pending))
+        else:
+            # Stay scheduled so further writes don't post more CallAfters;
+            # the show/restore handler will catch up.
+            with self._lock:
+                self._scheduled = bool(self._pending)
+
+    def _on_visibility_changed(self, event):
+        event.Skip()
+        wx.CallAfter(self._catch_up)
+
+    def _catch_up(self):
+        if self.window and (self._pending or self._stored) and self._can_render():
+            self.flush()
+
+    def _on_destroy(self, event):
+        if event.GetEventObject() is self.window:
+            self._timer.Stop()
+        event.Skip()
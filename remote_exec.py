@@ -0,0 +1,103 @@
+import shlex
+import socket
+import weakref
+
+# Commands whose presence is checked once per connection.
+PROBED_TOOLS = ("tar", "gzip", "rm", "cp", "mv", "find", "grep")
+# Seconds between cancellation checks while a command is silent.
+POLL_INTERVAL = 0.5
+
+# What each server's shell offers, keyed by transport.
+_tools = weakref.WeakKeyDictionary()
+
+
+class RemoteCommandError(IOError):
+    """A command run on the server exited with an error."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def quote(path):
+    """Quotes a path for a POSIX shell command line."""
+    return shlex.quote(path)
+
+
+def run(transport, command):
+    """Runs a short command, returning (exit status, stdout, stderr)."""
+    channel = transport.open_session()
+    try:
+        channel.exec_command(command)
+        out = channel.makefile("rb").read().decode("utf-8", "replace")
+        err = channel.makefile_stderr("rb").read().decode("utf-8", "replace")
+        return channel.recv_exit_status(), out, err
+    finally:
+        channel.close()
+
+
+def server_tools(transport):
+    """
+    Returns the set of PROBED_TOOLS the server can run. Servers without a
+    POSIX shell, such as some Windows hosts, report none. Cached per
+    connection.
+    """
+    tools = _tools.get(transport)
+    if tools is None:
+        probe = "; ".join(
+            f"command -v {name} >/dev/null 2>&1 && echo {name}" for name in PROBED_TOOLS
+        )
+        try:
+            status, out, _ = run(transport, probe)
+            tools = set(out.split()) & set(PROBED_TOOLS)
+        except Exception as e:
+            print(f"Warning: Could not check the server's commands: {e}")
+            tools = set()
+        _tools[transport] = tools
+    return tools
+
+
+def stream_lines(transport, command, on_line, check_cancel, include_stderr=True):
+    """
+    Runs command, passing each line of its output to on_line as it arrives:
+    stdout and stderr together, or stdout alone if include_stderr is false.
+    check_cancel() is called between lines and at least every POLL_INTERVAL;
+    if it raises, the channel is closed, so a command that prints as it
+    works is stopped by SIGPIPE. Raises RemoteCommandError with the last
+    line printed (to stderr, if it is kept apart) if the command fails.
+    """
+    channel = transport.open_session()
+    try:
+        channel.set_combine_stderr(include_stderr)
+        channel.settimeout(POLL_INTERVAL)
+        channel.exec_command(command)
+        pending = b""
+        errors = b""
+        last = ""
+        while True:
+            check_cancel()
+            while channel.recv_stderr_ready():
+                # Only the last line is wanted; keep what is read bounded.
+                errors = (errors + channel.recv_stderr(32768))[-32768:]
+            try:
+                data = channel.recv(32768)
+            except socket.timeout:
+                continue
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for raw in lines:
+                last = raw.decode("utf-8", "replace")
+                on_line(last)
+        if pending:
+            last = pending.decode("utf-8", "replace")
+            on_line(last)
+        status = channel.recv_exit_status()
+        if status != 0:
+            if not include_stderr:
+                errors += channel.recv_stderr(32768)
+                last = errors.decode("utf-8", "replace").strip().rsplit("\n", 1)[-1]
+            raise RemoteCommandError(last or f"Command failed with status {status}.", status)
+    finally:
+        channel.close()
@@ -0,0 +1,217 @@
+import difflib
+import errno
+import hashlib
+import posixpath
+import stat
+import uuid
+from collections import namedtuple
+
+import file_cache
+from large_file import LARGE_FILE_SIZE
+
+# Files smaller than this are read straight into the editor. Bigger ones are
+# downloaded to a temporary copy, which large-file mode maps.
+IN_MEMORY_LIMIT = LARGE_FILE_SIZE
+# The most paramiko sends in one SFTP write request.
+CHUNK_SIZE = 32768
+
+# What a file looked like on the server when it was opened or last saved.
+RemoteVersion = namedtuple("RemoteVersion", "mtime size")
+
+
+class SaveConflictError(IOError):
+    """The file was changed on the server since it was opened or last saved."""
+    pass
+
+
+def version_of(attrs):
+    return RemoteVersion(attrs.st_mtime, attrs.st_size)
+
+
+def digest(data):
+    return hashlib.sha256(data).digest()
+
+
+def read_file(sftp, remote_path, server=None):
+    """
+    Reads a whole remote file into memory, with read-ahead so the server
+    streams it instead of answering one read at a time. Returns (data,
+    version). With server, the transport_id() of the server, an unchanged
+    copy in the file cache is used instead, and a fresh read is added to it.
+    """
+    if server:
+        attrs = sftp.stat(remote_path)
+        data = file_cache.fetch_data(server, remote_path, attrs.st_size, attrs.st_mtime)
+        if data is not None:
+            return data, version_of(attrs)
+    with sftp.open(remote_path, "rb") as f:
+        attrs = f.stat()
+        f.prefetch(attrs.st_size)
+        data = f.read()
+    if server:
+        file_cache.store_data(server, remote_path, attrs.st_size, attrs.st_mtime, data)
+    return data, version_of(attrs)
+
+
+def download_file(sftp, remote_path, local_path, server=None):
+    """
+    Downloads a file too big to hold in memory. Returns its RemoteVersion.
+    With server, the transport_id() of the server, an unchanged copy in the
+    file cache is used instead, and a fresh download is added to it.
+    """
+    attrs = sftp.stat(remote_path)
+    version = version_of(attrs)
+    if server and file_cache.fetch(server, remote_path, attrs.st_size, attrs.st_mtime, local_path):
+        return version
+    sftp.get(remote_path, local_path)
+    if server:
+        file_cache.store(server, remote_path, attrs.st_size, attrs.st_mtime, local_path)
+    return version
+
+
+def diff_with_remote(sftp, remote_path, text):
+    """
+    Compares text with the file on the server. Returns (diff, version):
+    unified diff lines, empty if they're the same, and the server's version.
+    """
+    data, version = read_file(sftp, remote_path)
+    theirs = data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+    diff = difflib.unified_diff(
+        text.splitlines(), theirs.splitlines(),
+        "Your version", "On the server", n=2, lineterm="",
+    )
+    return list(diff), version
+
+
+def save_file(sftp, remote_path, source, size, expected, on_progress=None, force=False):
+    """
+    Replaces remote_path with what can be read from source, a binary file
+    object of size bytes, and returns the file's new RemoteVersion.
+
+    Unless force is set, raises SaveConflictError if the file's mtime or
+    size no longer match expected. The data is written, pipelined, to a
+    temporary name beside the file, given the file's owner and permissions
+    and then renamed over it, so a dropped connection never leaves a
+    half-written file. Where renaming would change what the file is, the
+    file is overwritten in place instead: when the folder can't be written
+    to, when the file has other hard links, which would keep the old
+    contents, and when the file's owner can't be given to the new copy.
+    on_progress(done, size) is called as data is sent.
+    """
+    attrs = _lstat(sftp, remote_path)
+    if attrs is not None and stat.S_ISLNK(attrs.st_mode):
+        # Replace the file the link points to, not the link.
+        remote_path = sftp.normalize(remote_path)
+        attrs = _lstat(sftp, remote_path)
+    if not force and expected is not None and (attrs is None or version_of(attrs) != expected):
+        raise SaveConflictError(f"{remote_path} was changed on the server since it was opened.")
+
+    directory, name = posixpath.split(remote_path)
+    if attrs is not None and _link_count(sftp, directory, name) > 1:
+        return _overwrite(sftp, remote_path, source, size, on_progress)
+    tmp = posixpath.join(directory, f".{name}.teatype-{uuid.uuid4().hex[:8]}")
+    try:
+        f = sftp.open(tmp, "wb")
+    except PermissionError:
+        return _overwrite(sftp, remote_path, source, size, on_progress)
+    try:
+        in_place = attrs is not None and not _take_owner(f, attrs)
+        if not in_place:
+            _write(f, source, size, on_progress)
+            if attrs is not None:
+                sftp.chmod(tmp, stat.S_IMODE(attrs.st_mode))
+            _replace(sftp, tmp, remote_path)
+    except BaseException:
+        _discard(sftp, f, tmp)
+        raise
+    if in_place:
+        _discard(sftp, f, tmp)
+        return _overwrite(sftp, remote_path, source, size, on_progress)
+    return version_of(sftp.stat(remote_path))
+
+
+def _overwrite(sftp, remote_path, source, size, on_progress):
+    _write(sftp.open(remote_path, "wb"), source, size, on_progress)
+    return version_of(sftp.stat(remote_path))
+
+
+def _link_count(sftp, directory, name):
+    """The file's number of hard links, from its ls -l style long name; 1 if unknown."""
+    try:
+        for entry in sftp.listdir_attr(directory or "."):
+            if entry.filename == name:
+                return int(entry.longname.split()[1])
+    except (IOError, ValueError, IndexError, AttributeError):
+        pass
+    return 1
+
+
+def _discard(sftp, f, path):
+    try:
+        f.close()
+        sftp.remove(path)
+    except IOError:
+        pass
+
+
+def _lstat(sftp, path):
+    try:
+        return sftp.lstat(path)
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+
+
+def _write(f, source, size, on_progress):
+    with f:
+        f.set_pipelined(True)
+        done = 0
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            done += len(chunk)
+            if on_progress:
+                on_progress(done, size)
+        # Closing waits for the server to acknowledge every write.
+
+
+def _take_owner(f, attrs):
+    """Gives the open file f the owner of attrs; False if that isn't allowed."""
+    new = f.stat()
+    if (new.st_uid, new.st_gid) == (attrs.st_uid, attrs.st_gid):
+        return True
+    try:
+        f.chown(attrs.st_uid, attrs.st_gid)
+        return True
+    except IOError:
+        # Only root can give a file away.
+        return False
+
+
+def _replace(sftp, source, dest):
+    try:
+        sftp.posix_rename(source, dest)
+        return
+    except IOError as e:
+        # Permission and missing-file errors are real; anything else means
+        # the server lacks the posix-rename extension.
+        if e.errno is not None:
+            raise
+    # A plain SFTP rename won't replace an existing file, so move the old
+    # one aside first and put it back if the rename fails.
+    backup = source + ".old"
+    try:
+        sftp.rename(dest, backup)
+    except FileNotFoundError:
+        backup = None
+    try:
+        sftp.rename(source, dest)
+    except IOError:
+        if backup:
+            sftp.rename(backup, dest)
+        raise
+    if backup:
+        sftp.remove(backup)
@@ -0,0 +1,143 @@
+import errno
+import time
+
+import wx
+from paramiko import SFTPAttributes
+from paramiko.sftp import CMD_ATTRS, CMD_STAT
+
+from remote_file import version_of
+
+# Seconds between checks of open files for changes on the server; 0 turns
+# checking off. Adjustable from the Settings menu.
+DEFAULT_WATCH_INTERVAL = 15
+MIN_WATCH_INTERVAL = 0
+MAX_WATCH_INTERVAL = 3600
+WATCH_INTERVAL = DEFAULT_WATCH_INTERVAL
+# How often the watcher's timer looks at the clock, in milliseconds.
+TICK_MS = 1000
+
+
+def set_watch_interval(seconds: int):
+    """Sets how often open files are checked for changes on the server."""
+    global WATCH_INTERVAL
+    WATCH_INTERVAL = max(MIN_WATCH_INTERVAL, min(int(seconds), MAX_WATCH_INTERVAL))
+
+
+class _StatSweep:
+    """
+    Collects the answers to pipelined stat requests as paramiko reads them.
+
+    This is the only code relying on paramiko's private request machinery.
+    Everything it needs is looked up before the first request is sent, so
+    if a paramiko release has changed any of it, AttributeError is raised
+    with nothing left on the channel.
+    """
+
+    def __init__(self, sftp, paths):
+        send = sftp._async_request
+        self._read = sftp._read_response
+        self._convert_status = sftp._convert_status
+        self._from_msg = SFTPAttributes._from_msg
+        self.results = {}
+        self.waiting = {}
+        for path in paths:
+            self.waiting[send(self, CMD_STAT, path)] = path
+
+    def run(self):
+        while self.waiting:
+            self._read()
+        return self.results
+
+    def _async_response(self, t, msg, num):
+        path = self.waiting.pop(num)
+        if t == CMD_ATTRS:
+            self.results[path] = self._from_msg(msg)
+            return
+        try:
+            self._convert_status(msg)
+            self.results[path] = IOError(f"Unexpected reply for {path}")
+        except (IOError, EOFError) as e:
+            self.results[path] = e
+
+
+def stat_many(sftp, paths):
+    """
+    Stats every path in one round trip: all the requests are sent before
+    any answer is read, the way paramiko pipelines file reads. Returns a
+    dict of path to SFTPAttributes, or to the IOError raised for it.
+
+    Replies are read for any request on the channel, so sftp must not be
+    in use by another thread.
+    """
+    try:
+        return _StatSweep(sftp, paths).run()
+    except AttributeError as e:
+        print(f"Warning: Checking files one at a time, as pipelined stat is unavailable: {e}")
+    results = {}
+    for path in paths:
+        try:
+            results[path] = sftp.stat(path)
+        except IOError as e:
+            results[path] = e
+    return results
+
+
+class RemoteWatcher:
+    """
+    Notices when files open in a session's editors change on the server.
+
+    Every WATCH_INTERVAL seconds the watcher asks get_watched() for the
+    files to check, a dict of remote path to the RemoteVersion the editor
+    last saw, and stats them all with stat_many() as a job of the session's
+    SFTPService, which has a channel of its own. on_changed(path, version, error) is then called
+    on the UI thread for each file whose mtime or size differ, with
+    version None and the error if it is gone. A sweep is never started while
+    the last one is still out.
+    """
+
+    def __init__(self, window, service, get_watched, on_changed):
+        self.service = service
+        self.get_watched = get_watched
+        self.on_changed = on_changed
+        self._sweeping = False
+        self._last_sweep = time.monotonic()
+        self._timer = wx.Timer(window)
+        window.Bind(wx.EVT_TIMER, self._on_timer, self._timer)
+        self._timer.Start(TICK_MS)
+
+    def stop(self):
+        self._timer.Stop()
+
+    def _on_timer(self, event):
+        if not WATCH_INTERVAL or self._sweeping or not self.service.is_open:
+            return
+        if time.monotonic() - self._last_sweep < WATCH_INTERVAL:
+            return
+        self._last_sweep = time.monotonic()
+        watched = self.get_watched()
+        if not watched:
+            return
+        self._sweeping = True
+        self.service.run(
+            stat_many, list(watched),
+            on_done=lambda results: self._on_swept(watched, results),
+            on_error=self._on_failed,
+        )
+
+    def _on_swept(self, watched, results):
+        self._sweeping = False
+        # Files saved or closed since the sweep began are left out.
+        current = self.get_watched()
+        for path, seen in watched.items():
+            if current.get(path) != seen:
+                continue
+            result = results.get(path)
+            if isinstance(result, SFTPAttributes):
+                if version_of(result) != seen:
+                    self.on_changed(path, version_of(result), None)
+            elif isinstance(result, IOError) and result.errno == errno.ENOENT:
+                self.on_changed(path, None, result)
+
+    def _on_failed(self, error):
+        self._sweeping = False
+        print(f"Warning: Could not check open files for changes: {error}")
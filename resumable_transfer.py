@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import queue
+import stat
+import threading
+
+import server_store
+import sftp_helpers
+
+# Files at least this big are moved in ranges with a checkpoint journal.
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+# Size of one range; a range is the unit of parallelism and of resuming.
+RANGE_SIZE = 8 * 1024 * 1024
+# Size of each SFTP read or write request (paramiko's largest).
+BLOCK_SIZE = 32768
+# The file is built under this name and renamed into place once complete.
+PART_SUFFIX = ".teatype-part"
+JOURNAL_DIR = os.path.join(server_store.CONFIG_DIR, "transfers")
+
+
+def transport_id(transport):
+    """Identifies the server a transport is connected to, for journals."""
+    host, port = transport.getpeername()[:2]
+    return f"{transport.get_username()}@{host}:{port}"
+
+
+def server_id(sftp):
+    return transport_id(sftp.get_channel().get_transport())
+
+
+class TransferJournal:
+    """
+    Records which ranges of a large transfer are safely written.
+
+    The journal is a small JSON file in JOURNAL_DIR named after the server,
+    direction and paths. It is rewritten after every completed range, so a
+    transfer cut off by a dropped connection can carry on from the last
+    confirmed range once the server is reachable again.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, server, job):
+        """Loads the journal for a job, or starts a new one if it is stale."""
+        key = f"{server}\n{job.direction}\n{job.source}\n{job.dest}"
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+        path = os.path.join(JOURNAL_DIR, name)
+        fresh = {
+            "server": server,
+            "direction": job.direction,
+            "source": job.source,
+            "dest": job.dest,
+            "size": job.size,
+            "mtime": job.mtime,
+            "range_size": RANGE_SIZE,
+            "done": [],
+        }
+        data = _read_json(path)
+        if not data or any(data.get(k) != fresh[k] for k in ("size", "mtime", "range_size")):
+            data = fresh
+        return cls(path, data)
+
+    @staticmethod
+    def unfinished(server):
+        """Returns the saved journal data of every interrupted transfer to server."""
+        if not os.path.isdir(JOURNAL_DIR):
+            return []
+        found = []
+        for name in sorted(os.listdir(JOURNAL_DIR)):
+            if name.endswith(".json"):
+                data = _read_json(os.path.join(JOURNAL_DIR, name))
+                if data and data.get("server") == server:
+                    found.append(data)
+        return found
+
+    @property
+    def range_count(self):
+        return max(1, -(-self.data["size"] // self.data["range_size"]))
+
+    def pending_ranges(self):
+        done = set(self.data["done"])
+        return [i for i in range(self.range_count) if i not in done]
+
+    def confirmed_bytes(self):
+        size, range_size = self.data["size"], self.data["range_size"]
+        return sum(min(range_size, size - i * range_size) for i in self.data["done"])
+
+    def reset(self):
+        with self._lock:
+            self.data["done"] = []
+            self._save()
+
+    def mark_done(self, index):
+        with self._lock:
+            self.data["done"].append(index)
+            self._save()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _save(self):
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def resume_job(sftp, data):
+    """Builds a TransferJob for a journalled transfer from its source as it is now."""
+    if data["direction"] == "put":
+        st = os.stat(data["source"])
+        size, mtime = st.st_size, int(st.st_mtime)
+    else:
+        attrs = sftp.stat(data["source"])
+        size, mtime = attrs.st_size, attrs.st_mtime
+    if size < LARGE_FILE_THRESHOLD:
+        # It now goes as an ordinary file, which never clears a journal.
+        discard_unfinished(sftp, data)
+    return sftp_helpers.TransferJob(data["direction"], data["source"], data["dest"], size, mtime)
+
+
+def discard_unfinished(sftp, data):
+    """Removes a journalled transfer's partial file and its journal."""
+    job = sftp_helpers.TransferJob(data["direction"], data["source"], data["dest"], data["size"], data["mtime"])
+    _discard_part(sftp, job, job.dest + PART_SUFFIX)
+    TransferJournal.open(data["server"], job).remove()
+
+
+def transfer_large_file(sftp, job, check_cancel, pool=None, progress=None):
+    """
+    Moves one large file in RANGE_SIZE ranges, resuming a journalled attempt.
+
+    Each range is streamed with many requests in flight: downloads use
+    readv() to prefetch a whole range, uploads use pipelined writes that are
+    only confirmed when the range's handle is closed. Ranges are spread over
+    sftp plus any channels the pool can spare right now. On cancellation the
+    partial file and journal are discarded; on any other failure they are
+    kept so the transfer can resume later.
+    """
+    journal = TransferJournal.open(server_id(sftp), job)
+    part = job.dest + PART_SUFFIX
+    if not _part_is_usable(sftp, job, part, journal):
+        journal.reset()
+        _create_part(sftp, job, part)
+    if progress is not None:
+        progress.skip(journal.confirmed_bytes())
+
+    channels = [sftp]
+    if pool is not None:
+        while len(channels) < journal.range_count:
+            spare = pool.try_acquire()
+            if spare is None:
+                break
+            channels.append(spare)
+    range_size = journal.data["range_size"]
+    work = _download_range if job.direction == "get" else _upload_range
+
+    def run_range(channel, index, guard):
+        start = index * range_size
+        length = min(range_size, job.size - start)
+        work(channel, job, part, start, length, guard, progress)
+        journal.mark_done(index)
+
+    try:
+        _run_ranges(channels, journal.pending_ranges(), run_range, check_cancel)
+        _finish(sftp, job, part)
+        journal.remove()
+    except sftp_helpers.TransferCancelledError:
+        _discard_part(sftp, job, part)
+        journal.remove()
+        raise
+    finally:
+        for channel in channels[1:]:
+            pool.release(channel)
+
+
+def _part_is_usable(sftp, job, part, journal):
+    if not journal.data["done"]:
+        return False
+    try:
+        if job.direction == "get":
+            return os.path.getsize(part) == job.size
+        return stat.S_ISREG(sftp.stat(part).st_mode)
+    except (IOError, OSError):
+        return False
+
+
+def _create_part(sftp, job, part):
+    if job.direction == "get":
+        with open(part, "wb") as f:
+            f.truncate(job.size)
+    else:
+        with sftp.open(part, "w"):
+            pass
+
+
+def _discard_part(sftp, job, part):
+    try:
+        if job.direction == "get":
+            os.remove(part)
+        else:
+            sftp.remove(part)
+    except (IOError, OSError):
+        pass
+
+
+def _finish(sftp, job, part):
+    if job.direction == "get":
+        os.replace(part, job.dest)
+        return
+    try:
+        sftp.posix_rename(part, job.dest)
+    except IOError:
+        # Servers without the posix-rename extension won't replace a file.
+        try:
+            sftp.remove(job.dest)
+        except IOError:
+            pass
+        sftp.rename(part, job.dest)
+
+
+def _run_ranges(channels, ranges, run_range, check_cancel):
+    """Works through ranges with one thread per channel; raises the first failure."""
+    TransferCancelledError = sftp_helpers.TransferCancelledError
+    pending = queue.Queue()
+    for index in ranges:
+        pending.put(index)
+    stop = threading.Event()
+    errors = []
+
+    def guard(*args):
+        if stop.is_set():
+            raise TransferCancelledError("Transfer stopped.")
+        check_cancel(*args)
+
+    def loop(channel):
+        try:
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                run_range(channel, index, guard)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=loop, args=(c,), daemon=True) for c in channels[1:]]
+    for t in threads:
+        t.start()
+    loop(channels[0])
+    for t in threads:
+        t.join()
+    if errors:
+        real = [e for e in errors if not isinstance(e, TransferCancelledError)]
+        raise (real or errors)[0]
+
+
+def _download_range(sftp, job, part, start, length, guard, progress):
+    blocks = [
+        (offset, min(BLOCK_SIZE, start + length - offset))
+        for offset in range(start, start + length, BLOCK_SIZE)
+    ]
+    with sftp.open(job.source, "rb") as remote, open(part, "r+b") as local:
+        local.seek(start)
+        for data in remote.readv(blocks):
+            guard()
+            local.write(data)
+            if progress is not None:
+                progress.add(len(data))
+        local.flush()
+        os.fsync(local.fileno())
+
+
+def _upload_range(sftp, job, part, start, length, guard, progress):
+    with open(job.source, "rb") as local, sftp.open(part, "r+") as remote:
+        remote.set_pipelined(True)
+        local.seek(start)
+        remote.seek(start)
+        remaining = length
+        while remaining > 0:
+            guard()
+            data = local.read(min(BLOCK_SIZE, remaining))
+            if not data:
+                raise IOError(f"{job.source} is shorter than expected.")
+            remote.write(data)
+            remaining -= len(data)
+            if progress is not None:
+                progress.add(len(data))
+    # Leaving the with block closed the handle, which waits for every write.
@@ -0,0 +1,291 @@
+import mmap
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+
+import wx
+from speech import speak
+
+# Complete lines kept uncompressed in memory.
+HOT_LINES = 10000
+# Lines per compressed page once they are spilled to disk.
+PAGE_LINES = 1000
+# Decompressed pages kept around for scrolling back and forth.
+PAGE_CACHE_SIZE = 4
+# Characters an unfinished line may reach before it is stored as a complete
+# one, so output that never sends a newline (progress bars redrawn with \r,
+# binary junk) can't grow without bound.
+MAX_PARTIAL = 64 * 1024
+
+# Lines shown in the output control at once, and how far past that the live
+# tail may grow before the oldest lines are trimmed off the control.
+WINDOW_LINES = 1000
+TRIM_SLACK = 250
+# Lines the window moves by when the caret reaches one of its edges.
+SCROLL_STEP = 500
+
+
+class ScrollbackStore:
+    """
+    Line-indexed terminal history with bounded memory use.
+
+    The newest HOT_LINES lines live in a deque. Older lines are zlib-compressed
+    in pages of PAGE_LINES and appended to an anonymous temp file, which is
+    read back through a memory map, so memory use stays flat however long the
+    session runs while every line remains reachable by index.
+    """
+
+    def __init__(self, hot_lines=HOT_LINES, page_lines=PAGE_LINES):
+        self.hot_lines = hot_lines
+        self.page_lines = page_lines
+        self._hot = deque()
+        self._hot_first = 0
+        self.partial = ""
+        self._page_offsets = array("q")
+        self._page_sizes = array("l")
+        self._spill = None
+        self._spill_size = 0
+        self._map = None
+        self._cache = OrderedDict()
+
+    @property
+    def line_count(self):
+        """Number of complete lines stored; the partial last line is extra."""
+        return self._hot_first + len(self._hot)
+
+    def append(self, text):
+        """Adds output to the store and returns how many lines it completed."""
+        parts = text.split("\n")
+        if len(parts) == 1 and len(self.partial) + len(text) <= MAX_PARTIAL:
+            self.partial += text
+            return 0
+        parts[0] = self.partial + parts[0]
+        self.partial = parts.pop()
+        if len(self.partial) > MAX_PARTIAL:
+            parts.append(self.partial)
+            self.partial = ""
+        self._hot.extend(parts)
+        if len(self._hot) >= self.hot_lines + self.page_lines:
+            self._spill_pages()
+        return len(parts)
+
+    def get_line(self, index):
+        if index >= self._hot_first:
+            return self._hot[index - self._hot_first]
+        page = self._load_page(index // self.page_lines)
+        return page[index % self.page_lines]
+
+    def get_lines(self, start, stop):
+        """Returns complete lines start..stop-1 as a list."""
+        stop = min(stop, self.line_count)
+        lines = []
+        i = max(0, start)
+        while i < min(stop, self._hot_first):
+            page_no = i // self.page_lines
+            page = self._load_page(page_no)
+            page_start = page_no * self.page_lines
+            take = min(stop, page_start + self.page_lines)
+            lines.extend(page[i - page_start:take - page_start])
+            i = take
+        if i < stop:
+            hot = self._hot
+            base = self._hot_first
+            lines.extend(hot[j - base] for j in range(i, stop))
+        return lines
+
+    def clear(self):
+        self._hot.clear()
+        self._hot_first = 0
+        self.partial = ""
+        self._page_offsets = array("q")
+        self._page_sizes = array("l")
+        self._cache.clear()
+        self._close_map()
+        if self._spill:
+            self._spill.seek(0)
+            self._spill.truncate()
+        self._spill_size = 0
+
+    def close(self):
+        self._cache.clear()
+        self._close_map()
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    def _spill_pages(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="teatype_scrollback_")
+        while len(self._hot) > self.hot_lines:
+            lines = [self._hot.popleft() for _ in range(self.page_lines)]
+            blob = zlib.compress("\n".join(lines).encode("utf-8", "surrogatepass"), 1)
+            self._spill.seek(self._spill_size)
+            self._spill.write(blob)
+            self._page_offsets.append(self._spill_size)
+            self._page_sizes.append(len(blob))
+            self._spill_size += len(blob)
+            self._hot_first += self.page_lines
+        self._spill.flush()
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _load_page(self, page_no):
+        page = self._cache.get(page_no)
+        if page is not None:
+            self._cache.move_to_end(page_no)
+            return page
+        offset = self._page_offsets[page_no]
+        size = self._page_sizes[page_no]
+        if self._map is None or len(self._map) < offset + size:
+            # The spill file has grown since it was last mapped.
+            self._close_map()
+            self._map = mmap.mmap(self._spill.fileno(), 0, access=mmap.ACCESS_READ)
+        blob = self._map[offset:offset + size]
+        page = zlib.decompress(blob).decode("utf-8", "surrogatepass").split("\n")
+        self._cache[page_no] = page
+        if len(self._cache) > PAGE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return page
+
+
+class ScrollbackView:
+    """
+    Shows a window of a ScrollbackStore in a multi-line text control.
+
+    While following the live tail, output is appended to the control and the
+    oldest lines are trimmed once the window grows past WINDOW_LINES. Moving
+    the caret up from the first line (or down from the last) slides the window
+    through the history and speaks the line landed on, so a screen reader
+    user can arrow through everything ever received, line by line.
+    Ctrl+Home and Ctrl+End jump to the start of the history and back to the
+    live tail. Output stored with store_only() while the control isn't drawn is
+    caught up on the next append() by re-rendering the tail window, rather
+    than appending all of it to the control.
+    """
+
+    def __init__(self, ctrl, store=None, window_lines=WINDOW_LINES):
+        self.ctrl = ctrl
+        self.store = store or ScrollbackStore()
+        self.window_lines = window_lines
+        self.view_start = 0
+        self.view_stop = 0
+        self.following = True
+        # Control position where each shown line starts. The last entry is
+        # where the next line will start (the partial line, when following).
+        self._starts = [0]
+        # Output was stored that the control doesn't show yet.
+        self._behind = False
+        ctrl.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
+        ctrl.Bind(wx.EVT_WINDOW_DESTROY, self._on_destroy)
+
+    def append(self, text):
+        before = self.store.line_count
+        self.store.append(text)
+        if not self.following:
+            return
+        if self._behind:
+            self.follow_tail()
+            return
+        if text and not text.endswith("\n") and not self.store.partial:
+            # The store broke off an overlong line here.
+            text += "\n"
+        self.ctrl.AppendText(text)
+        starts = self._starts
+        for line in self.store.get_lines(before, self.store.line_count):
+            starts.append(starts[-1] + len(line) + 1)
+        self.view_stop = self.store.line_count
+        if self.view_stop - self.view_start > self.window_lines + TRIM_SLACK:
+            self._trim_front(self.view_stop - self.view_start - self.window_lines)
+
+    def store_only(self, text):
+        """Adds output to the store without touching the control."""
+        self.store.append(text)
+        if self.following:
+            self._behind = True
+
+    def clear(self):
+        self.store.clear()
+        self.ctrl.Clear()
+        self.view_start = self.view_stop = 0
+        self.following = True
+        self._behind = False
+        self._starts = [0]
+
+    def _trim_front(self, count):
+        cut = self._starts[count]
+        self.ctrl.Remove(0, cut)
+        self._starts = [s - cut for s in self._starts[count:]]
+        self.view_start += count
+
+    def show_window(self, start, caret_line=None):
+        """Renders lines from start onwards and puts the caret on caret_line."""
+        total = self.store.line_count
+        start = max(0, min(start, total))
+        stop = min(start + self.window_lines, total)
+        self.following = stop >= total
+        lines = self.store.get_lines(start, stop)
+        starts = [0]
+        for line in lines:
+            starts.append(starts[-1] + len(line) + 1)
+        text = "".join(line + "\n" for line in lines)
+        if self.following:
+            text += self.store.partial
+        self.ctrl.Freeze()
+        try:
+            self.ctrl.ChangeValue(text)
+        finally:
+            self.ctrl.Thaw()
+        self.view_start, self.view_stop, self._starts = start, stop, starts
+        self._behind = False
+        if caret_line is None:
+            pos = self.ctrl.GetLastPosition()
+        else:
+            last = stop if self.following else stop - 1
+            caret_line = max(start, min(caret_line, last))
+            pos = starts[caret_line - start]
+        self.ctrl.SetInsertionPoint(pos)
+        self.ctrl.ShowPosition(pos)
+        if caret_line is not None:
+            if caret_line < total:
+                line = self.store.get_line(caret_line)
+            else:
+                line = self.store.partial
+            speak(line or "blank", interrupt=True)
+
+    def follow_tail(self):
+        self.show_window(max(0, self.store.line_count - self.window_lines))
+
+    def _caret_line(self):
+        pos = self.ctrl.GetInsertionPoint()
+        return bisect_right(self._starts, pos) - 1
+
+    def on_key_down(self, event):
+        key = event.GetKeyCode()
+        ctrl_down = event.ControlDown()
+        if ctrl_down and key == wx.WXK_HOME and self.view_start > 0:
+            self.show_window(0, 0)
+            return
+        if ctrl_down and key == wx.WXK_END and not self.following:
+            self.follow_tail()
+            return
+        if not ctrl_down and key == wx.WXK_UP and self.view_start > 0:
+            if self._caret_line() == 0:
+                target = self.view_start - 1
+                self.show_window(max(0, self.view_start - SCROLL_STEP), target)
+                return
+        if not ctrl_down and key == wx.WXK_DOWN and not self.following:
+            if self._caret_line() >= self.view_stop - self.view_start - 1:
+                target = self.view_stop
+                self.show_window(self.view_start + SCROLL_STEP, target)
+                return
+        event.Skip()
+
+    def _on_destroy(self, event):
+        if event.GetEventObject() is self.ctrl:
+            self.store.close()
+        event.Skip()
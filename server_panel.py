@@ -4,7 +4,7 @@ from dialogs import AddServerDialog
 class ServerPanel(wx.Panel):
     def __init__(self, parent):
         super().__init__(parent)
-        self.parent_book = parent # This is the Simplebook
+        self.parent_book = parent # This is the main notebook
         
         # --- FIX: Get a reference to the main application frame ---
         self.main_frame = self.GetTopLevelParent()
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".teatype")
+SERVERS_DB = os.path.join(CONFIG_DIR, "servers.db")
+# Where servers used to be kept: servers.json in the folder Teatype was
+# started from, which is normally its own.
+LEGACY_SERVERS_FILES = [
+    "servers.json",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "servers.json"),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS servers (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    host TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS servers_name ON servers (name);
+CREATE INDEX IF NOT EXISTS servers_host ON servers (host);
+CREATE INDEX IF NOT EXISTS servers_position ON servers (position);
+CREATE TABLE IF NOT EXISTS server_tags (
+    server_id INTEGER NOT NULL REFERENCES servers (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (tag, server_id)
+);
+"""
+
+
+class ServerStore:
+    """
+    The saved servers, in an SQLite database in the user's Teatype folder.
+
+    Each server is a row holding its record as JSON, with its name and host
+    in indexed columns and its tags, if it has any, in a table of their own,
+    so any of them can be looked up without reading the rest. Records are
+    the dicts the rest of Teatype uses, with an "id" key added; adding,
+    changing or removing one writes that row alone, in a transaction, so a
+    crash midway leaves the others as they were.
+
+    When the database is first created, servers.json from older versions
+    is copied into it. The old file is left where it is.
+    """
+
+    def __init__(self, path=SERVERS_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(_SCHEMA)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            self._migrate()
+
+    def close(self):
+        self._conn.close()
+
+    def _migrate(self):
+        servers = []
+        for legacy in LEGACY_SERVERS_FILES:
+            try:
+                with open(legacy, "r") as f:
+                    servers = json.load(f)
+                break
+            except (OSError, ValueError):
+                continue
+        # Marked done in the same transaction, so an interrupted
+        # migration starts again next time.
+        with self._conn:
+            for server in servers:
+                self._insert(server)
+            self._conn.execute("PRAGMA user_version = 1")
+
+    def all(self):
+        """Every server, in the order they were added."""
+        rows = self._conn.execute("SELECT id, data FROM servers ORDER BY position")
+        return [self._record(row) for row in rows]
+
+    def find(self, name=None, host=None, tag=None):
+        """The servers with the given name, host and tag; leave any out to match all."""
+        query = "SELECT id, data FROM servers"
+        conditions, params = [], []
+        if name is not None:
+            conditions.append("name = ?")
+            params.append(name)
+        if host is not None:
+            conditions.append("host = ?")
+            params.append(host)
+        if tag is not None:
+            conditions.append("id IN (SELECT server_id FROM server_tags WHERE tag = ?)")
+            params.append(tag)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self._conn.execute(query + " ORDER BY position", params)
+        return [self._record(row) for row in rows]
+
+    def add(self, server):
+        """Saves a new server at the end of the list, setting its "id"."""
+        with self._conn:
+            self._insert(server)
+        return server
+
+    def update(self, server):
+        """Saves the changes to one server."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE servers SET name = ?, host = ?, data = ? WHERE id = ?",
+                (server["name"], server["host"], self._data(server), server["id"]),
+            )
+            self._save_tags(server)
+
+    def remove(self, server):
+        with self._conn:
+            self._conn.execute("DELETE FROM servers WHERE id = ?", (server["id"],))
+
+    def _insert(self, server):
+        cursor = self._conn.execute(
+            "INSERT INTO servers (position, name, host, data) "
+            "VALUES ((SELECT COALESCE(MAX(position), 0) + 1 FROM servers), ?, ?, ?)",
+            (server["name"], server["host"], self._data(server)),
+        )
+        server["id"] = cursor.lastrowid
+        self._save_tags(server)
+
+    def _save_tags(self, server):
+        self._conn.execute("DELETE FROM server_tags WHERE server_id = ?", (server["id"],))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO server_tags (server_id, tag) VALUES (?, ?)",
+            [(server["id"], tag) for tag in server.get("tags", [])],
+        )
+
+    @staticmethod
+    def _data(server):
+        return json.dumps({k: v for k, v in server.items() if k != "id"})
+
+    @staticmethod
+    def _record(row):
+        server = json.loads(row[1])
+        server["id"] = row[0]
+        return server
@@ -0,0 +1,280 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import wx
+
+from dialogs import FileBrowserDialog, ConnectionDetailsDialog
+from dir_cache import DirectoryCache
+from editor_frame import EditorFrame
+from remote_file import IN_MEMORY_LIMIT, download_file, read_file
+from remote_watch import RemoteWatcher
+from sftp_service import SFTPService
+from ssh_io import ChannelPump
+from terminal_panel import TerminalPanel
+import transport_profile
+from vt_parser import TerminalStreamParser
+import speech
+
+CONNECT_TIMEOUT = 10
+
+
+class Session:
+    """
+    One SSH connection, shown in its own tab of the main window.
+
+    A session stays connected while other tabs are in use. Its shell channel
+    is served by the shared I/O reactor, so background sessions cost no
+    threads and no CPU until output arrives.
+
+    Bring-up is done step by step on a paramiko Transport so each phase can
+    be timed, and the shell is opened straight after authentication. The
+    server's transport profile (compression, ciphers, window and buffer
+    sizes) is applied to the socket and transport before they start. All
+    SFTP work goes through an SFTPService, which opens its channel the first
+    time it is needed and never blocks the UI thread.
+    """
+
+    def __init__(self, frame, notebook, server_info, connect_kwargs):
+        self.frame = frame
+        self.server_info = server_info
+        self.connect_kwargs = connect_kwargs
+        self.name = server_info["name"]
+
+        self.transport = None
+        self.ssh_channel = None
+        self.sftp = None
+        self.dir_cache = DirectoryCache(
+            f"{server_info['user']}@{server_info['host']}:{server_info['port']}"
+        )
+        self._sftp_opening = False
+        self.timings = []
+        self.channel_pump = None
+        self.output_parser = TerminalStreamParser(server_info.get("encoding"))
+        self.temp_dir = None
+        self.open_files = set()
+        self.editors = {}
+        self.watcher = None
+        self.sftp_last_path = server_info.get("last_path")
+        self.closed = False
+
+        self.panel = TerminalPanel(notebook, self)
+
+    def start(self):
+        t = threading.Thread(target=self.connect_worker)
+        t.daemon = True
+        t.start()
+
+    def is_connected(self):
+        return self.channel_pump is not None and not self.channel_pump.is_stopped()
+
+    def _timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.timings.append((phase, time.perf_counter() - start))
+        return result
+
+    def connect_worker(self):
+        kw = self.connect_kwargs
+        profile = transport_profile.profile_of(self.server_info)
+        try:
+            self.panel.append_output(f"Connecting to {kw['hostname']}...\n")
+            sock = self._timed(
+                "TCP connect", transport_profile.open_socket,
+                kw['hostname'], kw['port'], CONNECT_TIMEOUT, profile,
+            )
+            # Opening the connection took about one round trip.
+            self.transport = transport_profile.make_transport(sock, profile, rtt=self.timings[-1][1])
+            self._timed("Key exchange", self.transport.start_client, None, CONNECT_TIMEOUT)
+            self._timed("Authentication", transport_profile.authenticate, self.transport, kw)
+            self.sftp = SFTPService(self.transport, on_opened=self._on_sftp_opened)
+            self.ssh_channel = self._timed("Shell", self._open_shell)
+            if self.closed:
+                self._close_connection()
+                return
+            self.channel_pump = ChannelPump(
+                self.ssh_channel, self.on_channel_data, self.on_channel_closed
+            )
+            self.channel_pump.start()
+            self.panel.append_output("Connection established.\n")
+            wx.CallAfter(self.frame.on_session_connected, self)
+        except Exception as e:
+            self.panel.append_output(f"\n--- ERROR ---\n{str(e)}\n")
+            wx.CallAfter(wx.MessageBox, f"SSH Connection Error ({self.name}): {e}", "Error", wx.OK | wx.ICON_ERROR)
+            wx.CallAfter(self.frame.close_session, self)
+
+    def _open_shell(self):
+        channel = self.transport.open_session(timeout=CONNECT_TIMEOUT)
+        channel.get_pty(term='xterm')
+        channel.invoke_shell()
+        return channel
+
+    def _on_sftp_opened(self, client, seconds):
+        # Runs on the SFTP worker thread.
+        self.timings.append(("SFTP", seconds))
+        if not self.sftp_last_path:
+            self.sftp_last_path = client.normalize('.')
+
+    def _on_sftp_ready(self, result):
+        self._sftp_opening = False
+        if not self.closed:
+            self.browse_files()
+
+    def _on_sftp_failed(self, error):
+        self._sftp_opening = False
+        wx.MessageBox(f"Could not start SFTP: {error}", "SFTP Error", wx.ICON_ERROR)
+
+    def on_channel_data(self, raw):
+        text = self.output_parser.feed(raw)
+        if text:
+            self.panel.append_output(text)
+
+    def on_channel_closed(self):
+        if not self.closed:
+            wx.CallAfter(self.frame.close_session, self)
+
+    def send_command(self, command):
+        if self.channel_pump:
+            self.channel_pump.send(command)
+
+    def browse_files(self):
+        if not self.sftp:
+            return
+        if not self.sftp.is_open:
+            if self.is_connected() and not self._sftp_opening:
+                self._sftp_opening = True
+                speech.speak("Opening file browser...", interrupt=True)
+                self.sftp.call(lambda client: None, on_done=self._on_sftp_ready, on_error=self._on_sftp_failed)
+            return
+        with FileBrowserDialog(self.frame, self.sftp, self.open_file_for_edit, initial_path=self.sftp_last_path, dir_cache=self.dir_cache) as dlg:
+            dlg.ShowModal()
+            self.sftp_last_path = dlg.get_current_path()
+
+    def open_file_for_edit(self, remote_path):
+        if remote_path in self.open_files:
+            wx.MessageBox(f"This file is already open for editing.", "Already Open", wx.ICON_INFORMATION)
+            return
+        self.open_files.add(remote_path)
+        title = f"Editing {os.path.basename(remote_path)} from {self.name}"
+
+        def opened(local_path, data, version):
+            if self.closed:
+                return
+            self.editors[remote_path] = EditorFrame(
+                self.panel, title, local_path, remote_path, self.sftp, data=data, version=version
+            )
+            if not self.watcher:
+                self.watcher = RemoteWatcher(self.panel, self.sftp, self._watched_files, self._on_remote_change)
+
+        def failed(error):
+            self.open_files.discard(remote_path)
+            wx.MessageBox(f"Failed to open file for editing: {error}", "SFTP Error", wx.ICON_ERROR)
+
+        def got_attrs(attrs):
+            if attrs.st_size < IN_MEMORY_LIMIT:
+                # Small files are read straight into memory, or from the file cache.
+                self.sftp.call(
+                    read_file, remote_path, self.sftp.server_id,
+                    on_done=lambda result: opened(None, *result), on_error=failed,
+                )
+                return
+            if not self.temp_dir:
+                self.temp_dir = tempfile.mkdtemp(prefix="teatype_")
+            local_path = os.path.join(self.temp_dir, remote_path.replace('/', '_'))
+            self.sftp.call(
+                download_file, remote_path, local_path, self.sftp.server_id,
+                on_done=lambda version: opened(local_path, None, version), on_error=failed,
+            )
+
+        self.sftp.stat(remote_path, on_done=got_attrs, on_error=failed)
+
+    def _watched_files(self):
+        # An editor's own save changes the file, so it isn't watched meanwhile.
+        return {
+            path: editor.version for path, editor in self.editors.items()
+            if editor and editor.version and not editor.saving
+        }
+
+    def _on_remote_change(self, remote_path, version, error):
+        editor = self.editors.get(remote_path)
+        if editor:
+            editor.on_remote_change(version, error)
+
+    def describe_connection(self):
+        """Returns lines describing the connection for the details view."""
+        info = self.server_info
+        lines = [
+            f"Server: {self.name}",
+            f"Address: {info['user']}@{info['host']}:{info['port']}",
+        ]
+        t = self.transport
+        if t and t.is_active():
+            lines.append(f"Server software: {t.remote_version}")
+            lines.append(f"Cipher: {t.local_cipher} out, {t.remote_cipher} in")
+            lines.append(f"MAC: {t.local_mac} out, {t.remote_mac} in")
+            lines.append(f"Compression: {t.local_compression} out, {t.remote_compression} in")
+            lines.append(f"Channel window: {t.default_window_size // 1024} KB")
+            lines.append(f"Host key type: {t.get_remote_server_key().get_name()}")
+        else:
+            lines.append("Status: not connected")
+        lines.append("")
+        lines.append("Connection phases:")
+        total = 0.0
+        for phase, seconds in self.timings:
+            total += seconds
+            lines.append(f"  {phase}: {seconds * 1000:.0f} ms")
+        if not any(phase == "SFTP" for phase, _ in self.timings):
+            lines.append("  SFTP: not opened yet")
+        lines.append(f"  Total: {total * 1000:.0f} ms")
+        return lines
+
+    def show_connection_details(self):
+        with ConnectionDetailsDialog(self.frame, self.name, self.describe_connection()) as dlg:
+            dlg.ShowModal()
+
+    def notify_editor_closed(self, remote_path):
+        if remote_path in self.open_files:
+            self.open_files.remove(remote_path)
+        self.editors.pop(remote_path, None)
+
+    def close(self):
+        """Ends the connection and removes temporary files. Call on the UI thread."""
+        if self.closed:
+            return
+        self.closed = True
+        # Give open editors the chance to save while SFTP is still up.
+        for editor in list(self.editors.values()):
+            if editor:
+                editor.Close()
+        if self.channel_pump:
+            self.channel_pump.stop()
+        if self.watcher:
+            self.watcher.stop()
+        temp_dir, self.temp_dir = self.temp_dir, None
+        # Temp files may still be waiting to be uploaded by a queued save.
+        self._close_connection(then=lambda: self._remove_temp_dir(temp_dir))
+        self.dir_cache.save()
+        self.open_files.clear()
+        self.editors.clear()
+
+    def _remove_temp_dir(self, temp_dir):
+        try:
+            if temp_dir and os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+        except Exception as e:
+            print(f"Warning: Could not remove temp directory {temp_dir}: {e}")
+
+    def _close_connection(self, then=None):
+        def finish():
+            if self.transport:
+                self.transport.close()
+            if then:
+                then()
+
+        if self.sftp:
+            # Queued SFTP requests, such as an editor's last save, go first.
+            self.sftp.shutdown(then=finish)
+        else:
+            finish()
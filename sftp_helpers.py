@@ -1,79 +1,686 @@
 import os
+import queue
 import stat
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import paramiko
 import wx
 
+import file_cache
+import remote_exec
+import resumable_transfer
+import tar_transfer
+
+# Files transferred at once, each over its own SFTP channel. Adjustable from
+# the Settings menu.
+DEFAULT_TRANSFER_CONCURRENCY = 4
+MIN_TRANSFER_CONCURRENCY = 1
+# OpenSSH allows 10 sessions per connection by default. The shell, the
+# session's SFTP client and the client of the job running the transfer take
+# three, and one is kept free for commands such as tar streams; the pool is
+# held to less than this while more jobs are running (see SFTPService).
+MAX_TRANSFER_CONCURRENCY = 6
+TRANSFER_CONCURRENCY = DEFAULT_TRANSFER_CONCURRENCY
+
+# Seconds between status reports of a server-side delete, copy or move.
+STATUS_INTERVAL = 0.25
+# A server-side search stops once it has found this many items.
+MAX_SEARCH_RESULTS = 5000
+
+# One file to move: direction is "put" (local to remote) or "get"; size and
+# mtime are the source file's.
+TransferJob = namedtuple("TransferJob", "direction source dest size mtime")
+
+
+def set_transfer_concurrency(count):
+    """Sets how many files are transferred in parallel."""
+    global TRANSFER_CONCURRENCY
+    TRANSFER_CONCURRENCY = max(MIN_TRANSFER_CONCURRENCY, min(MAX_TRANSFER_CONCURRENCY, int(count)))
+
+
 class TransferCancelledError(Exception):
     """Custom exception for clean cancellation of transfers."""
     pass
 
-def count_remote_items(sftp, path, cancel_flag=None):
-    """Recursively counts the number of files in a remote path."""
-    if cancel_flag and cancel_flag.is_set():
-        raise TransferCancelledError("Operation cancelled by user during file count.")
-    count = 0
-    attrs = sftp.lstat(path)
-    if stat.S_ISDIR(attrs.st_mode):
-        for item in sftp.listdir(path):
-            count += count_remote_items(sftp, f"{path}/{item}", cancel_flag)
-    else:
-        count = 1
-    return count
-
-def count_local_items(path, cancel_flag=None):
-    """Recursively counts the number of files in a local path."""
-    if cancel_flag and cancel_flag.is_set():
-        raise TransferCancelledError("Operation cancelled by user during file count.")
-    count = 0
-    if os.path.isdir(path):
-        for item in os.listdir(path):
-            count += count_local_items(os.path.join(path, item), cancel_flag)
-    else:
-        count = 1
-    return count
 
-def upload_item(sftp, local_path, remote_path, file_processed_callback, cancel_flag):
+class TransferProgress:
     """
-    Uploads a local file or directory recursively, calling a callback for each file.
+    Byte-level progress of one operation, fed from any transfer thread.
+
+    Throughput is sampled at most every SAMPLE_INTERVAL seconds and smoothed
+    exponentially, so the figure and the ETA derived from it don't jump about
+    with every packet. The UI polls snapshot() on its own schedule.
     """
-    if cancel_flag.is_set():
-        raise TransferCancelledError("Upload cancelled by user.")
-    if os.path.isdir(local_path):
+
+    SAMPLE_INTERVAL = 0.5
+    SMOOTHING = 0.3
+
+    def __init__(self, total_bytes, total_files):
+        self.total_bytes = total_bytes
+        self.total_files = total_files
+        self.done_bytes = 0
+        self.files_started = 0
+        self.current_file = ""
+        self.rate = 0.0
+        self._lock = threading.Lock()
+        self._sample_time = time.monotonic()
+        self._sample_bytes = 0
+
+    def file_started(self, path):
+        with self._lock:
+            self.files_started += 1
+            self.current_file = os.path.basename(path)
+
+    def add(self, count):
+        """Records count bytes moved."""
+        with self._lock:
+            self.done_bytes += count
+            now = time.monotonic()
+            elapsed = now - self._sample_time
+            if elapsed >= self.SAMPLE_INTERVAL:
+                current = (self.done_bytes - self._sample_bytes) / elapsed
+                if self.rate:
+                    self.rate += self.SMOOTHING * (current - self.rate)
+                else:
+                    self.rate = current
+                self._sample_time = now
+                self._sample_bytes = self.done_bytes
+
+    def mark(self):
+        """Returns a point that rewind() can later return to."""
+        with self._lock:
+            return self.done_bytes, self.files_started
+
+    def rewind(self, mark):
+        """Forgets progress made since mark(), e.g. before work is retried another way."""
+        with self._lock:
+            done, self.files_started = mark
+            self._sample_bytes -= self.done_bytes - done
+            self.done_bytes = done
+
+    def skip(self, count):
+        """Records count bytes already done earlier, e.g. by a resumed transfer."""
+        with self._lock:
+            self.done_bytes += count
+            self._sample_bytes += count
+
+    def snapshot(self):
+        """Returns (done_bytes, total_bytes, bytes_per_second, seconds_left or None)."""
+        with self._lock:
+            done, total, rate = self.done_bytes, self.total_bytes, self.rate
+        eta = (total - done) / rate if rate > 0 else None
+        return done, total, rate, eta
+
+
+class SFTPChannelPool:
+    """
+    Extra SFTP channels on one SSH transport, shared by transfer workers.
+
+    An SFTP channel waits a round trip for every open, write and close, so
+    moving many small files over one channel is bound by latency rather than
+    bandwidth. Channels are opened on demand, up to TRANSFER_CONCURRENCY or
+    spare(), whichever is fewer, and closed again once no transfer is using
+    the pool, so they don't keep the server from opening others. If the
+    server refuses another channel the pool carries on with the ones it has;
+    if it could not open any, acquire() returns None and callers use a
+    channel of their own.
+    """
+
+    def __init__(self, transport, spare=None):
+        self.transport = transport
+        self.spare = spare
+        self._idle = queue.LifoQueue()
+        self._opened = []
+        self._lock = threading.Lock()
+        self._can_grow = True
+        self._users = 0
+
+    @property
+    def size(self):
+        if not self._can_grow:
+            return max(1, len(self._opened))
+        return TRANSFER_CONCURRENCY
+
+    def acquire(self):
+        """
+        Returns a channel for one worker's exclusive use, waiting for one to
+        be released if need be, or None if the server would open none.
+        """
+        sftp = self.try_acquire()
+        if sftp is not None:
+            return sftp
+        with self._lock:
+            if not self._opened:
+                return None
+        return self._idle.get()
+
+    def try_acquire(self):
+        """Returns an idle or newly opened channel, or None without waiting."""
         try:
-            sftp.mkdir(remote_path)
-        except IOError:
+            return self._idle.get_nowait()
+        except queue.Empty:
             pass
-        for item in os.listdir(local_path):
-            upload_item(sftp, os.path.join(local_path, item), f"{remote_path}/{item}", file_processed_callback, cancel_flag)
+        with self._lock:
+            limit = TRANSFER_CONCURRENCY
+            if self.spare is not None:
+                limit = min(limit, self.spare())
+            if self._can_grow and len(self._opened) < limit:
+                try:
+                    sftp = paramiko.SFTPClient.from_transport(self.transport)
+                    self._opened.append(sftp)
+                    return sftp
+                except Exception as e:
+                    print(f"Warning: Could not open another SFTP channel: {e}")
+                    self._can_grow = False
+        return None
+
+    def release(self, sftp):
+        self._idle.put(sftp)
+
+    @contextmanager
+    def in_use(self):
+        """Marks a transfer as using the pool; the last one out closes its channels."""
+        with self._lock:
+            self._users += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._users -= 1
+                if self._users == 0:
+                    self._close_channels()
+
+    def close(self):
+        with self._lock:
+            self._close_channels()
+
+    def _close_channels(self):
+        for sftp in self._opened:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        self._opened = []
+        self._idle = queue.LifoQueue()
+        self._can_grow = True
+
+# One item found by a manifest walk; mode tells directories from files.
+ManifestEntry = namedtuple("ManifestEntry", "source dest size mode mtime")
+
+
+class TransferManifest:
+    """
+    Every directory and file a transfer will create, found in one walk.
+
+    Trees are walked breadth first. Remote directories are read with
+    listdir_attr(), which returns each entry's size, mode and mtime along
+    with its name, so a tree costs one round trip per directory and nothing
+    per file. The progress total, the transfer jobs and the final report all
+    come from the same manifest.
+    """
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.entries = []
+        # The top-level items added, and the slice of entries each one covers.
+        self.roots = []
+        self._spans = {}
+
+    def add_remote(self, sftp, remote_path, local_path, cancel_flag):
+        """Adds a remote file or tree, to be downloaded to local_path."""
+        start = len(self.entries)
+        self._walk_remote(sftp, remote_path, local_path, cancel_flag)
+        self._add_root(start)
+
+    def add_local(self, local_path, remote_path, cancel_flag):
+        """Adds a local file or tree, to be uploaded to remote_path."""
+        start = len(self.entries)
+        self._walk_local(local_path, remote_path, cancel_flag)
+        self._add_root(start)
+
+    def _add_root(self, start):
+        root = self.entries[start]
+        self.roots.append(root)
+        self._spans[root] = (start, len(self.entries))
+
+    def entries_under(self, root):
+        """Returns everything below one of roots, in walk order."""
+        start, end = self._spans[root]
+        return self.entries[start + 1:end]
+
+    def files_under(self, root):
+        return [e for e in self.entries_under(root) if not stat.S_ISDIR(e.mode)]
+
+    def excluding(self, roots):
+        """Returns a manifest of everything outside the given roots."""
+        rest = TransferManifest(self.direction)
+        for root in self.roots:
+            if root not in roots:
+                start, end = self._spans[root]
+                rest.entries.extend(self.entries[start:end])
+                rest._add_root(len(rest.entries) - (end - start))
+        return rest
+
+    def without_files(self, files):
+        """Returns a manifest of everything but the given file entries."""
+        rest = TransferManifest(self.direction)
+        for root in self.roots:
+            start, end = self._spans[root]
+            kept = [e for e in self.entries[start:end] if e not in files]
+            if kept:
+                rest.entries.extend(kept)
+                rest._add_root(len(rest.entries) - len(kept))
+        return rest
+
+    def _walk_remote(self, sftp, remote_path, local_path, cancel_flag):
+        attrs = sftp.lstat(remote_path)
+        pending = deque([(remote_path, local_path, attrs)])
+        while pending:
+            if cancel_flag.is_set():
+                raise TransferCancelledError("Operation cancelled by user during file scan.")
+            remote, local, attrs = pending.popleft()
+            self.entries.append(ManifestEntry(remote, local, attrs.st_size or 0, attrs.st_mode, attrs.st_mtime))
+            if stat.S_ISDIR(attrs.st_mode):
+                for child in sftp.listdir_attr(remote):
+                    pending.append((f"{remote}/{child.filename}", os.path.join(local, child.filename), child))
+
+    def _walk_local(self, local_path, remote_path, cancel_flag):
+        pending = deque([(local_path, remote_path, os.stat(local_path))])
+        while pending:
+            if cancel_flag.is_set():
+                raise TransferCancelledError("Operation cancelled by user during file scan.")
+            local, remote, st = pending.popleft()
+            self.entries.append(ManifestEntry(local, remote, st.st_size, st.st_mode, int(st.st_mtime)))
+            if stat.S_ISDIR(st.st_mode):
+                with os.scandir(local) as it:
+                    for child in it:
+                        pending.append((child.path, f"{remote}/{child.name}", child.stat()))
+
+    @property
+    def dirs(self):
+        return [e for e in self.entries if stat.S_ISDIR(e.mode)]
+
+    @property
+    def files(self):
+        return [e for e in self.entries if not stat.S_ISDIR(e.mode)]
+
+    @property
+    def total_bytes(self):
+        return sum(e.size for e in self.files)
+
+    def create_dirs(self, sftp):
+        """Creates the destination directories; parents come before children."""
+        for entry in self.dirs:
+            if self.direction == "get":
+                os.makedirs(entry.dest, exist_ok=True)
+            else:
+                try:
+                    sftp.mkdir(entry.dest)
+                except IOError:
+                    pass
+
+    def jobs(self):
+        return [TransferJob(self.direction, e.source, e.dest, e.size, e.mtime) for e in self.files]
+
+def _transfer_one(sftp, job, check_cancel, pool=None, progress=None):
+    """Moves one file, removing the partial copy if it is cancelled midway."""
+    if job.size >= resumable_transfer.LARGE_FILE_THRESHOLD:
+        resumable_transfer.transfer_large_file(sftp, job, check_cancel, pool, progress)
+        return
+    reported = [0]
+
+    def callback(transferred, total):
+        check_cancel()
+        if progress is not None:
+            progress.add(transferred - reported[0])
+            reported[0] = transferred
+
+    try:
+        if job.direction == "put":
+            sftp.put(job.source, job.dest, callback=callback)
+        else:
+            sftp.get(job.source, job.dest, callback=callback)
+    except TransferCancelledError:
+        try:
+            if job.direction == "put":
+                sftp.remove(job.dest)
+            else:
+                os.remove(job.dest)
+        except (IOError, OSError):
+            pass
+        raise
+
+def run_transfers(sftp, jobs, file_processed_callback, cancel_flag, pool=None, progress=None):
+    """
+    Transfers the given jobs, calling file_processed_callback(source) as each
+    file starts. Without a pool files go one at a time over sftp; with one,
+    up to pool.size files are in flight at once. The callback is never called
+    from two threads at the same time. Bytes moved are added to progress, a
+    TransferProgress, if given. The first failure stops the rest and is
+    raised once in-flight files have finished.
+    """
+    abort = threading.Event()
+
+    def check_cancel(*args):
+        if cancel_flag.is_set() or abort.is_set():
+            raise TransferCancelledError("Transfer cancelled by user.")
+
+    if pool is None:
+        for job in jobs:
+            check_cancel()
+            file_processed_callback(job.source)
+            _transfer_one(sftp, job, check_cancel, progress=progress)
+        return
+
+    callback_lock = threading.Lock()
+    # Without channels from the pool, the workers take turns on sftp.
+    own_channel_lock = threading.Lock()
+
+    def worker(job):
+        check_cancel()
+        channel = pool.acquire()
+        if channel is None:
+            with own_channel_lock:
+                check_cancel()
+                with callback_lock:
+                    file_processed_callback(job.source)
+                _transfer_one(sftp, job, check_cancel, pool, progress)
+            return
+        try:
+            check_cancel()
+            with callback_lock:
+                file_processed_callback(job.source)
+            _transfer_one(channel, job, check_cancel, pool, progress)
+        finally:
+            pool.release(channel)
+
+    error = None
+    with pool.in_use(), ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(worker, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                # Keep the real cause rather than the cancellations it triggers.
+                if error is None or (
+                    isinstance(error, TransferCancelledError)
+                    and not isinstance(e, TransferCancelledError)
+                ):
+                    error = e
+                abort.set()
+    if error is not None:
+        raise error
+
+def transfer_manifest(sftp, manifest, file_processed_callback, cancel_flag, pool=None, progress=None, server=None):
+    """
+    Creates the directories of a manifest and transfers its files. Folders
+    full of small files are sent as one tar stream each when the server has
+    tar, which saves several round trips per file; everything else, and any
+    folder whose stream fails, goes file by file through run_transfers().
+
+    When downloading with server, the transport_id() of the server, files
+    go through the local file cache: unchanged ones are copied from it
+    instead of downloaded, so only the rest are streamed or sent, and those
+    are added to it.
+    """
+    def check_cancel():
+        if cancel_flag.is_set():
+            raise TransferCancelledError("Transfer cancelled by user.")
+
+    transport = sftp.get_channel().get_transport()
+    cached = server and manifest.direction == "get"
+    partial = False
+    if cached:
+        manifest.create_dirs(sftp)
+        rest = _fetch_cached(server, manifest, check_cancel, progress)
+        partial = rest is not manifest
+        manifest = rest
+    streamed = []
+    for root in tar_transfer.tar_roots(transport, manifest):
+        check_cancel()
+        mark = progress.mark() if progress is not None else None
+        files = manifest.files_under(root) if partial else None
+        try:
+            tar_transfer.stream_tree(transport, manifest, root, file_processed_callback, check_cancel, progress, files)
+            streamed.append(root)
+        except TransferCancelledError:
+            raise
+        except Exception as e:
+            print(f"Warning: Could not stream {root.source} with tar, sending files one by one: {e}")
+            if progress is not None:
+                progress.rewind(mark)
+            continue
+        if cached:
+            _store_cached(server, manifest.files_under(root))
+    rest = manifest.excluding(streamed) if streamed else manifest
+    rest.create_dirs(sftp)
+    run_transfers(sftp, rest.jobs(), file_processed_callback, cancel_flag, pool, progress)
+    if cached:
+        _store_cached(server, rest.files)
+
+def _store_cached(server, entries):
+    for entry in entries:
+        if stat.S_ISREG(entry.mode):
+            file_cache.store(server, entry.source, entry.size, entry.mtime, entry.dest)
+
+def _fetch_cached(server, manifest, check_cancel, progress):
+    """Copies the files of a download found in the file cache; returns what is left to fetch."""
+    served = set()
+    for entry in manifest.files:
+        check_cancel()
+        if stat.S_ISREG(entry.mode) and file_cache.fetch(server, entry.source, entry.size, entry.mtime, entry.dest):
+            served.add(entry)
+            if progress is not None:
+                progress.add(entry.size)
+    return manifest.without_files(served) if served else manifest
+
+class _StatusCounter:
+    """Counts items as they are reported, passing the count on every STATUS_INTERVAL."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.count = 0
+        self._reported = 0.0
+
+    def __call__(self, *args):
+        self.count += 1
+        now = time.monotonic()
+        if now - self._reported >= STATUS_INTERVAL:
+            self._reported = now
+            self.callback(self.count)
+
+    def finish(self):
+        self.callback(self.count)
+
+class _Batcher:
+    """Collects items as they arrive, passing them on in batches every STATUS_INTERVAL."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.count = 0
+        self._pending = []
+        self._reported = 0.0
+
+    def __call__(self, item):
+        self.count += 1
+        self._pending.append(item)
+        now = time.monotonic()
+        if now - self._reported >= STATUS_INTERVAL:
+            self._reported = now
+            self.finish()
+
+    def finish(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self.callback(batch)
+
+class _SearchLimitReached(Exception):
+    pass
+
+def _quote_all(paths):
+    return " ".join(remote_exec.quote(p) for p in paths)
+
+def _target(sftp, source, dest):
+    """Where source ends up when copied or moved to dest, as cp and mv decide."""
+    try:
+        if stat.S_ISDIR(sftp.stat(dest).st_mode):
+            return f"{dest.rstrip('/')}/{os.path.basename(source)}"
+    except IOError:
+        pass
+    return dest
+
+def _run_tool(transport, command, counter, check_cancel):
+    """
+    Runs a server-side rm, cp or mv, counting each item it reports with -v.
+    Returns False if it could not be started, or failed before reporting
+    anything (as it does if it doesn't know -v, which not every rm, cp or
+    mv does), so the caller can do the work over SFTP instead.
+    """
+    try:
+        remote_exec.stream_lines(transport, command, counter, check_cancel, include_stderr=False)
+        return True
+    except (paramiko.SSHException, remote_exec.RemoteCommandError) as e:
+        if counter.count:
+            raise
+        print(f"Warning: Could not run {command.split()[0]} on the server, using SFTP instead: {e}")
+        return False
+
+def delete_items(sftp, remote_paths, on_status, check_cancel):
+    """
+    Deletes remote files and trees. When the server has rm this is a single
+    command however many files there are; otherwise every item is removed
+    over SFTP. on_status(count) reports the items removed so far.
+    """
+    counter = _StatusCounter(on_status)
+    transport = sftp.get_channel().get_transport()
+    command = f"rm -rfv -- {_quote_all(remote_paths)}"
+    if "rm" not in remote_exec.server_tools(transport) or not _run_tool(transport, command, counter, check_cancel):
+        for remote_path in remote_paths:
+            delete_item(sftp, remote_path, counter, check_cancel)
+    counter.finish()
+
+def copy_items(sftp, remote_paths, dest, on_status, check_cancel):
+    """
+    Copies remote files and trees to dest, a new name or an existing folder,
+    without the data leaving the server when it has cp. Otherwise the data
+    is streamed through this client over SFTP.
+    """
+    counter = _StatusCounter(on_status)
+    transport = sftp.get_channel().get_transport()
+    command = f"cp -av -- {_quote_all(remote_paths)} {remote_exec.quote(dest)}"
+    if "cp" not in remote_exec.server_tools(transport) or not _run_tool(transport, command, counter, check_cancel):
+        for remote_path in remote_paths:
+            copy_item(sftp, remote_path, _target(sftp, remote_path, dest), counter, check_cancel)
+    counter.finish()
+
+def move_items(sftp, remote_paths, dest, on_status, check_cancel):
+    """
+    Moves or renames remote items to dest, a new name or an existing folder.
+    mv also moves between file systems; the SFTP fallback can only rename.
+    """
+    counter = _StatusCounter(on_status)
+    transport = sftp.get_channel().get_transport()
+    command = f"mv -v -- {_quote_all(remote_paths)} {remote_exec.quote(dest)}"
+    if "mv" not in remote_exec.server_tools(transport) or not _run_tool(transport, command, counter, check_cancel):
+        for remote_path in remote_paths:
+            check_cancel()
+            sftp.rename(remote_path, _target(sftp, remote_path, dest))
+            counter()
+    counter.finish()
+
+def search_items(sftp, root, text, contents, match_case, on_hits, check_cancel):
+    """
+    Searches the tree at root on the server: for names containing text with
+    find, or with contents containing it with grep -rl if contents is true.
+    Names may also be a wildcard pattern such as *.conf. Hits are passed to
+    on_hits(paths) in batches as they stream in; folders end with a slash.
+    Returns (hits, truncated), truncated meaning MAX_SEARCH_RESULTS was hit.
+    """
+    transport = sftp.get_channel().get_transport()
+    tool = "grep" if contents else "find"
+    if tool not in remote_exec.server_tools(transport):
+        raise IOError(f"The server has no {tool} command to search with.")
+    quote = remote_exec.quote
+    if contents:
+        command = f"grep -rlI{'' if match_case else 'i'} -F -e {quote(text)} -- {quote(root)}"
     else:
-        file_processed_callback(local_path)
-        sftp.put(local_path, remote_path)
+        pattern = text if any(c in text for c in "*?[") else f"*{text}*"
+        test = "-name" if match_case else "-iname"
+        # Folders are marked with a trailing slash; files stream out one by one.
+        command = (
+            f"find {quote(root)} -mindepth 1 {test} {quote(pattern)} "
+            r"\( -type d -exec printf '%s/\n' {} + -o -print \)"
+        )
+    hits = _Batcher(on_hits)
+
+    def on_line(line):
+        if not line:
+            return
+        if hits.count >= MAX_SEARCH_RESULTS:
+            raise _SearchLimitReached()
+        hits(line)
 
-def download_item(sftp, remote_path, local_path, file_processed_callback, cancel_flag):
+    truncated = False
+    try:
+        # Unreadable folders would otherwise show up as results.
+        remote_exec.stream_lines(transport, command + " 2>/dev/null", on_line, check_cancel)
+    except _SearchLimitReached:
+        truncated = True
+    except remote_exec.RemoteCommandError as e:
+        # find and grep report unreadable files, and grep no matches, with a
+        # low status; only a missing or broken command is a real failure.
+        if e.status >= 126:
+            raise
+    finally:
+        hits.finish()
+    return hits.count, truncated
+
+def copy_item(sftp, source, dest, on_copied=None, check_cancel=None):
     """
-    Downloads a remote file or directory recursively, calling a callback for each file.
+    Copies a remote file or directory recursively through this client.
     """
-    if cancel_flag.is_set():
-        raise TransferCancelledError("Download cancelled by user.")
-    remote_attrs = sftp.lstat(remote_path)
-    if stat.S_ISDIR(remote_attrs.st_mode):
-        os.makedirs(local_path, exist_ok=True)
-        for item in sftp.listdir(remote_path):
-            download_item(sftp, f"{remote_path}/{item}", os.path.join(local_path, item), file_processed_callback, cancel_flag)
+    if check_cancel:
+        check_cancel()
+    attrs = sftp.lstat(source)
+    if stat.S_ISDIR(attrs.st_mode):
+        sftp.mkdir(dest)
+        for child in sftp.listdir_attr(source):
+            copy_item(sftp, f"{source}/{child.filename}", f"{dest}/{child.filename}", on_copied, check_cancel)
     else:
-        file_processed_callback(remote_path)
-        sftp.get(remote_path, local_path)
+        with sftp.open(source, "rb") as src, sftp.open(dest, "wb") as dst:
+            src.prefetch(attrs.st_size)
+            dst.set_pipelined(True)
+            while True:
+                if check_cancel:
+                    check_cancel()
+                data = src.read(resumable_transfer.BLOCK_SIZE)
+                if not data:
+                    break
+                dst.write(data)
+    if on_copied:
+        on_copied(dest)
 
-def delete_item(sftp, remote_path):
+def delete_item(sftp, remote_path, on_removed=None, check_cancel=None):
     """
     Deletes a remote file or directory recursively.
     """
+    if check_cancel:
+        check_cancel()
     try:
         attrs = sftp.lstat(remote_path)
         if stat.S_ISDIR(attrs.st_mode):
             for item in sftp.listdir(remote_path):
-                delete_item(sftp, f"{remote_path}/{item}")
+                delete_item(sftp, f"{remote_path}/{item}", on_removed, check_cancel)
             sftp.rmdir(remote_path)
         else:
             sftp.remove(remote_path)
+    except TransferCancelledError:
+        raise
     except Exception as e:
-        raise IOError(f"Failed to delete {remote_path}: {e}")
\ No newline at end of file
+        raise IOError(f"Failed to delete {remote_path}: {e}")
+    if on_removed:
+        on_removed(remote_path)
@@ -0,0 +1,202 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import paramiko
+import wx
+
+from resumable_transfer import transport_id
+from sftp_helpers import SFTPChannelPool
+
+# Long-running jobs (transfers, big listings) that may run at once.
+JOB_WORKERS = 4
+# OpenSSH allows 10 sessions per connection by default. Besides the SFTP
+# clients counted here, the shell uses one, and one is kept free for
+# commands such as tar streams and server-side copies.
+MAX_CHANNELS = 10
+OTHER_CHANNELS = 2
+
+
+class SFTPService:
+    """
+    Runs every SFTP operation of one session off the UI thread.
+
+    Requests (listings, stat, mkdir, opening and saving files) go through a
+    single worker in the order they were made, so they never race each
+    other. Long jobs such as transfers run on a few workers of their own so
+    they don't hold up browsing, and can borrow the extra channels of
+    transfer_pool, which may open whatever MAX_CHANNELS leaves once every
+    client and the shell are counted.
+
+    An SFTPClient must only be used by one thread at a time: paramiko reads
+    replies without locking, and a thread waiting for one reply throws away
+    any others it reads. So the session's client belongs to the request
+    worker, and each job worker opens a client of its own on first use. If
+    the server won't open another channel, jobs are run by the request
+    worker instead.
+
+    call() and run() return a concurrent.futures.Future. on_done(result) or
+    on_error(exception) are delivered on the UI thread through wx.CallAfter,
+    and are dropped if the window they belong to has been destroyed. The
+    client is opened on first use; on_opened(client, seconds) is then called
+    on the worker thread.
+    """
+
+    def __init__(self, transport, on_opened=None):
+        self.transport = transport
+        self.on_opened = on_opened
+        self.transfer_pool = None
+        self._client = None
+        self._job_clients = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._requests = ThreadPoolExecutor(1, thread_name_prefix="teatype-sftp")
+        self._jobs = ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix="teatype-sftp-job")
+
+    @property
+    def is_open(self):
+        return self._client is not None
+
+    @property
+    def server_id(self):
+        return transport_id(self.transport)
+
+    def client(self):
+        """Returns the SFTPClient, opening it if needed. Worker threads only."""
+        if wx.IsMainThread():
+            raise RuntimeError("SFTP must not be used on the UI thread.")
+        with self._lock:
+            if self._client is None:
+                if self._closed or not self.transport.is_active():
+                    raise IOError("Not connected.")
+                start = time.perf_counter()
+                client = paramiko.SFTPClient.from_transport(self.transport)
+                self.transfer_pool = SFTPChannelPool(self.transport, self._spare_channels)
+                self._client = client
+                if self.on_opened:
+                    self.on_opened(client, time.perf_counter() - start)
+            return self._client
+
+    def _spare_channels(self):
+        """How many channels the transfer pool may have open at once."""
+        clients = 1 + len(self._job_clients)
+        return MAX_CHANNELS - OTHER_CHANNELS - clients
+
+    def _job_client(self):
+        """Returns the calling job worker's own client, or None if the server refuses one."""
+        client = getattr(self._local, "client", None)
+        if client is not None and not client.get_channel().closed:
+            return client
+        self.client()
+        with self._lock:
+            if self._closed:
+                raise IOError("Not connected.")
+            try:
+                client = paramiko.SFTPClient.from_transport(self.transport)
+            except paramiko.SSHException as e:
+                print(f"Warning: Could not open an SFTP channel for a job: {e}")
+                client = None
+            if client is not None:
+                self._job_clients.append(client)
+        self._local.client = client
+        return client
+
+    def call(self, fn, *args, on_done=None, on_error=None):
+        """Queues fn(client, *args) behind earlier requests."""
+        return self._submit(self._requests, lambda: fn(self.client(), *args), on_done, on_error)
+
+    def run(self, fn, *args, on_done=None, on_error=None):
+        """Starts fn(client, *args) as a long job alongside other work."""
+        def job():
+            client = self._job_client()
+            if client is not None:
+                return fn(client, *args)
+            # The request worker runs it on the session's client instead.
+            try:
+                request = self._requests.submit(lambda: fn(self.client(), *args))
+            except RuntimeError:
+                raise IOError("Not connected.")
+            return request.result()
+        return self._submit(self._jobs, job, on_done, on_error)
+
+    def _submit(self, executor, work, on_done, on_error):
+        if self._closed:
+            future = Future()
+            future.set_exception(IOError("Not connected."))
+        else:
+            future = executor.submit(work)
+        future.add_done_callback(lambda f: _deliver(f, on_done, on_error))
+        return future
+
+    # Shortcuts for the common single requests.
+
+    def listdir_attr(self, path, **callbacks):
+        return self.call(lambda c: c.listdir_attr(path), **callbacks)
+
+    def stat(self, path, **callbacks):
+        return self.call(lambda c: c.stat(path), **callbacks)
+
+    def mkdir(self, path, **callbacks):
+        return self.call(lambda c: c.mkdir(path), **callbacks)
+
+    def create_file(self, path, **callbacks):
+        def create(c):
+            with c.open(path, "w"):
+                pass
+        return self.call(create, **callbacks)
+
+    def get(self, remote_path, local_path, **callbacks):
+        return self.call(lambda c: c.get(remote_path, local_path), **callbacks)
+
+    def put(self, local_path, remote_path, **callbacks):
+        return self.call(lambda c: c.put(local_path, remote_path), **callbacks)
+
+    def shutdown(self, then=None):
+        """
+        Lets queued requests (such as an editor's last save) finish, then
+        closes the channels and calls then() on the worker thread. Jobs that
+        have not started are cancelled.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+
+        def close():
+            try:
+                if self.transfer_pool:
+                    self.transfer_pool.close()
+                with self._lock:
+                    for client in self._job_clients:
+                        client.close()
+                    self._job_clients = []
+                if self._client:
+                    self._client.close()
+            except Exception as e:
+                print(f"Warning: Could not close SFTP cleanly: {e}")
+            if then:
+                then()
+
+        self._requests.submit(close)
+        self._requests.shutdown(wait=False)
+
+
+def _deliver(future, on_done, on_error):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        if on_done:
+            wx.CallAfter(_call_if_alive, on_done, future.result())
+    elif on_error:
+        wx.CallAfter(_call_if_alive, on_error, error)
+    else:
+        print(f"Warning: SFTP operation failed: {error}")
+
+
+def _call_if_alive(callback, value):
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, wx.Window) and not owner:
+        return
+    callback(value)
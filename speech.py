@@ -1,8 +1,31 @@
+import threading
+import time
+from collections import deque
+
 import accessible_output2.outputs
 
 # --- NEW: Global flag to control speech output ---
 SPEAK_ENABLED = True
 
+# Terminal output speech limits, adjustable from the Settings menu.
+DEFAULT_OUTPUT_RATE = 4
+MIN_OUTPUT_RATE = 1
+MAX_OUTPUT_RATE = 20
+DEFAULT_BACKLOG_LINES = 40
+MIN_BACKLOG_LINES = 1
+MAX_BACKLOG_LINES = 1000
+DEFAULT_BACKLOG_AGE = 5
+MIN_BACKLOG_AGE = 1
+MAX_BACKLOG_AGE = 120
+OUTPUT_RATE = DEFAULT_OUTPUT_RATE      # utterances per second
+BACKLOG_LINES = DEFAULT_BACKLOG_LINES  # lines waiting before the rest are skipped
+BACKLOG_AGE = DEFAULT_BACKLOG_AGE      # seconds before a waiting line is stale
+
+# Hard cap on lines held for the worker, whatever the settings say.
+MAX_QUEUED_LINES = 5000
+# An unfinished line (e.g. a shell prompt) is spoken after this much quiet.
+PARTIAL_LINE_DELAY = 0.3
+
 speaker = accessible_output2.outputs.auto.Auto()
 
 # --- NEW: Function to set the state of speech output ---
@@ -10,11 +33,138 @@ def set_speak_enabled(enabled: bool):
     """Globally enables or disables screen reader output."""
     global SPEAK_ENABLED
     SPEAK_ENABLED = enabled
+    if not enabled:
+        output_worker.clear()
+
+def set_output_limits(rate=None, backlog_lines=None, backlog_age=None):
+    """Sets how fast terminal output is spoken and how much may pile up."""
+    global OUTPUT_RATE, BACKLOG_LINES, BACKLOG_AGE
+    if rate is not None:
+        OUTPUT_RATE = max(MIN_OUTPUT_RATE, min(int(rate), MAX_OUTPUT_RATE))
+    if backlog_lines is not None:
+        BACKLOG_LINES = max(MIN_BACKLOG_LINES, min(int(backlog_lines), MAX_BACKLOG_LINES))
+    if backlog_age is not None:
+        BACKLOG_AGE = max(MIN_BACKLOG_AGE, min(int(backlog_age), MAX_BACKLOG_AGE))
 
 def speak(text, interrupt=True):
     """Speaks the given text if speech is enabled."""
     # --- The gatekeeper check ---
     if not SPEAK_ENABLED:
         return
-    
-    speaker.speak(text, interrupt=interrupt)
\ No newline at end of file
+
+    speaker.speak(text, interrupt=interrupt)
+
+def speak_output(text):
+    """Queues terminal output for the speech worker. Safe from any thread."""
+    if not SPEAK_ENABLED:
+        return
+    output_worker.add(text)
+
+
+class OutputSpeechWorker:
+    """
+    Speaks terminal output on its own thread so a flood never stalls the UI.
+
+    Chunks are merged into whole lines before they are spoken, and at most
+    OUTPUT_RATE utterances go to the screen reader per second, each carrying
+    every line that is waiting. When more than BACKLOG_LINES lines are
+    waiting, or lines have waited longer than BACKLOG_AGE seconds, the backlog
+    is dropped and replaced by a short "N more lines" summary followed by the
+    newest line, so speech never falls behind what is on screen.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._lines = deque()
+        self._partial = ""
+        self._partial_time = 0.0
+        self._skipped = 0
+        self._thread = None
+
+    def add(self, text):
+        with self._cond:
+            now = time.monotonic()
+            parts = (self._partial + text).split("\n")
+            self._partial = parts.pop()
+            self._partial_time = now
+            for line in parts:
+                if line.strip():
+                    self._lines.append((now, line))
+            overflow = len(self._lines) - MAX_QUEUED_LINES
+            for _ in range(max(0, overflow)):
+                self._lines.popleft()
+                self._skipped += 1
+            self._ensure_thread()
+            self._cond.notify()
+
+    def clear(self):
+        with self._cond:
+            self._lines.clear()
+            self._partial = ""
+            self._skipped = 0
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _next_utterance(self):
+        """Blocks until there is something to say, then returns it."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._partial.strip():
+                    quiet = now - self._partial_time
+                    if quiet >= PARTIAL_LINE_DELAY:
+                        self._lines.append((self._partial_time, self._partial))
+                        self._partial = ""
+                if self._lines:
+                    break
+                if self._partial.strip():
+                    self._cond.wait(PARTIAL_LINE_DELAY - quiet)
+                else:
+                    self._partial = ""
+                    self._cond.wait()
+
+            lines = self._lines
+            skipped, self._skipped = self._skipped, 0
+            if len(lines) > BACKLOG_LINES:
+                skipped += len(lines) - 1
+                newest = lines.pop()
+                lines.clear()
+                lines.append(newest)
+            while lines and now - lines[0][0] > BACKLOG_AGE:
+                lines.popleft()
+                skipped += 1
+            text = "\n".join(line for _, line in lines)
+            lines.clear()
+
+        if skipped:
+            summary = f"{skipped} more line" if skipped == 1 else f"{skipped} more lines"
+            text = f"{summary}.\n{text}" if text else summary
+        return text
+
+    def _run(self):
+        _init_com()
+        # A separate instance, so screen reader calls stay on this thread.
+        output_speaker = accessible_output2.outputs.auto.Auto()
+        while True:
+            text = self._next_utterance()
+            if SPEAK_ENABLED and text.strip():
+                try:
+                    output_speaker.speak(text, interrupt=False)
+                except Exception as e:
+                    print(f"Warning: Could not speak terminal output: {e}")
+            time.sleep(1.0 / OUTPUT_RATE)
+
+
+def _init_com():
+    """SAPI and some screen reader bridges are COM based and need this per thread."""
+    try:
+        import pythoncom
+    except ImportError:
+        return
+    pythoncom.CoInitialize()
+
+
+output_worker = OutputSpeechWorker()
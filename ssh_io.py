@@ -0,0 +1,197 @@
+import queue
+import selectors
+import socket
+import threading
+
+RECV_SIZE = 32768
+SEND_SIZE = 32768
+# How often to retry sends while a channel's remote window is full.
+SEND_RETRY_INTERVAL = 0.02
+
+
+class ChannelPump:
+    """
+    Moves data between one paramiko channel and the UI.
+
+    A pump does no I/O of its own: it is attached to the shared IOReactor,
+    which reads the channel as soon as it has output and sends queued input
+    as soon as send() is called. on_data and on_closed run on the reactor
+    thread, so they must be quick and must not touch wx directly.
+    """
+
+    def __init__(self, channel, on_data, on_closed=None, reactor=None):
+        self.channel = channel
+        self.on_data = on_data
+        self.on_closed = on_closed
+        self.reactor = reactor or get_reactor()
+        self.outgoing = queue.Queue()
+        self._unsent = b""
+        self._stopped = threading.Event()
+
+    def start(self):
+        self.reactor.add(self)
+
+    def send(self, data):
+        """Queues data for the channel. Safe to call from any thread."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.outgoing.put(data)
+        self.reactor.call_soon(self._flush_outgoing)
+
+    def stop(self):
+        """Detaches the pump from the reactor. Safe to call from any thread."""
+        if not self._stopped.is_set():
+            self.reactor.call_soon(lambda: self.reactor.remove(self))
+
+    def is_stopped(self):
+        return self._stopped.is_set()
+
+    def has_unsent(self):
+        return bool(self._unsent) or not self.outgoing.empty()
+
+    def _flush_outgoing(self):
+        """Sends as much queued input as the channel will take without blocking."""
+        while True:
+            if not self._unsent:
+                try:
+                    self._unsent = self.outgoing.get_nowait()
+                except queue.Empty:
+                    return
+            if not self.channel.send_ready():
+                # The remote window is full; the reactor retries shortly.
+                return
+            sent = self.channel.send(self._unsent[:SEND_SIZE])
+            self._unsent = self._unsent[sent:]
+
+    def _read_available(self):
+        """Reads everything the channel has buffered. Returns False on EOF."""
+        while self.channel.recv_ready():
+            data = self.channel.recv(RECV_SIZE)
+            if not data:
+                return False
+            self.on_data(data)
+        if self.channel.closed or self.channel.eof_received:
+            return False
+        return not self.channel.exit_status_ready()
+
+
+class IOReactor:
+    """
+    One thread that serves the shell channels of every open session.
+
+    The thread sleeps in a selector on each channel's fileno() plus one end of
+    a socket pair used to wake it for new work, so idle sessions cost no CPU
+    and no extra threads. A socket pair is used rather than os.pipe() because
+    select() on Windows only accepts sockets.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._calls = queue.Queue()
+        self._pumps = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def call_soon(self, fn):
+        """Runs fn on the reactor thread. Safe to call from any thread."""
+        self._calls.put(fn)
+        self._ensure_thread()
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # The buffer is already full of wakeups.
+            pass
+
+    def add(self, pump):
+        self.call_soon(lambda: self._register(pump))
+
+    def remove(self, pump):
+        """Unregisters a pump. Must run on the reactor thread."""
+        if pump not in self._pumps:
+            return
+        self._pumps.discard(pump)
+        try:
+            self._selector.unregister(pump.channel.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+        pump._stopped.set()
+        if pump.on_closed:
+            try:
+                pump.on_closed()
+            except Exception as e:
+                print(f"Warning: channel close handler failed: {e}")
+
+    def _register(self, pump):
+        if pump.is_stopped():
+            return
+        self._pumps.add(pump)
+        self._selector.register(pump.channel.fileno(), selectors.EVENT_READ, pump)
+        # Pick up anything queued, or already received, before registration.
+        self._service(pump)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="teatype-io", daemon=True)
+                self._thread.start()
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run_calls(self):
+        while True:
+            try:
+                fn = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn()
+            except Exception as e:
+                print(f"Warning: I/O reactor task failed: {e}")
+
+    def _service(self, pump):
+        try:
+            pump._flush_outgoing()
+            alive = pump._read_available()
+        except Exception as e:
+            print(f"Warning: channel I/O failed: {e}")
+            alive = False
+        if not alive:
+            self.remove(pump)
+
+    def _run(self):
+        while True:
+            waiting = any(p.has_unsent() for p in self._pumps)
+            timeout = SEND_RETRY_INTERVAL if waiting else None
+            events = self._selector.select(timeout)
+            for key, _ in events:
+                if key.data is None:
+                    self._drain_wakeups()
+                    self._run_calls()
+                elif key.data in self._pumps:
+                    self._service(key.data)
+            if waiting:
+                for pump in list(self._pumps):
+                    if pump.has_unsent():
+                        self._service(pump)
+
+
+_reactor = None
+_reactor_lock = threading.Lock()
+
+
+def get_reactor():
+    """Returns the process-wide reactor, creating it on first use."""
+    global _reactor
+    with _reactor_lock:
+        if _reactor is None:
+            _reactor = IOReactor()
+        return _reactor
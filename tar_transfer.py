@@ -0,0 +1,209 @@
+import os
+import posixpath
+import stat
+import tarfile
+import threading
+
+import sftp_helpers
+import resumable_transfer
+from remote_exec import quote, server_tools
+
+# Directories holding at least this many files are moved as one tar stream.
+TAR_MIN_FILES = 32
+CHUNK_SIZE = 65536
+# Whether tar streams are gzipped. Worth it on slow links, not on a LAN.
+# Adjustable from the Settings menu.
+COMPRESS_STREAMS = True
+
+
+def set_compress_streams(enabled: bool):
+    """Enables or disables gzip compression of tar streams."""
+    global COMPRESS_STREAMS
+    COMPRESS_STREAMS = enabled
+
+
+class TarUnavailableError(IOError):
+    """The server can't run tar, so the files have to be moved one by one."""
+    pass
+
+
+def tar_roots(transport, manifest):
+    """
+    Returns the directories added to manifest that are worth streaming: those
+    with at least TAR_MIN_FILES files and no file big enough for the ranged,
+    resumable engine. Returns nothing if the server has no tar.
+    """
+    candidates = [r for r in manifest.roots if stat.S_ISDIR(r.mode)]
+    if not candidates or "tar" not in server_tools(transport):
+        return []
+    roots = []
+    for root in candidates:
+        files = manifest.files_under(root)
+        if len(files) >= TAR_MIN_FILES and all(
+            f.size < resumable_transfer.LARGE_FILE_THRESHOLD for f in files
+        ):
+            roots.append(root)
+    return roots
+
+
+def stream_tree(transport, manifest, root, file_started, check_cancel, progress=None, files=None):
+    """
+    Moves the tree at root, one entry of manifest.roots, through a single
+    tar stream over an exec channel. Downloads run `tar c` on the server and
+    unpack locally as the data arrives; uploads pack locally and feed
+    `tar x` on the server. Bytes are added to progress as file contents go
+    through the stream. files, a list of manifest entries, limits a download
+    to those files, such as the ones the file cache didn't have.
+    """
+    gzip = COMPRESS_STREAMS and "gzip" in server_tools(transport)
+    if manifest.direction == "get":
+        _download_tree(transport, root, gzip, file_started, check_cancel, progress, files)
+    else:
+        _upload_tree(transport, manifest, root, gzip, file_started, check_cancel, progress)
+
+
+def _open_stream(transport, command):
+    channel = transport.open_session()
+    channel.exec_command(command)
+    return channel
+
+
+def _check_exit(channel, command_name):
+    status = channel.recv_exit_status()
+    if status == 0:
+        return
+    err = channel.makefile_stderr("rb").read().decode("utf-8", "replace").strip()
+    if status == 127:
+        raise TarUnavailableError(f"{command_name} is not available on the server.")
+    raise IOError(err.splitlines()[-1] if err else f"{command_name} failed with status {status}.")
+
+
+def _download_tree(transport, root, gzip, file_started, check_cancel, progress, files=None):
+    parent, name = posixpath.split(root.source.rstrip("/"))
+    if files is None:
+        command = f"cd {quote(parent or '/')} && tar c{'z' if gzip else ''}f - -- {quote(name)}"
+    else:
+        # Names are read from stdin; the ./ keeps one starting with - from
+        # being taken for an option.
+        command = f"cd {quote(parent or '/')} && tar c{'z' if gzip else ''}f - -T -"
+    os.makedirs(root.dest, exist_ok=True)
+    channel = _open_stream(transport, command)
+    if files is not None:
+        names = "".join(f"./{posixpath.relpath(f.source, parent or '/')}\n" for f in files)
+        # Sent alongside the download, as tar may read names only as it goes.
+        threading.Thread(target=_send_names, args=(channel, names.encode("utf-8")), daemon=True).start()
+    target = None
+    try:
+        with tarfile.open(fileobj=channel.makefile("rb"), mode="r|gz" if gzip else "r|") as tar:
+            for member in tar:
+                check_cancel()
+                target = _local_target(root.dest, member.name)
+                if member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                elif member.isfile():
+                    file_started(f"{root.source}/{_member_path(member.name)}")
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    _copy_stream(tar.extractfile(member), target, check_cancel, progress)
+                elif hasattr(tarfile, "data_filter") and member.issym():
+                    # Refuses links pointing outside the folder.
+                    member.name = os.path.relpath(target, root.dest)
+                    tar.extract(member, root.dest, filter="data")
+                target = None
+        _check_exit(channel, "tar")
+    except sftp_helpers.TransferCancelledError:
+        # Leave no half-written file behind, as a cancelled SFTP get doesn't.
+        if target and os.path.isfile(target):
+            os.remove(target)
+        raise
+    except tarfile.TarError:
+        _check_exit(channel, "tar")
+        raise
+    finally:
+        channel.close()
+
+
+def _send_names(channel, names):
+    try:
+        channel.sendall(names)
+        channel.shutdown_write()
+    except Exception:
+        # The stream failed or was cancelled; the download reports it.
+        pass
+
+
+def _copy_stream(source, path, check_cancel, progress):
+    with open(path, "wb") as f:
+        while True:
+            check_cancel()
+            data = source.read(CHUNK_SIZE)
+            if not data:
+                break
+            f.write(data)
+            if progress is not None:
+                progress.add(len(data))
+
+
+def _member_parts(name):
+    return [p for p in name.split("/") if p not in ("", ".")]
+
+
+def _member_path(name):
+    """An archive name relative to the folder streamed."""
+    return "/".join(_member_parts(name)[1:])
+
+
+def _local_target(root, name):
+    """Maps an archive name to a path under root, refusing ones that escape it."""
+    parts = _member_parts(name)
+    if name.startswith("/") or ".." in parts:
+        raise IOError(f"Refusing unsafe path in archive: {name}")
+    # The first component is the folder itself, which maps to root.
+    return os.path.join(root, *parts[1:])
+
+
+def _upload_tree(transport, manifest, root, gzip, file_started, check_cancel, progress):
+    parent, name = posixpath.split(root.dest.rstrip("/"))
+    command = f"cd {quote(parent or '/')} && tar x{'z' if gzip else ''}f -"
+    channel = _open_stream(transport, command)
+    try:
+        stream = channel.makefile("wb")
+        with tarfile.open(fileobj=stream, mode="w|gz" if gzip else "w|") as tar:
+            for entry in [root] + manifest.entries_under(root):
+                check_cancel()
+                info = tarfile.TarInfo(name + entry.dest[len(root.dest):])
+                info.mtime = entry.mtime
+                info.mode = stat.S_IMODE(entry.mode) or 0o644
+                if stat.S_ISDIR(entry.mode):
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                    continue
+                file_started(entry.source)
+                info.size = entry.size
+                with open(entry.source, "rb") as f:
+                    tar.addfile(info, _ProgressReader(f, check_cancel, progress))
+        stream.flush()
+        channel.shutdown_write()
+        _check_exit(channel, "tar")
+    except OSError:
+        if channel.exit_status_ready():
+            # The server's tar stopped reading; its error says why.
+            _check_exit(channel, "tar")
+        raise
+    finally:
+        channel.close()
+
+
+class _ProgressReader:
+    """A file wrapper that reports bytes read and honours cancellation."""
+
+    def __init__(self, f, check_cancel, progress):
+        self.f = f
+        self.check_cancel = check_cancel
+        self.progress = progress
+
+    def read(self, size=-1):
+        self.check_cancel()
+        data = self.f.read(size)
+        if self.progress is not None:
+            self.progress.add(len(data))
+        return data
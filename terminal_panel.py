@@ -1,12 +1,15 @@
 import wx
 import os
 from collections import deque
-from speech import speak
+from speech import speak_output
+from output_coalescer import OutputCoalescer
+from scrollback import ScrollbackView
 
 class TerminalPanel(wx.Panel):
-    def __init__(self, parent):
+    def __init__(self, parent, session):
         super().__init__(parent)
         self.parent_book = parent
+        self.session = session
         
         # --- FIX: Get a reference to the main application frame ---
         self.main_frame = self.GetTopLevelParent()
@@ -26,8 +29,12 @@ class TerminalPanel(wx.Panel):
 
         hbox = wx.BoxSizer(wx.HORIZONTAL)
         self.browse_files_btn = wx.Button(self, label="&Browse Files (SFTP)")
+        self.server_list_btn = wx.Button(self, label="Server &List")
+        self.details_btn = wx.Button(self, label="Connection &Info")
         self.disconnect_btn = wx.Button(self, label="&Disconnect")
         hbox.Add(self.browse_files_btn)
+        hbox.Add(self.server_list_btn, 0, wx.LEFT, 5)
+        hbox.Add(self.details_btn, 0, wx.LEFT, 5)
         hbox.Add(self.disconnect_btn, 0, wx.LEFT, 5)
         sizer.Add(hbox, 0, wx.ALIGN_CENTER | wx.BOTTOM, 5)
         
@@ -47,11 +54,21 @@ class TerminalPanel(wx.Panel):
         self.input_ctrl.Bind(wx.EVT_TEXT_ENTER, self.on_command_enter)
         self.input_ctrl.Bind(wx.EVT_KEY_DOWN, self.on_key_down)
         self.browse_files_btn.Bind(wx.EVT_BUTTON, self.on_browse_files)
-        self.disconnect_btn.Bind(wx.EVT_BUTTON, lambda e: self.main_frame.disconnect())
+        self.server_list_btn.Bind(wx.EVT_BUTTON, lambda e: self.main_frame.show_server_list())
+        self.details_btn.Bind(wx.EVT_BUTTON, lambda e: self.session.show_connection_details())
+        self.disconnect_btn.Bind(wx.EVT_BUTTON, lambda e: self.main_frame.close_session(self.session))
+
+        self.scrollback = ScrollbackView(self.output_ctrl)
+        self.output_coalescer = OutputCoalescer(
+            self, self.render_output, self.scrollback.store_only
+        )
 
     def on_browse_files(self, event):
-        # --- FIX: Call on_browse_files on the correct object ---
-        self.main_frame.on_browse_files(event)
+        self.session.browse_files()
+
+    def notify_editor_closed(self, remote_path):
+        # Editors are parented to this panel; their session tracks them.
+        self.session.notify_editor_closed(remote_path)
 
     def on_command_enter(self, event):
         if not wx.GetKeyState(wx.WXK_SHIFT):
@@ -60,8 +77,7 @@ class TerminalPanel(wx.Panel):
                 self.command_history.append(command)
             self.history_index = -1
             self.current_command = ""
-            # --- FIX: Call send_command on the correct object ---
-            self.main_frame.send_command(command + '\n')
+            self.session.send_command(command + '\n')
             self.input_ctrl.Clear()
         else:
             current_pos = self.input_ctrl.GetInsertionPoint()
@@ -91,20 +107,24 @@ class TerminalPanel(wx.Panel):
                 self.input_ctrl.SetValue(self.current_command)
                 self.input_ctrl.SetInsertionPointEnd()
         elif is_ctrl_down and key_code == ord('D'):
-            self.main_frame.send_command('\x04')
+            self.session.send_command('\x04')
         elif is_ctrl_down and key_code == ord('C'):
-            self.main_frame.send_command('\x03')
+            self.session.send_command('\x03')
         else:
             event.Skip()
 
     def append_output(self, text):
-        self.output_ctrl.AppendText(text)
-        clean_text = text.strip()
-        if clean_text:
-            speak(clean_text, interrupt=False)
+        """Queues output for the next frame. Safe to call from any thread."""
+        self.output_coalescer.write(text)
+
+    def render_output(self, text):
+        self.scrollback.append(text)
+        if text:
+            speak_output(text)
 
     def clear_output(self):
-        self.output_ctrl.Clear()
+        self.output_coalescer.clear()
+        self.scrollback.clear()
         
     def set_focus_on_input(self):
         self.input_ctrl.SetFocus()
\ No newline at end of file
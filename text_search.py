@@ -0,0 +1,188 @@
+import bisect
+import re
+from array import array
+from collections import namedtuple
+
+# Most matches listed by Find All.
+MAX_FIND_RESULTS = 5000
+
+# What to look for. text is a regular expression when regex is set.
+SearchQuery = namedtuple("SearchQuery", "text match_case regex whole_word")
+
+# One Find All result: character offsets, 1-based line number and the line.
+FindResult = namedtuple("FindResult", "start end line text")
+
+
+def compile_query(query):
+    """
+    Returns the compiled pattern for a query, or None when a plain substring
+    search will do. Raises re.error for a bad regular expression.
+    """
+    if not query.regex and not query.whole_word:
+        return None
+    source = query.text if query.regex else re.escape(query.text)
+    if query.whole_word:
+        source = rf"\b(?:{source})\b"
+    return re.compile(source, 0 if query.match_case else re.IGNORECASE)
+
+
+class SearchMirror:
+    """
+    A copy of an editor's text kept for searching, so that Find Next
+    doesn't fetch the whole buffer from the text control and lower-case it
+    on every key press.
+
+    The editor calls invalidate() when the text changes and sync() before
+    searching; the text is only fetched again after an edit. The lowered
+    copy used for case-insensitive searches and the index of line starts
+    are built the first time they are needed after that.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.stale = True
+        self._lowered = None
+        self._line_starts = None
+
+    def invalidate(self):
+        self.stale = True
+
+    def sync(self, get_text):
+        if self.stale:
+            self.set_text(get_text())
+
+    def set_text(self, text):
+        self.text = text
+        self.stale = False
+        self._lowered = None
+        self._line_starts = None
+
+    @property
+    def lowered(self):
+        """The lowered text, or None if lowering changed its length."""
+        if self._lowered is None:
+            lowered = self.text.lower()
+            # A few characters, such as dotted capital I, lower to two.
+            self._lowered = lowered if len(lowered) == len(self.text) else False
+        return self._lowered or None
+
+    def line_of(self, pos):
+        """The 1-based line number of a character offset."""
+        if self._line_starts is None:
+            self._line_starts = array("q", [0])
+            self._line_starts.extend(m.end() for m in re.finditer("\n", self.text))
+        return bisect.bisect_right(self._line_starts, pos)
+
+    def line_text(self, line):
+        start = self._line_starts[line - 1]
+        end = self.text.find("\n", start)
+        return self.text[start:] if end == -1 else self.text[start:end]
+
+    def _haystack(self, query):
+        """Returns (text, needle) for a substring search, or None if a pattern is needed."""
+        if query.match_case:
+            return self.text, query.text
+        lowered = self.lowered
+        if lowered is None:
+            return None
+        return lowered, query.text.lower()
+
+    def find(self, query, pos, forward=True):
+        """
+        Finds the next match after pos, or the last one before it, wrapping
+        round the ends of the text. Returns (start, end) or None.
+        """
+        pattern = compile_query(query)
+        if pattern is None:
+            haystack = self._haystack(query)
+            if haystack is None:
+                pattern = re.compile(re.escape(query.text), re.IGNORECASE)
+        if pattern is None:
+            text, needle = haystack
+            if forward:
+                index = text.find(needle, pos)
+                if index == -1:
+                    index = text.find(needle)
+            else:
+                index = text.rfind(needle, 0, pos)
+                if index == -1:
+                    index = text.rfind(needle)
+            return None if index == -1 else (index, index + len(needle))
+        if forward:
+            match = pattern.search(self.text, pos) or pattern.search(self.text)
+        else:
+            match = _last_match(pattern, self.text, pos) or _last_match(pattern, self.text, len(self.text))
+        # An empty match (from a pattern like "x*") finds nothing useful.
+        if match is None or match.end() == match.start():
+            return None
+        return match.span()
+
+    def _spans(self, query):
+        pattern = compile_query(query)
+        haystack = self._haystack(query) if pattern is None else None
+        if pattern is None and haystack is None:
+            pattern = re.compile(re.escape(query.text), re.IGNORECASE)
+        if pattern is not None:
+            for match in pattern.finditer(self.text):
+                if match.end() > match.start():
+                    yield match.start(), match.end(), match
+            return
+        text, needle = haystack
+        index = text.find(needle)
+        while index != -1:
+            yield index, index + len(needle), None
+            index = text.find(needle, index + len(needle))
+
+    def find_all(self, query, limit=MAX_FIND_RESULTS):
+        """Returns (results, truncated), at most limit FindResults in order."""
+        results = []
+        for start, end, _ in self._spans(query):
+            if len(results) == limit:
+                return results, True
+            line = self.line_of(start)
+            results.append(FindResult(start, end, line, self.line_text(line)))
+        return results, False
+
+    def expand(self, query, replacement, selected):
+        """
+        Returns what the selected text should be replaced with if it is a
+        match for query, or None. Regular expressions may use groups (\\1)
+        in the replacement.
+        """
+        pattern = compile_query(query)
+        if pattern is None:
+            same = selected == query.text if query.match_case else selected.lower() == query.text.lower()
+            return replacement if same else None
+        match = pattern.fullmatch(selected)
+        if match is None:
+            return None
+        return match.expand(replacement) if query.regex else replacement
+
+    def replace_all(self, query, replacement):
+        """
+        Works out a Replace All without touching the editor. Returns (start,
+        end, new_text, count): the span of the old text from the first
+        match to the end of the last, and what replaces it, so the control
+        can be changed in one step. Returns None if nothing matched.
+        """
+        parts = []
+        first = last = None
+        count = 0
+        for start, end, match in self._spans(query):
+            if first is None:
+                first = start
+            else:
+                parts.append(self.text[last:start])
+            parts.append(match.expand(replacement) if query.regex else replacement)
+            last = end
+            count += 1
+        if first is None:
+            return None
+        return first, last, "".join(parts), count
+
+
+def _last_match(pattern, text, pos):
+    match = None
+    for match in pattern.finditer(text, 0, pos):
+        pass
+    return match
@@ -0,0 +1,252 @@
+import os
+import socket
+import time
+
+import paramiko
+
+MB = 1024 * 1024
+
+# "auto" compresses only when the link looks slow: when opening the TCP
+# connection took at least AUTO_COMPRESSION_RTT seconds.
+COMPRESSION_CHOICES = ("auto", "on", "off")
+AUTO_COMPRESSION_RTT = 0.08
+# Ciphers tried first for each preference; the rest keep paramiko's order.
+CIPHER_PREFERENCES = {
+    "default": (),
+    "aes-gcm": ("aes128-gcm@openssh.com", "aes256-gcm@openssh.com"),
+    "aes-ctr": ("aes128-ctr",),
+}
+# Channel window sizes offered; None keeps paramiko's 2 MB. A bigger window
+# keeps more data in flight, which is what a long, fast link needs.
+WINDOW_SIZES = (None, 4 * MB, 8 * MB, 16 * MB, 32 * MB)
+# TCP receive buffers offered; None leaves it to the operating system.
+RECV_BUFFER_SIZES = (None, 1 * MB, 4 * MB, 8 * MB, 16 * MB)
+
+# Keys looked for in ~/.ssh (and ~/ssh, on Windows) when logging in, as
+# OpenSSH does.
+DEFAULT_KEY_NAMES = ("id_rsa", "id_ecdsa", "id_ed25519")
+# What a server may still ask for after accepting a key.
+SECOND_FACTORS = {"password", "keyboard-interactive"}
+
+DEFAULT_PROFILE = {
+    "compression": "auto",
+    "ciphers": "default",
+    "window_size": None,
+    "recv_buffer": None,
+}
+
+# Profiles tried by measure_link(), as changes to DEFAULT_PROFILE.
+MEASURE_CANDIDATES = (
+    {"compression": "off"},
+    {"compression": "on"},
+    {"compression": "off", "ciphers": "aes-gcm"},
+    {"compression": "off", "window_size": 16 * MB, "recv_buffer": 8 * MB},
+    {"compression": "off", "ciphers": "aes-gcm", "window_size": 16 * MB, "recv_buffer": 8 * MB},
+    {"compression": "on", "window_size": 16 * MB, "recv_buffer": 8 * MB},
+)
+# Output timed for each candidate: text, which compresses well, and random
+# bytes, which don't.
+MEASURE_COMMANDS = ("seq 1 400000", "head -c 4194304 /dev/urandom")
+# Seconds between cancellation checks while the server sends nothing.
+MEASURE_POLL_INTERVAL = 0.5
+
+
+def profile_of(server_info):
+    """Returns the transport profile saved with a server, filled in with defaults."""
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(server_info.get("transport") or {})
+    return profile
+
+
+def open_socket(host, port, timeout, profile):
+    """
+    Connects a TCP socket. The receive buffer has to be set before
+    connecting for the TCP window to be scaled up to it.
+    """
+    error = None
+    for family, kind, proto, _, address in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        sock = socket.socket(family, kind, proto)
+        try:
+            if profile["recv_buffer"]:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, profile["recv_buffer"])
+            sock.settimeout(timeout)
+            sock.connect(address)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f"Could not resolve {host}.")
+
+
+def make_transport(sock, profile, rtt=None):
+    """
+    Creates a paramiko Transport set up from a profile, ready for
+    start_client(). The window size applies to every channel opened on it:
+    the shell, SFTP and exec channels alike.
+    """
+    if profile["window_size"]:
+        transport = paramiko.Transport(sock, default_window_size=profile["window_size"])
+    else:
+        transport = paramiko.Transport(sock)
+    options = transport.get_security_options()
+    available = options.ciphers
+    first = tuple(c for c in CIPHER_PREFERENCES.get(profile["ciphers"], ()) if c in available)
+    options.ciphers = first + tuple(c for c in available if c not in first)
+    transport.use_compression(wants_compression(profile, rtt))
+    return transport
+
+
+def wants_compression(profile, rtt):
+    if profile["compression"] == "auto":
+        return rtt is not None and rtt >= AUTO_COMPRESSION_RTT
+    return profile["compression"] == "on"
+
+
+def authenticate(transport, connect_kwargs):
+    """
+    Logs in the way SSHClient.connect() does. The server's key file is
+    tried first, then the keys of a running SSH agent, then the default
+    keys in ~/.ssh, and last the password. A key that can't be loaded, say
+    for want of its passphrase, is passed over. If the server accepts a
+    key but still wants a password (partial success), the password is
+    sent next.
+    """
+    kw = connect_kwargs
+    username = kw['username']
+    password = kw.get('password')
+    passphrase = kw.get('passphrase') or password or None
+    error = None
+    needs_more = False
+    try:
+        agent = paramiko.Agent()
+    except paramiko.SSHException as e:
+        print(f"Warning: Could not use the SSH agent: {e}")
+        agent = None
+    try:
+        for load in _key_loaders(kw.get('key_filename'), agent, passphrase):
+            try:
+                key = load()
+            except Exception as e:
+                # Key files fail to load with all sorts of errors.
+                error = e
+                continue
+            try:
+                remaining = set(transport.auth_publickey(username, key))
+            except paramiko.SSHException as e:
+                error = e
+                continue
+            if not remaining:
+                return
+            needs_more = True
+            if remaining & SECOND_FACTORS:
+                break
+    finally:
+        if agent:
+            agent.close()
+    if password is not None:
+        try:
+            transport.auth_password(username, password)
+            return
+        except paramiko.SSHException as e:
+            error = e
+    elif needs_more:
+        error = paramiko.AuthenticationException(
+            "The server accepted a key but also wants a password."
+        )
+    raise error or paramiko.AuthenticationException("No authentication methods available.")
+
+
+def _key_loaders(key_filename, agent, passphrase):
+    """Yields a function returning each key to try, in the order to try them."""
+    if key_filename:
+        yield lambda: _load_key(key_filename, passphrase)
+    for key in agent.get_keys() if agent else ():
+        yield lambda key=key: key
+    for directory in (".ssh", "ssh"):
+        for name in DEFAULT_KEY_NAMES:
+            path = os.path.join(os.path.expanduser("~"), directory, name)
+            if os.path.isfile(path) and path != key_filename:
+                yield lambda path=path: _load_key(path, passphrase)
+
+
+def _load_key(path, passphrase):
+    try:
+        return paramiko.PKey.from_path(path)
+    except TypeError:
+        # The key is encrypted. Passed as the second argument, as its name
+        # changed in paramiko 5.
+        if not passphrase:
+            raise paramiko.PasswordRequiredException(f"The key {path} needs a passphrase.")
+        return paramiko.PKey.from_path(path, passphrase.encode("utf-8"))
+
+
+def describe(profile):
+    """Returns a short spoken-friendly summary of a profile."""
+    cipher_names = {"default": "default ciphers", "aes-gcm": "AES-GCM", "aes-ctr": "AES-CTR"}
+    parts = [
+        f"compression {profile['compression']}",
+        cipher_names.get(profile["ciphers"], profile["ciphers"]),
+    ]
+    if profile["window_size"]:
+        parts.append(f"{profile['window_size'] // MB} MB window")
+    if profile["recv_buffer"]:
+        parts.append(f"{profile['recv_buffer'] // MB} MB receive buffer")
+    return ", ".join(parts)
+
+
+def measure_link(connect_kwargs, on_result, check_cancel, timeout=10):
+    """
+    Connects once with each of MEASURE_CANDIDATES, times how long the
+    server takes to send the output of MEASURE_COMMANDS, and returns the
+    fastest profile. on_result(profile, seconds) is called after each one;
+    seconds is None if the server went quiet for timeout seconds, and that
+    profile is not recommended. Runs for several seconds; call it off the
+    UI thread.
+    """
+    best = None
+    for changes in MEASURE_CANDIDATES:
+        check_cancel()
+        profile = dict(DEFAULT_PROFILE, **changes)
+        try:
+            seconds = _time_profile(connect_kwargs, profile, check_cancel, timeout)
+        except socket.timeout:
+            seconds = None
+        on_result(profile, seconds)
+        if seconds is not None and (best is None or seconds < best[0]):
+            best = (seconds, profile)
+    if best is None:
+        raise IOError("The server stopped responding with every setting tried.")
+    return best[1]
+
+
+def _time_profile(connect_kwargs, profile, check_cancel, timeout):
+    sock = open_socket(connect_kwargs['hostname'], connect_kwargs['port'], timeout, profile)
+    transport = make_transport(sock, profile)
+    try:
+        transport.start_client(timeout=timeout)
+        authenticate(transport, connect_kwargs)
+        start = time.perf_counter()
+        for command in MEASURE_COMMANDS:
+            channel = transport.open_session(timeout=timeout)
+            try:
+                channel.settimeout(MEASURE_POLL_INTERVAL)
+                channel.exec_command(command)
+                quiet_since = time.monotonic()
+                while True:
+                    check_cancel()
+                    try:
+                        data = channel.recv(65536)
+                    except socket.timeout:
+                        if time.monotonic() - quiet_since >= timeout:
+                            raise
+                        continue
+                    if not data:
+                        break
+                    quiet_since = time.monotonic()
+                if channel.recv_exit_status() != 0:
+                    raise IOError("The server could not run the test commands.")
+            finally:
+                channel.close()
+        return time.perf_counter() - start
+    finally:
+        transport.close()
@@ -0,0 +1,127 @@
+import codecs
+import re
+
+DEFAULT_ENCODING = "utf-8"
+
+# C0 controls (other than tab and newline) and DEL never reach the output pane.
+_CONTROL_DELETE = {c: None for c in range(0x20) if c not in (0x09, 0x0A)}
+_CONTROL_DELETE[0x7F] = None
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]+")
+
+# Complete escape sequences: CSI, strings ended by BEL or ST (OSC, DCS, SOS,
+# PM, APC) and plain ESC + intermediates + final byte (charset switches etc).
+_SEQUENCE_RE = re.compile(
+    r"\x1b(?:"
+    r"\[[\x20-\x3f]*[\x40-\x7e]"
+    r"|[\]PX^_][^\x07\x1b]*(?:\x07|\x1b\\)"
+    r"|(?![\[\]PX^_])[\x20-\x2f]*[\x30-\x7e]"
+    r")"
+)
+# A sequence that has started but not finished by the end of the chunk.
+_PARTIAL_RE = re.compile(
+    r"\x1b(?:"
+    r"\[[\x20-\x3f]*"
+    r"|(?P<string>[\]PX^_][^\x07\x1b]*\x1b?)"
+    r"|[\x20-\x2f]*"
+    r")"
+)
+_STRING_END_RE = re.compile(r"\x07|\x1b\\?")
+
+# An unterminated string longer than this is skipped rather than buffered.
+MAX_PENDING = 4096
+
+
+def normalize_encoding(encoding):
+    """Returns a codec name Python knows, falling back to UTF-8."""
+    if not encoding:
+        return DEFAULT_ENCODING
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return DEFAULT_ENCODING
+
+
+def clean_text(text: str) -> str:
+    """Drops control and other non-printable characters, keeping \\n and \\t."""
+    if text.isascii():
+        return text.translate(_CONTROL_DELETE)
+    # str.translate is slow on non-ASCII text, so deal with the common case
+    # (carriage returns being the only controls) using plain replaces.
+    text = text.replace("\r", "")
+    if text.replace("\n", "").replace("\t", "").isprintable():
+        return text
+    text = _CONTROL_RE.sub("", text)
+    if text.replace("\n", "").replace("\t", "").isprintable():
+        return text
+    return "".join(c for c in text if c.isprintable() or c in ("\n", "\t"))
+
+
+class TerminalStreamParser:
+    """
+    Turns raw shell output into plain text for the output pane.
+
+    Bytes are decoded incrementally, so a multibyte character split across
+    two reads comes out whole. Complete escape sequences are removed in one
+    regex pass; a sequence cut off at the end of a read is held back and
+    joined to the next one, so fragments never leak into the output. Chunks
+    without an ESC take a fast path that only drops control characters.
+    """
+
+    def __init__(self, encoding=DEFAULT_ENCODING):
+        self.encoding = normalize_encoding(encoding)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        self._pending = ""
+        self._in_string = False
+
+    def reset(self):
+        self._decoder.reset()
+        self._pending = ""
+        self._in_string = False
+
+    def feed(self, data: bytes) -> str:
+        """Parses the next chunk of output and returns its printable text."""
+        return self.feed_text(self._decoder.decode(data))
+
+    def flush(self) -> str:
+        """Returns any text held back by the decoder, e.g. at end of stream."""
+        return self.feed_text(self._decoder.decode(b"", final=True))
+
+    def feed_text(self, text: str) -> str:
+        if self._in_string:
+            # Still inside an oversized OSC/DCS string: skip to its end.
+            m = _STRING_END_RE.search(text)
+            if not m:
+                return ""
+            self._in_string = False
+            text = text[m.end():]
+        if self._pending:
+            text = self._pending + text
+            self._pending = ""
+        if "\x1b" not in text:
+            return clean_text(text)
+
+        text = _SEQUENCE_RE.sub("", text)
+        start = self._partial_start(text)
+        if start != -1:
+            tail = text[start:]
+            text = text[:start]
+            if len(tail) <= MAX_PENDING:
+                self._pending = tail
+            else:
+                self._in_string = True
+        return clean_text(text)
+
+    def _partial_start(self, text):
+        """Returns where an unfinished sequence at the end of text begins."""
+        last = text.rfind("\x1b")
+        if last == -1:
+            return -1
+        if not _PARTIAL_RE.fullmatch(text, last):
+            return -1
+        if last == len(text) - 1 and last > 0:
+            # A lone ESC might be the first half of the ST ending a string.
+            prev = text.rfind("\x1b", 0, last)
+            m = _PARTIAL_RE.fullmatch(text, prev) if prev != -1 else None
+            if m and m.group("string"):
+                return prev
+        return last